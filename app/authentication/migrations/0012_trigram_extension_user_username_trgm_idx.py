@@ -0,0 +1,25 @@
+# Generated by Django 5.1.1 on 2026-10-18 20:51
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("authentication", "0011_user_search_vector_user_users_search_vector_idx"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name="user",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["username"],
+                name="users_username_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.1 on 2026-10-18 21:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("authentication", "0012_trigram_extension_user_username_trgm_idx"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="followedauthor",
+            index=models.Index(
+                fields=["author", "id"], name="followed_author_fanout_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.1.1 on 2026-10-18 21:42
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def remove_duplicate_follows(apps, schema_editor):
+    """Keep the first follow of an author by a user."""
+    FollowedAuthor = apps.get_model("authentication", "FollowedAuthor")
+
+    duplicates = (
+        FollowedAuthor.objects.values("user", "author")
+        .annotate(total=Count("id"))
+        .filter(total__gt=1)
+    )
+    for pair in duplicates:
+        ids = list(
+            FollowedAuthor.objects.filter(user=pair["user"], author=pair["author"])
+            .order_by("followed_at", "id")
+            .values_list("id", flat=True)
+        )
+        FollowedAuthor.objects.filter(id__in=ids[1:]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("authentication", "0013_followedauthor_fanout_idx"),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_follows, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="followedauthor",
+            constraint=models.UniqueConstraint(
+                fields=("user", "author"), name="unique_user_followed_author"
+            ),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.1 on 2026-10-18 21:44
+
+import app.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("authentication", "0014_followedauthor_unique_user_followed_author"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="followedauthor",
+            name="id",
+            field=models.UUIDField(
+                default=app.models.uuid7,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="user",
+            name="id",
+            field=models.UUIDField(
+                default=app.models.uuid7,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+            ),
+        ),
+    ]
@@ -3,7 +3,11 @@ from django.db import models
 # Create your models here.
 from django.contrib.auth.base_user import BaseUserManager
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.db import models
+from django.db.models import Count, Exists, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 
 from app.enums import RoleTypeEnum, GenderEnum
 from app.models import BaseModel
@@ -32,6 +36,54 @@ class CustomUserManager(BaseUserManager):
 
         return self.create_user(username, password, **extra_fields)
 
+    def recommended_authors(self, follower_id, limit=None):
+        """Return writers annotated for the author cards in a single query.
+
+        Each author carries ``num_of_authored_books`` (published books),
+        ``num_of_followers``, ``is_already_followed`` by ``follower_id`` and a
+        ``relevance_score``. Authors the follower does not follow yet come
+        first, then the most relevant ones.
+        """
+        from app.books.models import Books
+
+        published_books = (
+            Books.objects.filter(author=OuterRef("pk"), is_published=True)
+            .values("author")
+            .annotate(total=Count("id"))
+            .values("total")
+        )
+        followers = (
+            FollowedAuthor.objects.filter(author=OuterRef("pk"))
+            .values("author")
+            .annotate(total=Count("id"))
+            .values("total")
+        )
+
+        queryset = (
+            self.filter(user_role="writer")
+            .exclude(id=follower_id)
+            .annotate(
+                num_of_authored_books=Coalesce(
+                    Subquery(published_books, output_field=IntegerField()), 0
+                ),
+                num_of_followers=Coalesce(
+                    Subquery(followers, output_field=IntegerField()), 0
+                ),
+                is_already_followed=Exists(
+                    FollowedAuthor.objects.filter(
+                        user_id=follower_id, author=OuterRef("pk")
+                    )
+                ),
+                relevance_score=F("num_of_authored_books") * 2 + F("num_of_followers"),
+            )
+            .order_by("is_already_followed", "-relevance_score", "-created_at")
+        )
+
+        if limit is not None:
+            queryset = queryset[:limit]
+
+        return queryset
+
 
 class User(AbstractUser, BaseModel):
 
@@ -51,12 +103,31 @@ class User(AbstractUser, BaseModel):
 
     onboarding = models.JSONField(default=dict, blank=True, null=True)
 
+    search_config = "simple"
+    search_vector = models.GeneratedField(
+        expression=SearchVector(
+            "first_name", "last_name", weight="A", config=search_config
+        )
+        + SearchVector("username", weight="B", config=search_config)
+        + SearchVector("email", weight="C", config=search_config),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
     REQUIRED_FIELDS = ["first_name", "last_name"]
 
     objects = CustomUserManager()
 
     class Meta:
         db_table = "users"
+        indexes = [
+            GinIndex(fields=["search_vector"], name="users_search_vector_idx"),
+            GinIndex(
+                fields=["username"],
+                name="users_username_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ]
         verbose_name = "User"
         verbose_name_plural = "Users"
 
@@ -74,5 +145,17 @@ class FollowedAuthor(BaseModel):
     )
     followed_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Lets the notification fan-out page through an author's followers
+            models.Index(fields=["author", "id"], name="followed_author_fanout_idx"),
+        ]
+        constraints = [
+            # Also the index behind "does this user follow that author"
+            models.UniqueConstraint(
+                fields=["user", "author"], name="unique_user_followed_author"
+            ),
+        ]
+
     def __str__(self):
         return f"{self.user.username} follows {self.author.full_name}"
@@ -1,3 +1,61 @@
 from django.test import TestCase
 
+from app.authentication.models import FollowedAuthor, User
+from app.books.models import Books
+
+
 # Create your tests here.
+class RecommendedAuthorsTest(TestCase):
+    def setUp(self):
+        self.reader = User.objects.create_user(username="reader", user_role="writer")
+        self.quiet = User.objects.create_user(username="quiet", user_role="writer")
+        self.prolific = User.objects.create_user(
+            username="prolific", user_role="writer"
+        )
+        self.popular = User.objects.create_user(username="popular", user_role="writer")
+        self.followed = User.objects.create_user(
+            username="followed", user_role="writer"
+        )
+        User.objects.create_user(username="just_reads", user_role="reader")
+
+        # Published books weigh twice as much as followers
+        for number in range(2):
+            Books.objects.create(
+                title=f"Prolific {number}",
+                description="",
+                author=self.prolific,
+                is_published=True,
+            )
+        Books.objects.create(
+            title="Draft", description="", author=self.quiet, is_published=False
+        )
+        for number in range(3):
+            fan = User.objects.create_user(username=f"fan{number}")
+            FollowedAuthor.objects.create(user=fan, author=self.popular)
+        Books.objects.create(
+            title="Followed", description="", author=self.followed, is_published=True
+        )
+        FollowedAuthor.objects.create(user=self.reader, author=self.followed)
+
+    def test_unfollowed_authors_first_by_relevance(self):
+        authors = list(User.objects.recommended_authors(follower_id=self.reader.id))
+
+        self.assertEqual(
+            [author.username for author in authors],
+            ["prolific", "popular", "quiet", "followed"],
+        )
+        scores = {author.username: author.relevance_score for author in authors}
+        self.assertEqual(
+            scores, {"prolific": 4, "popular": 3, "quiet": 0, "followed": 3}
+        )
+        self.assertTrue(authors[-1].is_already_followed)
+        self.assertFalse(any(author.is_already_followed for author in authors[:-1]))
+
+    def test_limit_leaves_out_followed_authors(self):
+        with self.assertNumQueries(1):
+            authors = list(
+                User.objects.recommended_authors(follower_id=self.reader.id, limit=3)
+            )
+
+        self.assertNotIn(self.followed, authors)
+        self.assertNotIn(self.reader, authors)
@@ -9,6 +9,7 @@ from django.http import HttpResponse, JsonResponse
 from django.shortcuts import redirect, get_object_or_404, render
 
 from app.authentication.models import User, FollowedAuthor
+from app.fragment_cache import bump_queryset_versions, bump_version
 from app.notifications.views.services import save_notifications
 from app.rewards.models import Rewards
 from app.utils import (
@@ -108,7 +109,9 @@ def signup_service(request, *args, **kwargs):
 
 
 def select_role_service(request, id, role):
-    user = User.objects.filter(id=id).update(user_role=role)
+    user = User.objects.filter(id=id)
+    user.update(user_role=role)
+    bump_queryset_versions(user)
     response = JsonResponse({"message": "Account type selected"})
 
     if role == "reader":
@@ -121,26 +124,29 @@ def select_role_service(request, id, role):
 def select_preferences_service(request, id):
     preferences = request.POST.get("preferences", "")
     onboarding_info = [{"book_preferences": preferences.split(", ")}]
-    user = User.objects.filter(id=id).update(onboarding=onboarding_info)
+    user = User.objects.filter(id=id)
+    user.update(onboarding=onboarding_info)
+    bump_queryset_versions(user)
     response = JsonResponse({"message": "User preferences selected"})
     response["HX-Redirect"] = f"/authors/follow/{id}"
     return response
 
 
 def follow_author_service(request, id, author_id):
-    select_author = FollowedAuthor.objects.create(
+    select_author, created = FollowedAuthor.objects.get_or_create(
         user_id=id,
         author_id=author_id,
     )
-    author = User.objects.filter(id=author_id).first()
-
-    notification_message = f"""<p class="text-sm font-semibold text-gray-900">You have a new follower!</p>
-        <hr>
-        <p class="mt-2 text-xs text-gray-500">
-            <span class="font-semibold text-gray-900">{select_author.user.full_name()}</span> followed you!
-        </p>
-    """
-    save_notifications(user=author, message=notification_message)
+    if created:
+        author = User.objects.filter(id=author_id).first()
+
+        notification_message = f"""<p class="text-sm font-semibold text-gray-900">You have a new follower!</p>
+            <hr>
+            <p class="mt-2 text-xs text-gray-500">
+                <span class="font-semibold text-gray-900">{select_author.user.full_name()}</span> followed you!
+            </p>
+        """
+        save_notifications(user=author, message=notification_message)
     response = JsonResponse({"message": "Author followed"})
     response["HX-Redirect"] = f"/authors/follow/{id}"
     return response
@@ -239,6 +245,7 @@ def update_user_profile(request):
         birthday=birthday,
         age=calculate_age_from_string(birthday),
     )
+    bump_version(User, user.id)
 
     response = HttpResponse(
         f"""
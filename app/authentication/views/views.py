@@ -12,6 +12,7 @@ from google.oauth2 import id_token
 
 from app.authentication.forms import UserProfileForm
 from app.authentication.models import User, FollowedAuthor
+from app.fragment_cache import bump_queryset_versions
 from app.rewards.models import Rewards
 from app.social_newsfeed.models import SocialPost
 from app.utils import encrypt_str, generate_random_password
@@ -72,21 +73,9 @@ class FollowAuthorsView(ListView):
     def get_context_data(self, **kwargs):
         # Call the base implementation first to get the existing context
         context = super().get_context_data(**kwargs)
-        authors = User.objects.filter(user_role="writer").exclude(id=self.kwargs["id"])[
-            :5
-        ]
-        authors_list = [
-            {
-                "id": author.id,
-                "full_name": author.full_name(),
-                "username": author.username,
-                "profile_picture": author.profile_picture,
-                "is_already_followed": FollowedAuthor.objects.filter(
-                    user_id=self.kwargs["id"], author_id=author.id
-                ).exists(),
-            }
-            for author in authors
-        ]
+        authors_list = User.objects.recommended_authors(
+            follower_id=self.kwargs["id"], limit=5
+        )
         context["authors_list"] = authors_list
         # Add the URL parameter to the context
         context["id"] = self.kwargs["id"]
@@ -152,7 +141,9 @@ class ReferralCodeView(TemplateView):
 def verify_email(request, email_bytes):
     email = encrypt_str(email_bytes)
 
-    User.objects.filter(email=email).update(is_verified=True)
+    users = User.objects.filter(email=email)
+    users.update(is_verified=True)
+    bump_queryset_versions(users)
 
     return redirect("/signin")
 
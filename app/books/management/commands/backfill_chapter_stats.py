@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+
+from app.books.models import BooksChapter
+from app.books.rendering import RENDERED_FIELDS
+from app.fragment_cache import bump_queryset_versions
+
+
+class Command(BaseCommand):
+    help = (
+        "Render the stored sanitized HTML, plain text, word count, character "
+        "count, reading time and excerpt of chapters from their content."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Recompute every chapter, not only those never computed.",
+        )
+
+    def handle(self, *args, **options):
+        chapters = BooksChapter.objects.all()
+        if not options["all"]:
+            chapters = chapters.filter(content_html="")
+
+        # Page by id so each batch only holds batch-size chapters in memory
+        updated, last_id = 0, None
+        while True:
+            batch = chapters.with_content().order_by("id").only("id", "content")
+            if last_id is not None:
+                batch = batch.filter(id__gt=last_id)
+            batch = list(batch[: options["batch_size"]])
+            if not batch:
+                break
+
+            for chapter in batch:
+                for field, value in BooksChapter.rendered_fields(
+                    chapter.content
+                ).items():
+                    setattr(chapter, field, value)
+            BooksChapter.objects.bulk_update(batch, RENDERED_FIELDS)
+            bump_queryset_versions(
+                BooksChapter.objects.filter(id__in=[c.id for c in batch]), "book"
+            )
+
+            updated += len(batch)
+            last_id = batch[-1].id
+            self.stdout.write(f"{updated} chapters ...")
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Backfilled renderings of {updated} chapters.")
+        )
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+
+from app.books.models import BooksChapter
+from app.books.near_duplicates import index_chapter
+
+
+class Command(BaseCommand):
+    help = (
+        "Compute the MinHash signature of chapters from their plain text, for "
+        "the near-duplicate index. Saved chapters are indexed by their "
+        "plagiarism check."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Recompute every chapter, not only those never indexed.",
+        )
+
+    def handle(self, *args, **options):
+        chapters = BooksChapter.objects.all()
+        if not options["all"]:
+            chapters = chapters.filter(signature__isnull=True)
+
+        # Page by id so each batch only holds batch-size chapters in memory
+        indexed, last_id = 0, None
+        while True:
+            batch = chapters.with_content().order_by("id").only("id", "content_text")
+            if last_id is not None:
+                batch = batch.filter(id__gt=last_id)
+            batch = list(batch[: options["batch_size"]])
+            if not batch:
+                break
+
+            for chapter in batch:
+                index_chapter(chapter.id, chapter.content_text)
+
+            indexed += len(batch)
+            last_id = batch[-1].id
+            self.stdout.write(f"{indexed} chapters ...")
+
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} chapters."))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from app.books.models import Books, UsersFavorites
+from app.fragment_cache import bump_queryset_versions
+
+
+class Command(BaseCommand):
+    help = "Recompute Books.reader_count from the UsersFavorites table."
+
+    def handle(self, *args, **options):
+        readers = (
+            UsersFavorites.objects.filter(book=OuterRef("pk"))
+            .values("book")
+            .annotate(total=Count("id"))
+            .values("total")
+        )
+        updated = Books.objects.update(reader_count=Coalesce(Subquery(readers), 0))
+        bump_queryset_versions(Books.objects.all())
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt reader counts for {updated} books.")
+        )
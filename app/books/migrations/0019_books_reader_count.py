@@ -0,0 +1,37 @@
+# Generated by Django 5.1.1 on 2026-10-18 20:42
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_reader_count(apps, schema_editor):
+    Books = apps.get_model("books", "Books")
+    UsersFavorites = apps.get_model("books", "UsersFavorites")
+
+    readers = (
+        UsersFavorites.objects.filter(book=OuterRef("pk"))
+        .values("book")
+        .annotate(total=Count("id"))
+        .values("total")
+    )
+    Books.objects.update(reader_count=Coalesce(Subquery(readers), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("books", "0018_invitecollaborators"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="books",
+            name="reader_count",
+            field=models.PositiveIntegerField(
+                default=0,
+                help_text="Number of readers who added this book to their favorites.",
+            ),
+        ),
+        migrations.RunPython(backfill_reader_count, migrations.RunPython.noop),
+    ]
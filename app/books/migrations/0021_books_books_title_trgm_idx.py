@@ -0,0 +1,23 @@
+# Generated by Django 5.1.1 on 2026-10-18 20:51
+
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("books", "0020_books_search_vector_books_books_search_vector_idx"),
+        ("authentication", "0012_trigram_extension_user_username_trgm_idx"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="books",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["title"],
+                name="books_title_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ),
+    ]
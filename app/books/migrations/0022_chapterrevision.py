@@ -0,0 +1,67 @@
+# Generated by Django 5.1.1 on 2026-10-18 21:20
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("books", "0021_books_books_title_trgm_idx"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ChapterRevision",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(blank=True, null=True)),
+                ("number", models.PositiveIntegerField()),
+                ("is_snapshot", models.BooleanField(default=False)),
+                ("data", models.BinaryField()),
+                ("content_hash", models.CharField(max_length=40)),
+                ("content_length", models.PositiveIntegerField()),
+                (
+                    "author",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="chapter_revisions",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "chapter",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="revisions",
+                        to="books.bookschapter",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Chapter Revision",
+                "verbose_name_plural": "Chapter Revisions",
+                "db_table": "chapter_revision",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("chapter", "number"),
+                        name="unique_chapter_revision_number",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.1 on 2026-10-18 21:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("books", "0022_chapterrevision"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="bookschapter",
+            name="character_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="bookschapter",
+            name="excerpt",
+            field=models.CharField(blank=True, default="", max_length=300),
+        ),
+        migrations.AddField(
+            model_name="bookschapter",
+            name="reading_time",
+            field=models.PositiveIntegerField(
+                default=0, help_text="Estimated reading time in minutes."
+            ),
+        ),
+        migrations.AddField(
+            model_name="bookschapter",
+            name="word_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
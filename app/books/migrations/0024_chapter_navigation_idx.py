@@ -0,0 +1,20 @@
+# Generated by Django 5.1.1 on 2026-10-18 21:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("books", "0023_bookschapter_text_stats"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="bookschapter",
+            index=models.Index(
+                fields=["book", "is_archived", "is_draft", "chapter_number"],
+                name="chapter_navigation_idx",
+            ),
+        ),
+    ]
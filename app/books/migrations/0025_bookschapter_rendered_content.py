@@ -0,0 +1,27 @@
+# Generated by Django 5.1.1 on 2026-10-18 21:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("books", "0024_chapter_navigation_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="bookschapter",
+            name="content_html",
+            field=models.TextField(
+                blank=True, default="", help_text="Sanitized content served to readers."
+            ),
+        ),
+        migrations.AddField(
+            model_name="bookschapter",
+            name="content_text",
+            field=models.TextField(
+                blank=True, default="", help_text="Plain text of the content."
+            ),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.1.1 on 2026-10-18 21:42
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def remove_duplicate_unlocks(apps, schema_editor):
+    """Keep the first payment of a chapter by a reader."""
+    ChapterUnlockedByUser = apps.get_model("books", "ChapterUnlockedByUser")
+
+    duplicates = (
+        ChapterUnlockedByUser.objects.values("paid_by", "chapter")
+        .annotate(total=Count("id"))
+        .filter(total__gt=1)
+    )
+    for pair in duplicates:
+        ids = list(
+            ChapterUnlockedByUser.objects.filter(
+                paid_by=pair["paid_by"], chapter=pair["chapter"]
+            )
+            .order_by("created_at", "id")
+            .values_list("id", flat=True)
+        )
+        ChapterUnlockedByUser.objects.filter(id__in=ids[1:]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("books", "0025_bookschapter_rendered_content"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name="usersfavorites",
+            name="unique_reader_book",
+        ),
+        migrations.AlterUniqueTogether(
+            name="usersfavorites",
+            unique_together=set(),
+        ),
+        migrations.RunPython(remove_duplicate_unlocks, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="chapterunlockedbyuser",
+            constraint=models.UniqueConstraint(
+                fields=("paid_by", "chapter"), name="unique_chapter_unlock"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="usersfavorites",
+            constraint=models.UniqueConstraint(
+                fields=("reader", "book"), name="unique_reader_book"
+            ),
+        ),
+    ]
@@ -0,0 +1,124 @@
+# Generated by Django 5.1.1 on 2026-10-18 21:44
+
+import app.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("books", "0026_unique_chapter_unlock_reader_book"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="books",
+            name="id",
+            field=models.UUIDField(
+                default=app.models.uuid7,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="bookschapter",
+            name="id",
+            field=models.UUIDField(
+                default=app.models.uuid7,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="categories",
+            name="id",
+            field=models.UUIDField(
+                default=app.models.uuid7,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="chapterrevision",
+            name="id",
+            field=models.UUIDField(
+                default=app.models.uuid7,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="chapterunlockedbyuser",
+            name="id",
+            field=models.UUIDField(
+                default=app.models.uuid7,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="comments",
+            name="id",
+            field=models.UUIDField(
+                default=app.models.uuid7,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="invitecollaborators",
+            name="id",
+            field=models.UUIDField(
+                default=app.models.uuid7,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="plagiarismcheckerlogs",
+            name="id",
+            field=models.UUIDField(
+                default=app.models.uuid7,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="rates",
+            name="id",
+            field=models.UUIDField(
+                default=app.models.uuid7,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="usersfavorites",
+            name="id",
+            field=models.UUIDField(
+                default=app.models.uuid7,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="usersstartedchapter",
+            name="id",
+            field=models.UUIDField(
+                default=app.models.uuid7,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+            ),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.1 on 2026-10-18 21:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("books", "0027_alter_books_id_alter_bookschapter_id_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="plagiarismcheckerlogs",
+            name="content_hash",
+            field=models.CharField(
+                blank=True,
+                default="",
+                help_text="Fingerprint of the checked text, see app.plagiarism.text_fingerprint.",
+                max_length=40,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="plagiarismcheckerlogs",
+            index=models.Index(
+                fields=["chapter", "content_hash"], name="plagiarism_log_content_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.1.1 on 2026-10-18 21:54
+
+import app.models
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("books", "0028_plagiarismcheckerlogs_content_hash"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ChapterSignature",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=app.models.uuid7,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(blank=True, null=True)),
+                ("signature", models.BinaryField()),
+                (
+                    "bands",
+                    django.contrib.postgres.fields.ArrayField(
+                        base_field=models.BigIntegerField(), size=None
+                    ),
+                ),
+                (
+                    "chapter",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="signature",
+                        to="books.bookschapter",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Chapter Signature",
+                "verbose_name_plural": "Chapter Signatures",
+                "db_table": "chapter_signature",
+                "indexes": [
+                    django.contrib.postgres.indexes.GinIndex(
+                        fields=["bands"], name="chapter_signature_bands_idx"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.1.1 on 2026-10-18 22:03
+
+from django.db import migrations, models
+from django.utils import timezone
+
+from app.enums import terminal_plagiarism_checker_states
+
+
+def schedule_pending_checks(apps, schema_editor):
+    """Poll the checks that are still pending at the next beat."""
+    PlagiarismCheckerLogs = apps.get_model("books", "PlagiarismCheckerLogs")
+
+    PlagiarismCheckerLogs.objects.exclude(
+        results__data__text__state__in=terminal_plagiarism_checker_states
+    ).exclude(results__data__has_key="report").update(next_poll_at=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("books", "0029_chaptersignature"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="plagiarismcheckerlogs",
+            name="next_poll_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="plagiarismcheckerlogs",
+            name="poll_attempts",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name="plagiarismcheckerlogs",
+            index=models.Index(
+                condition=models.Q(("next_poll_at__isnull", False)),
+                fields=["next_poll_at"],
+                name="plagiarism_log_next_poll_idx",
+            ),
+        ),
+        migrations.RunPython(schedule_pending_checks, migrations.RunPython.noop),
+    ]
@@ -1,13 +1,19 @@
-import math
-
 from autoslug import AutoSlugField
 from ckeditor.fields import RichTextField
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.db import models
-from django.db.models import Func, F, Count
+from django.db.models import Func, Count
 from django_tiptap.fields import TipTapTextField
 
-from app.enums import StartReadingChapter
+from app.books.rendering import RENDERED_FIELDS, render_chapter
+from app.enums import (
+    StartReadingChapter,
+    failed_plagiarism_checker_states,
+    terminal_plagiarism_checker_states,
+)
 from app.models import BaseModel
 
 
@@ -52,13 +58,33 @@ class Books(BaseModel):
     category = models.ManyToManyField(Categories, blank=True)
     is_published = models.BooleanField(default=True)
     slug = AutoSlugField(populate_from="title")
+    reader_count = models.PositiveIntegerField(
+        default=0,
+        help_text="Number of readers who added this book to their favorites.",
+    )
 
     co_authors = models.ManyToManyField(
         "authentication.User", blank=True, related_name="books_co_author"
     )
 
+    search_config = "english"
+    search_vector = models.GeneratedField(
+        expression=SearchVector("title", weight="A", config=search_config)
+        + SearchVector("description", weight="B", config=search_config),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
     class Meta:
         db_table = "books"
+        indexes = [
+            GinIndex(fields=["search_vector"], name="books_search_vector_idx"),
+            GinIndex(
+                fields=["title"],
+                name="books_title_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ]
         verbose_name = "Book Library"
         verbose_name_plural = "Book Libraries"
 
@@ -66,6 +92,53 @@ class Books(BaseModel):
         return self.title
 
 
+class BooksChapterQuerySet(models.QuerySet):
+    def with_content(self):
+        """Load ``content`` as well, for the reader and the editor."""
+        return self.defer(None)
+
+    def readable(self):
+        return self.filter(is_archived=False, is_draft=False)
+
+    def neighbours(self, chapter) -> dict:
+        """The readable chapters before and after ``chapter`` in its book.
+
+        Returns ``{"previous": ..., "next": ...}``, each a dict with the id,
+        slug, title, number and lock flag or None. Both come from one query of
+        two index seeks on ``chapter_navigation_idx``, without sorting.
+        """
+        siblings = (
+            self.readable()
+            .filter(book_id=chapter.book_id)
+            .values("id", "slug", "title", "chapter_number", "is_locked")
+        )
+        previous = siblings.filter(chapter_number__lt=chapter.chapter_number).order_by(
+            "-chapter_number"
+        )[:1]
+        following = siblings.filter(chapter_number__gt=chapter.chapter_number).order_by(
+            "chapter_number"
+        )[:1]
+
+        neighbours = {"previous": None, "next": None}
+        for row in previous.union(following, all=True):
+            if row["chapter_number"] < chapter.chapter_number:
+                neighbours["previous"] = row
+            else:
+                neighbours["next"] = row
+        return neighbours
+
+
+# Copies of content rendered on save, loaded only where they are served
+DEFERRED_RENDERINGS = ("content_html", "content_text")
+
+
+class BooksChapterManager(models.Manager.from_queryset(BooksChapterQuerySet)):
+    def get_queryset(self):
+        # Chapters can be hundreds of KB and most queries only need the
+        # title, number, slug and flags: leave content out unless asked for
+        return super().get_queryset().defer("content", *DEFERRED_RENDERINGS)
+
+
 class BooksChapter(BaseModel):
     book = models.ForeignKey("Books", on_delete=models.CASCADE, related_name="chapters")
     title = models.CharField(max_length=255)
@@ -77,19 +150,116 @@ class BooksChapter(BaseModel):
     is_archived = models.BooleanField(default=False)
     slug = AutoSlugField(populate_from="title")
 
+    # Renderings of the content, kept in step by save() and by every
+    # .update() of content through rendered_fields(), see app/books/rendering.py
+    content_html = models.TextField(
+        blank=True, default="", help_text="Sanitized content served to readers."
+    )
+    content_text = models.TextField(
+        blank=True, default="", help_text="Plain text of the content."
+    )
+    word_count = models.PositiveIntegerField(default=0)
+    character_count = models.PositiveIntegerField(default=0)
+    reading_time = models.PositiveIntegerField(
+        default=0, help_text="Estimated reading time in minutes."
+    )
+    excerpt = models.CharField(max_length=300, blank=True, default="")
+
+    objects = BooksChapterManager()
+
     class Meta:
         db_table = "books_chapter"
+        indexes = [
+            # Chapter lists and previous/next navigation within a book
+            models.Index(
+                fields=["book", "is_archived", "is_draft", "chapter_number"],
+                name="chapter_navigation_idx",
+            ),
+        ]
         verbose_name = "Chapter per book"
         verbose_name_plural = "Chapters per book"
 
     def __str__(self):
         return f"Chapter {self.chapter_number}: {self.title} | Book: {self.book.title}"
 
-    def get_reading_time(self) -> int:
-        word_count: int = len(self.content.split())
-        reading_speed_wpm: int = 200  # average reading speed in words per minute
-        reading_time_minutes: int = math.ceil(word_count / reading_speed_wpm)
-        return reading_time_minutes
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if "content" not in self.get_deferred_fields() and (
+            update_fields is None or "content" in update_fields
+        ):
+            for field, value in self.rendered_fields(self.content).items():
+                setattr(self, field, value)
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, *RENDERED_FIELDS}
+        super().save(*args, **kwargs)
+
+    @staticmethod
+    def rendered_fields(content: str) -> dict:
+        """Sanitized HTML, plain text and text statistics of ``content``."""
+        return render_chapter(content)
+
+
+class ChapterRevision(BaseModel):
+    """One saved version of a chapter's content, see app/books/revisions.py.
+
+    ``data`` is zlib compressed: the full content for a snapshot, otherwise
+    the diff from the previous revision.
+    """
+
+    chapter = models.ForeignKey(
+        "BooksChapter", on_delete=models.CASCADE, related_name="revisions"
+    )
+    number = models.PositiveIntegerField()
+    is_snapshot = models.BooleanField(default=False)
+    data = models.BinaryField()
+    content_hash = models.CharField(max_length=40)
+    content_length = models.PositiveIntegerField()
+    author = models.ForeignKey(
+        "authentication.User",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="chapter_revisions",
+    )
+
+    class Meta:
+        db_table = "chapter_revision"
+        verbose_name = "Chapter Revision"
+        verbose_name_plural = "Chapter Revisions"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["chapter", "number"], name="unique_chapter_revision_number"
+            )
+        ]
+
+    def __str__(self):
+        return f"Revision {self.number} of {self.chapter.title}"
+
+
+class ChapterSignature(BaseModel):
+    """MinHash signature of a chapter's text, see app/books/near_duplicates.py.
+
+    ``signature`` packs the MinHash values as little endian 32 bit integers,
+    ``bands`` holds one hash per LSH band: chapters sharing any band hash are
+    near-duplicate candidates, found through the GIN index.
+    """
+
+    chapter = models.OneToOneField(
+        "BooksChapter", on_delete=models.CASCADE, related_name="signature"
+    )
+    signature = models.BinaryField()
+    bands = ArrayField(models.BigIntegerField())
+
+    class Meta:
+        db_table = "chapter_signature"
+        verbose_name = "Chapter Signature"
+        verbose_name_plural = "Chapter Signatures"
+        indexes = [
+            GinIndex(fields=["bands"], name="chapter_signature_bands_idx"),
+        ]
+
+    def __str__(self):
+        return f"Signature of {self.chapter.title}"
 
 
 class UsersStartedChapter(BaseModel):
@@ -142,10 +312,11 @@ class UsersFavorites(BaseModel):
         db_table = "users_favorites"
         verbose_name = "User's Favorites"
         verbose_name_plural = "User's Favorites"
-        unique_together = (("book", "reader"),)
         constraints = [
+            # Reader first: a reader's library and the "is it a favorite"
+            # checks filter on it, the book_id index serves the per book counts
             models.UniqueConstraint(
-                fields=["book", "reader"], name="unique_reader_book"
+                fields=["reader", "book"], name="unique_reader_book"
             )
         ]
 
@@ -166,6 +337,13 @@ class ChapterUnlockedByUser(BaseModel):
 
     class Meta:
         db_table = "chapter_unlocked_by_user"
+        constraints = [
+            # A chapter is paid for once, this also backs the "is it unlocked"
+            # checks of the reader and the chapter lists
+            models.UniqueConstraint(
+                fields=["paid_by", "chapter"], name="unique_chapter_unlock"
+            ),
+        ]
         verbose_name = "Chapter Unlocked By User"
         verbose_name_plural = "Chapter Unlocked By User"
 
@@ -173,6 +351,31 @@ class ChapterUnlockedByUser(BaseModel):
         return f"{self.chapter.title} unlocked by {self.paid_by.full_name()} via {self.method_of_payment}"
 
 
+class PlagiarismCheckerLogsQuerySet(models.QuerySet):
+    def pending(self):
+        """Checks whose report may still change: neither checked nor failed.
+
+        ``results`` holds the API's last answer. A text's state is in
+        ``data.text.state``, and a report is only served for checked texts.
+        """
+        return self.exclude(
+            results__data__text__state__in=terminal_plagiarism_checker_states
+        ).exclude(results__data__has_key="report")
+
+    def reusable(self):
+        """Checks whose results stand for their text: all but failed ones."""
+        # Spelled out for results without a state, which a plain exclude()
+        # would drop since NOT (NULL IN ...) is not true
+        return self.filter(
+            models.Q(results__data__text__state__isnull=True)
+            | ~models.Q(results__data__text__state__in=failed_plagiarism_checker_states)
+        )
+
+    def due(self, now):
+        """Pending checks whose report is to be polled by ``now``."""
+        return self.pending().filter(next_poll_at__lte=now)
+
+
 class PlagiarismCheckerLogs(BaseModel):
     book = models.ForeignKey(
         Books, on_delete=models.CASCADE, related_name="books_checked"
@@ -184,15 +387,45 @@ class PlagiarismCheckerLogs(BaseModel):
     log_id = models.CharField(max_length=10)
     words_count = models.IntegerField()
     results = models.JSONField(default=dict)
+    content_hash = models.CharField(
+        max_length=40,
+        blank=True,
+        default="",
+        help_text="Fingerprint of the checked text, see app.plagiarism.text_fingerprint.",
+    )
+    # When the report is polled next, None once it is final or polling gave up
+    next_poll_at = models.DateTimeField(null=True, blank=True)
+    poll_attempts = models.PositiveSmallIntegerField(default=0)
+
+    objects = PlagiarismCheckerLogsQuerySet.as_manager()
 
     class Meta:
         db_table = "plagiarism_checker_logs"
+        indexes = [
+            # Whether this text of the chapter was checked already
+            models.Index(
+                fields=["chapter", "content_hash"], name="plagiarism_log_content_idx"
+            ),
+            # Only the checks still being polled, what the beat task scans
+            models.Index(
+                fields=["next_poll_at"],
+                name="plagiarism_log_next_poll_idx",
+                condition=models.Q(next_poll_at__isnull=False),
+            ),
+        ]
         verbose_name = "Plagiarism Checker Logs"
         verbose_name_plural = "Plagiarism Checker Logs"
 
     def __str__(self):
         return f"{self.chapter.title}"
 
+    @property
+    def is_pending(self):
+        """``PlagiarismCheckerLogsQuerySet.pending()`` for the loaded results."""
+        data = (self.results or {}).get("data") or {}
+        state = (data.get("text") or {}).get("state")
+        return state not in terminal_plagiarism_checker_states and "report" not in data
+
 
 class Rates(BaseModel):
     book = models.ForeignKey(
@@ -216,17 +449,27 @@ class Rates(BaseModel):
         return Rates.objects.filter(book=self.book).count()
 
     def get_total_rates_per_book(self):
-        total_counts = Rates.objects.filter(book=self.book).count()
+        return Rates.get_rates_breakdown(book=self.book)
 
-        return (
-            Rates.objects.filter(book=self.book)
+    @classmethod
+    def get_rates_breakdown(cls, book):
+        """Return the star breakdown of a book's rates from a single grouped query.
+
+        Each item has the star ``count``, the number of rates with that star
+        (``total``) and its share of all rates (``percentage``), highest star first.
+        """
+        breakdown = list(
+            cls.objects.filter(book=book)
             .values("count")
-            .annotate(
-                total=Count("count"),
-                percentage=Round(F("total") * 100.0 / total_counts),
-            )
+            .annotate(total=Count("id"))
             .order_by("-count")
         )
+        total_counts = sum(rate["total"] for rate in breakdown)
+
+        for rate in breakdown:
+            rate["percentage"] = round(rate["total"] * 100.0 / total_counts)
+
+        return breakdown
 
 
 class Comments(BaseModel):
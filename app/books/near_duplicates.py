@@ -0,0 +1,168 @@
+"""Near-duplicate detection of chapters with MinHash and LSH.
+
+A chapter's text is cut into shingles of ``SHINGLE_WORDS`` consecutive words.
+Its signature is a one permutation MinHash: the 64 bit hash of each shingle
+picks one of ``NUM_HASHES`` bins and the bin keeps the smallest value it gets,
+so signing costs one hash per shingle instead of one per shingle and
+permutation. Bins no shingle fell into are filled from other bins
+(densification). The share of equal values in two signatures estimates the
+Jaccard similarity of the chapters' shingle sets.
+
+The signature is cut into ``BANDS`` bands of ``ROWS`` values and each band is
+hashed. Chapters with similarity s share at least one band hash with
+probability 1 - (1 - s^ROWS)^BANDS: about 95% at 0.8 and 6% at 0.5. Only those
+candidates, found through the GIN index on ``ChapterSignature.bands``, are
+compared.
+"""
+
+import hashlib
+import itertools
+import re
+import struct
+import unicodedata
+from typing import List, Optional
+
+from django.conf import settings
+
+from app.books.models import ChapterSignature
+
+SHINGLE_WORDS = 5
+NUM_HASHES = 128
+BANDS = 16
+ROWS = NUM_HASHES // BANDS
+
+WORD_RE = re.compile(r"\w+")
+VALUE_MASK = 0xFFFFFFFF
+SIGNATURE_FORMAT = f"<{NUM_HASHES}I"
+
+
+def _hash64(data: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little")
+
+
+def shingles(text: str) -> set:
+    words = WORD_RE.findall(unicodedata.normalize("NFKC", text).casefold())
+    return {
+        " ".join(words[i : i + SHINGLE_WORDS]).encode()
+        for i in range(len(words) - SHINGLE_WORDS + 1)
+    }
+
+
+def signature(text: str) -> Optional[List[int]]:
+    """MinHash values of ``text``, None if it is too short to have a shingle."""
+    bins: List[Optional[int]] = [None] * NUM_HASHES
+    for shingle in shingles(text):
+        hashed = _hash64(shingle)
+        index, value = hashed % NUM_HASHES, (hashed // NUM_HASHES) & VALUE_MASK
+        if bins[index] is None or value < bins[index]:
+            bins[index] = value
+    if all(value is None for value in bins):
+        return None
+
+    # An empty bin copies the bin a fixed probe sequence of its own lands on
+    # first, so equal texts still get equal signatures
+    filled = list(bins)
+    for index, value in enumerate(bins):
+        attempt = 0
+        while value is None:
+            probe = _hash64(f"{index}:{attempt}".encode()) % NUM_HASHES
+            value = bins[probe]
+            attempt += 1
+        filled[index] = value
+    return filled
+
+
+def pack(values: List[int]) -> bytes:
+    return struct.pack(SIGNATURE_FORMAT, *values)
+
+
+def unpack(data) -> tuple:
+    return struct.unpack(SIGNATURE_FORMAT, bytes(data))
+
+
+def band_hashes(values: List[int]) -> List[int]:
+    """One signed 64 bit hash per band, the band number included so equal
+    values in different bands do not match."""
+    hashes = []
+    for band in range(BANDS):
+        rows = values[band * ROWS : (band + 1) * ROWS]
+        hashed = _hash64(struct.pack(f"<I{ROWS}I", band, *rows))
+        hashes.append(hashed - (1 << 64) if hashed >= 1 << 63 else hashed)
+    return hashes
+
+
+def similarity(a, b) -> float:
+    """Estimated Jaccard similarity of two packed signatures."""
+    return sum(x == y for x, y in zip(unpack(a), unpack(b))) / NUM_HASHES
+
+
+def index_chapter(chapter_id, text: str) -> Optional[ChapterSignature]:
+    """Store the signature of the chapter's current text, called on save."""
+    values = signature(text)
+    if values is None:
+        ChapterSignature.objects.filter(chapter_id=chapter_id).delete()
+        return None
+    record, _ = ChapterSignature.objects.update_or_create(
+        chapter_id=chapter_id,
+        defaults={"signature": pack(values), "bands": band_hashes(values)},
+    )
+    return record
+
+
+def near_duplicates(
+    record: ChapterSignature,
+    exclude_author_id=None,
+    created_before=None,
+    threshold=None,
+) -> List[dict]:
+    """Chapters whose estimated similarity to ``record`` reaches ``threshold``
+    (``NEAR_DUPLICATE_THRESHOLD`` by default), most similar first.
+
+    Archived chapters and those of ``exclude_author_id`` are left out: authors
+    may reuse their own text. With ``created_before``, only chapters created
+    earlier are matched, so a copy is flagged and not the original it copied.
+    """
+    threshold = settings.NEAR_DUPLICATE_THRESHOLD if threshold is None else threshold
+    candidates = (
+        ChapterSignature.objects.filter(bands__overlap=record.bands)
+        .exclude(chapter_id=record.chapter_id)
+        .exclude(chapter__is_archived=True)
+    )
+    if exclude_author_id is not None:
+        candidates = candidates.exclude(chapter__book__author_id=exclude_author_id)
+    if created_before is not None:
+        candidates = candidates.filter(chapter__created_at__lt=created_before)
+
+    # No LIMIT in the query: Postgres overestimates how many rows ``&&``
+    # matches and with a LIMIT prefers a sequential scan to the GIN index
+    rows = candidates.values_list("chapter_id", "chapter__book_id", "signature")
+    matches = []
+    for chapter_id, book_id, data in itertools.islice(
+        rows, settings.NEAR_DUPLICATE_MAX_CANDIDATES
+    ):
+        score = similarity(record.signature, data)
+        if score >= threshold:
+            matches.append(
+                {
+                    "chapter_id": str(chapter_id),
+                    "book_id": str(book_id),
+                    "similarity": round(score, 3),
+                }
+            )
+    return sorted(matches, key=lambda match: match["similarity"], reverse=True)
+
+
+def local_report(matches: List[dict]) -> dict:
+    """Plagiarism log results for a chapter flagged here, shaped like the
+    API's reports so the plagiarism table shows them the same way."""
+    return {
+        "success": True,
+        "source": "near_duplicates",
+        "data": {
+            "text": {"state": 5},
+            "report": {
+                "percent": round(matches[0]["similarity"] * 100, 1),
+                "matches": matches,
+            },
+        },
+    }
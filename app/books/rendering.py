@@ -0,0 +1,213 @@
+"""Render pipeline run once when a chapter's content is saved.
+
+The editor's HTML is sanitized against an allowlist, Cloudinary images are
+rewritten to responsive, auto-format variants, and the plain text is
+extracted. The reader page serves the stored HTML and the plagiarism checker
+the stored text, so neither parses HTML per request.
+"""
+
+import math
+import re
+from urllib.parse import urlparse
+
+from bs4 import BeautifulSoup, Comment, NavigableString
+
+ALLOWED_TAGS = {
+    "a",
+    "b",
+    "blockquote",
+    "br",
+    "code",
+    "em",
+    "figcaption",
+    "figure",
+    "h1",
+    "h2",
+    "h3",
+    "h4",
+    "h5",
+    "h6",
+    "hr",
+    "i",
+    "img",
+    "li",
+    "ol",
+    "p",
+    "pre",
+    "s",
+    "span",
+    "strong",
+    "sub",
+    "sup",
+    "table",
+    "tbody",
+    "td",
+    "tfoot",
+    "th",
+    "thead",
+    "tr",
+    "u",
+    "ul",
+}
+ALLOWED_ATTRIBUTES = {
+    "a": {"href", "title"},
+    "img": {"src", "alt", "title", "width", "height"},
+    "td": {"colspan", "rowspan"},
+    "th": {"colspan", "rowspan"},
+}
+URL_ATTRIBUTES = {"href", "src"}
+ALLOWED_SCHEMES = {"", "http", "https", "mailto"}
+
+# The editor's alignment and colour buttons only set these, on any tag
+ALLOWED_STYLES = {"text-align", "color", "background-color"}
+STYLE_VALUE_RE = re.compile(
+    r"^(#[0-9a-f]{3,8}|[a-z-]+|rgba?\([\d\s.,%]+\))$", re.IGNORECASE
+)
+
+# Dropped with everything inside them; other unknown tags keep their text
+DROPPED_TAGS = {"script", "style", "iframe", "object", "embed", "form", "template"}
+
+# Tags that end a line of the plain text
+BLOCK_TAGS = {
+    "blockquote",
+    "br",
+    "div",
+    "figcaption",
+    "h1",
+    "h2",
+    "h3",
+    "h4",
+    "h5",
+    "h6",
+    "hr",
+    "li",
+    "p",
+    "pre",
+    "td",
+    "th",
+    "tr",
+}
+
+CLOUDINARY_UPLOAD_RE = re.compile(
+    r"^(https?://res\.cloudinary\.com/[^/]+/image/upload/)(.+)$"
+)
+RESPONSIVE_WIDTHS = (480, 800, 1200)
+READER_IMAGE_SIZES = "(max-width: 768px) 100vw, 672px"
+
+EXCERPT_LENGTH = 280
+READING_SPEED_WPM = 200  # average reading speed in words per minute
+
+
+def cloudinary_variant(url: str, width: int) -> str:
+    """``url`` resized to ``width`` in the best format the browser accepts."""
+    match = CLOUDINARY_UPLOAD_RE.match(url)
+    return f"{match[1]}f_auto,q_auto,c_limit,w_{width}/{match[2]}"
+
+
+def _is_safe_url(url: str) -> bool:
+    return urlparse(url.strip()).scheme.lower() in ALLOWED_SCHEMES
+
+
+def clean_style(style: str) -> str:
+    """``style`` with only the allowed properties and plain values, no
+    ``url()`` or ``expression()``."""
+    declarations = []
+    for declaration in style.split(";"):
+        name, _, value = declaration.partition(":")
+        name, value = name.strip().lower(), value.strip()
+        if name in ALLOWED_STYLES and STYLE_VALUE_RE.match(value):
+            declarations.append(f"{name}: {value}")
+    return "; ".join(declarations)
+
+
+def sanitize(soup: BeautifulSoup):
+    for comment in soup.find_all(string=lambda text: isinstance(text, Comment)):
+        comment.extract()
+
+    for tag in soup.find_all(True):
+        if tag.decomposed:
+            continue
+        if tag.name in DROPPED_TAGS:
+            tag.decompose()
+            continue
+        if tag.name not in ALLOWED_TAGS:
+            if tag.name in BLOCK_TAGS:
+                # Keep the line breaks, or the words on both sides would merge
+                tag.insert_before(NavigableString("\n"))
+                tag.append(NavigableString("\n"))
+            tag.unwrap()
+            continue
+
+        allowed = ALLOWED_ATTRIBUTES.get(tag.name, set())
+        for attribute in list(tag.attrs):
+            value = tag.attrs[attribute]
+            if attribute == "style":
+                value = clean_style(value)
+                if value:
+                    tag["style"] = value
+                    continue
+            if attribute not in allowed or (
+                attribute in URL_ATTRIBUTES and not _is_safe_url(value)
+            ):
+                del tag.attrs[attribute]
+
+        if tag.name == "a" and tag.get("href"):
+            tag["rel"] = "nofollow noopener noreferrer"
+
+
+def make_images_responsive(soup: BeautifulSoup):
+    for image in soup.find_all("img"):
+        image["loading"] = "lazy"
+        src = image.get("src", "")
+        if not CLOUDINARY_UPLOAD_RE.match(src):
+            continue
+        image["src"] = cloudinary_variant(src, RESPONSIVE_WIDTHS[1])
+        image["srcset"] = ", ".join(
+            f"{cloudinary_variant(src, width)} {width}w" for width in RESPONSIVE_WIDTHS
+        )
+        image["sizes"] = READER_IMAGE_SIZES
+
+
+def extract_text(soup: BeautifulSoup) -> str:
+    """Plain text, one line per block element."""
+    for tag in soup.find_all(BLOCK_TAGS):
+        tag.insert_before(NavigableString("\n"))
+        tag.append(NavigableString("\n"))
+    lines = (" ".join(line.split()) for line in soup.get_text().splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def render_chapter(content: str) -> dict:
+    """The stored renderings of ``content``: safe HTML, plain text and the
+    text statistics, keyed by their ``BooksChapter`` field."""
+    soup = BeautifulSoup(content, "html.parser")
+    sanitize(soup)
+    make_images_responsive(soup)
+    content_html = str(soup)
+
+    text = extract_text(soup)
+    flat_text = " ".join(text.split())
+    word_count = len(flat_text.split())
+
+    excerpt = flat_text
+    if len(flat_text) > EXCERPT_LENGTH:
+        excerpt = flat_text[: EXCERPT_LENGTH - 1].rsplit(" ", 1)[0] + "\u2026"
+
+    return {
+        "content_html": content_html,
+        "content_text": text,
+        "word_count": word_count,
+        "character_count": len(flat_text),
+        "reading_time": math.ceil(word_count / READING_SPEED_WPM),
+        "excerpt": excerpt,
+    }
+
+
+RENDERED_FIELDS = (
+    "content_html",
+    "content_text",
+    "word_count",
+    "character_count",
+    "reading_time",
+    "excerpt",
+)
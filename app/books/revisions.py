@@ -0,0 +1,212 @@
+"""Chapter revision history stored as compressed diffs.
+
+Every save of a chapter's content records a ``ChapterRevision``. A revision
+normally holds the diff from the previous one, in the operation format of the
+collaborative editor (see app/websockets/collaboration.py). It holds a full
+snapshot instead once the diffs since the last snapshot outweigh the content,
+or after ``CHAPTER_REVISION_MAX_CHAIN`` diffs. Rebuilding any revision
+therefore reads one snapshot and a bounded chain of diffs, and the history
+grows with the size of the edits rather than with revisions x chapter size.
+"""
+
+import hashlib
+import json
+import re
+import zlib
+from difflib import SequenceMatcher
+from typing import List, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Length
+
+from app.books.models import BooksChapter, ChapterRevision
+from app.fragment_cache import bump_queryset_versions
+from app.websockets.collaboration import Operation, apply
+
+# Tags and words, each with the whitespace following it. Every character must
+# land in a token, hence the alternative for a stray "<"
+TOKEN_RE = re.compile(r"<[^>]*>\s*|[^<\s]+\s*|<\s*|\s+")
+
+# Past this many tokens on both sides a changed span is stored as a replacement
+# instead of being matched, SequenceMatcher is quadratic in the worst case
+MAX_DIFF_TOKENS = 20_000
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha1(content.encode()).hexdigest()
+
+
+def _push(op: Operation, component):
+    if component == 0 or component == "":
+        return
+    if op and type(op[-1]) is type(component):
+        if isinstance(component, str) or (op[-1] > 0) == (component > 0):
+            op[-1] += component
+            return
+    op.append(component)
+
+
+def diff(old: str, new: str) -> Operation:
+    """The operation turning ``old`` into ``new``, matched word by word."""
+    prefix = 0
+    limit = min(len(old), len(new))
+    while prefix < limit and old[prefix] == new[prefix]:
+        prefix += 1
+    suffix = 0
+    while (
+        suffix < limit - prefix
+        and old[len(old) - 1 - suffix] == new[len(new) - 1 - suffix]
+    ):
+        suffix += 1
+
+    op: Operation = []
+    _push(op, prefix)
+    old_tokens = TOKEN_RE.findall(old[prefix : len(old) - suffix])
+    new_tokens = TOKEN_RE.findall(new[prefix : len(new) - suffix])
+
+    if min(len(old_tokens), len(new_tokens)) > MAX_DIFF_TOKENS:
+        opcodes = [("replace", 0, len(old_tokens), 0, len(new_tokens))]
+    else:
+        opcodes = SequenceMatcher(None, old_tokens, new_tokens).get_opcodes()
+
+    for tag, i1, i2, j1, j2 in opcodes:
+        removed = sum(map(len, old_tokens[i1:i2]))
+        if tag == "equal":
+            _push(op, removed)
+            continue
+        _push(op, -removed)
+        _push(op, "".join(new_tokens[j1:j2]))
+
+    _push(op, suffix)
+    return op
+
+
+def _compress(value) -> bytes:
+    if not isinstance(value, str):
+        value = json.dumps(value, separators=(",", ":"))
+    return zlib.compress(value.encode())
+
+
+def _create(chapter_id, number, content, data, is_snapshot, author):
+    return ChapterRevision.objects.create(
+        chapter_id=chapter_id,
+        number=number,
+        is_snapshot=is_snapshot,
+        data=data,
+        content_hash=content_hash(content),
+        content_length=len(content),
+        author=author,
+    )
+
+
+def record_revision(chapter_id, content: str, author=None) -> ChapterRevision:
+    """Record ``content`` as the chapter's next revision.
+
+    Call it in the transaction that saves ``content``, before the update: the
+    previous revision is diffed against the content still in the row, which
+    stays locked until the transaction ends.
+    """
+    with transaction.atomic():
+        previous = (
+            BooksChapter.objects.select_for_update()
+            .values_list("content", flat=True)
+            .get(pk=chapter_id)
+        )
+        revisions = ChapterRevision.objects.filter(chapter_id=chapter_id)
+        latest = revisions.only("number", "content_hash").order_by("-number").first()
+        number = latest.number + 1 if latest else 1
+
+        # No history yet, or the row was changed without recording a revision
+        # (e.g. from the admin): the content in the row becomes a snapshot
+        if latest is None or latest.content_hash != content_hash(previous):
+            if previous == content:
+                return _create(
+                    chapter_id, number, content, _compress(content), True, author
+                )
+            latest = _create(
+                chapter_id, number, previous, _compress(previous), True, None
+            )
+            number += 1
+        elif previous == content:
+            return latest
+
+        snapshot = _compress(content)
+        delta = _compress(diff(previous, content))
+
+        last_snapshot = revisions.filter(is_snapshot=True).order_by("-number")
+        chain = revisions.filter(
+            number__gt=Subquery(last_snapshot.values("number")[:1])
+        ).aggregate(count=Count("id"), size=Sum(Length("data")))
+
+        is_snapshot = chain["count"] + 1 >= settings.CHAPTER_REVISION_MAX_CHAIN or (
+            chain["size"] or 0
+        ) + len(delta) >= len(snapshot)
+        return _create(
+            chapter_id,
+            number,
+            content,
+            snapshot if is_snapshot else delta,
+            is_snapshot,
+            author,
+        )
+
+
+def reconstruct(chapter_id, number: int) -> str:
+    """Content of revision ``number``: its last snapshot plus the diffs since."""
+    snapshot_number = (
+        ChapterRevision.objects.filter(
+            chapter_id=OuterRef("chapter_id"), number__lte=number, is_snapshot=True
+        )
+        .order_by("-number")
+        .values("number")[:1]
+    )
+    chain = (
+        ChapterRevision.objects.filter(
+            chapter_id=chapter_id,
+            number__lte=number,
+            number__gte=Subquery(snapshot_number),
+        )
+        .order_by("number")
+        .values_list("is_snapshot", "data", "number")
+    )
+
+    content: Optional[str] = None
+    found = False
+    for is_snapshot, data, revision_number in chain:
+        data = zlib.decompress(data).decode()
+        content = data if is_snapshot else apply(content, json.loads(data))
+        found = revision_number == number
+    if not found:
+        raise ChapterRevision.DoesNotExist(f"Chapter has no revision {number}")
+    return content
+
+
+def list_revisions(chapter_id) -> List[dict]:
+    return list(
+        ChapterRevision.objects.filter(chapter_id=chapter_id)
+        .order_by("-number")
+        .values(
+            "number",
+            "is_snapshot",
+            "content_length",
+            "created_at",
+            "author__first_name",
+            "author__last_name",
+        )
+    )
+
+
+def restore_revision(chapter_id, number: int, author=None) -> str:
+    """Make revision ``number`` the chapter's content again and return it.
+
+    The restore is itself recorded as a new revision, so it can be undone.
+    """
+    with transaction.atomic():
+        content = reconstruct(chapter_id, number)
+        record_revision(chapter_id, content, author)
+        chapters = BooksChapter.objects.filter(pk=chapter_id)
+        chapters.update(content=content, **BooksChapter.rendered_fields(content))
+        bump_queryset_versions(chapters, "book")
+    return content
@@ -0,0 +1,29 @@
+from django import template
+from django.db.models import prefetch_related_objects
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from app.books.models import Books
+from app.fragment_cache import cached_fragments
+
+register = template.Library()
+
+
+@register.simple_tag
+def render_book_cards(books):
+    """Render one ``components/book_card.html`` per book, cached per book version.
+
+    Categories are only prefetched for the cards that missed the cache.
+    """
+    books = {book.pk: book for book in books}
+
+    def build_many(pks):
+        missing = [books[pk] for pk in pks]
+        prefetch_related_objects(missing, "category")
+        return {
+            book.pk: render_to_string("components/book_card.html", {"book": book})
+            for book in missing
+        }
+
+    cards = cached_fragments("book_card", Books, books, build_many)
+    return mark_safe("".join(cards[pk] for pk in books))
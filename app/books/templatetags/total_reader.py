@@ -1,12 +1,9 @@
 from django import template
 
-from app.books.models import UsersFavorites
-
 register = template.Library()
 
 
 @register.filter
-def total_reader(id):
-    count = UsersFavorites.objects.filter(book_id=id).count()
+def total_reader(count):
     label = "reader" if count <= 1 else "readers"
     return f"{count} {label}"
@@ -1,3 +1,873 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from app.authentication.models import User
+from app.books.models import (
+    Books,
+    BooksChapter,
+    ChapterRevision,
+    ChapterUnlockedByUser,
+    PlagiarismCheckerLogs,
+    Rates,
+    UsersFavorites,
+)
+from app.books.near_duplicates import (
+    index_chapter,
+    near_duplicates,
+    pack,
+    signature,
+    similarity,
+)
+from app.books.revisions import reconstruct, record_revision
+from app.books.views.services import check_if_book_already_started
+from app.forum.models import Community
+from app.fragment_cache import fragment_stats
+from app.notifications.models import Notifications
+from app.search import trigram_suggestions
+from app.tasks import (
+    poll_plagiarism_reports,
+    run_plagiarism_checker_tasks,
+    schedule_plagiarism_check,
+)
+
 
 # Create your tests here.
+class BookDetailQueryCountTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(
+            username="author", first_name="Ada", last_name="Writer", user_role="writer"
+        )
+        self.reader = User.objects.create_user(
+            username="reader", first_name="Rey", last_name="Reader", user_role="reader"
+        )
+        self.book = Books.objects.create(
+            title="A Long Serial", description="Serial", author=self.author
+        )
+        Rates.objects.create(book=self.book, count=5, review="Great", user=self.reader)
+        Rates.objects.create(book=self.book, count=3, review="Okay", user=self.author)
+        self.client.force_login(self.reader)
+
+    def add_chapters(self, count):
+        start = self.book.chapters.count()
+        # Run the fragment cache version bumps that normally fire on commit.
+        with self.captureOnCommitCallbacks(execute=True):
+            for number in range(start + 1, start + count + 1):
+                BooksChapter.objects.create(
+                    book=self.book,
+                    title=f"Chapter {number}",
+                    chapter_number=number,
+                    content="<p>content</p>",
+                    is_draft=False,
+                    is_locked=True,
+                )
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse("book_detail", kwargs={"slug": self.book.slug})
+            )
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response
+
+    def test_query_count_does_not_grow_with_chapters(self):
+        self.add_chapters(3)
+        few_chapters_queries, _ = self.count_queries()
+
+        self.add_chapters(30)
+        many_chapters_queries, response = self.count_queries()
+
+        self.assertEqual(len(response.context["chapters"]), 33)
+        self.assertEqual(few_chapters_queries, many_chapters_queries)
+
+    def test_unlocked_chapters_are_not_locked_for_the_reader(self):
+        self.add_chapters(3)
+        unlocked = self.book.chapters.get(chapter_number=2)
+        ChapterUnlockedByUser.objects.create(
+            chapter=unlocked, paid_by=self.reader, method_of_payment="coins"
+        )
+
+        _, response = self.count_queries()
+
+        is_locked = {
+            chapter["chapter_number"]: chapter["is_locked"]
+            for chapter in response.context["chapters"]
+        }
+        self.assertEqual(is_locked, {1: True, 2: False, 3: True})
+
+    def test_rate_breakdown(self):
+        _, response = self.count_queries()
+
+        self.assertEqual(
+            response.context["rate_count"],
+            [
+                {"count": 5, "total": 1, "percentage": 50},
+                {"count": 3, "total": 1, "percentage": 50},
+            ],
+        )
+
+
+class BookDetailFragmentCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(
+            username="author", first_name="Ada", last_name="Writer", user_role="writer"
+        )
+        self.book = Books.objects.create(
+            title="Cached Serial", description="Serial", author=self.author
+        )
+        self.chapter = BooksChapter.objects.create(
+            book=self.book,
+            title="Chapter 1",
+            chapter_number=1,
+            content="<p>content</p>",
+            is_draft=False,
+        )
+        self.client.force_login(self.author)
+
+    def get_chapters(self):
+        response = self.client.get(
+            reverse("book_detail", kwargs={"slug": self.book.slug})
+        )
+        return [chapter["title"] for chapter in response.context["chapters"]]
+
+    def test_chapter_list_is_served_from_cache(self):
+        self.get_chapters()
+        self.get_chapters()
+
+        stats = fragment_stats(["book_chapters"])["book_chapters"]
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+    def test_saving_a_chapter_invalidates_the_chapter_list(self):
+        self.assertEqual(self.get_chapters(), ["Chapter 1"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.chapter.title = "Renamed"
+            self.chapter.save()
+
+        self.assertEqual(self.get_chapters(), ["Renamed"])
+
+    def test_rating_invalidates_the_breakdown(self):
+        self.client.get(reverse("book_detail", kwargs={"slug": self.book.slug}))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Rates.objects.create(
+                book=self.book, count=4, review="Nice", user=self.author
+            )
+
+        response = self.client.get(
+            reverse("book_detail", kwargs={"slug": self.book.slug})
+        )
+        self.assertEqual(
+            response.context["rate_count"],
+            [{"count": 4, "total": 1, "percentage": 100}],
+        )
+
+
+class ReaderCountTest(TestCase):
+    def setUp(self):
+        author = User.objects.create_user(username="author", user_role="writer")
+        self.book = Books.objects.create(title="Loved", description="", author=author)
+        self.reader = User.objects.create_user(username="reader")
+        self.client.force_login(self.reader)
+
+    def toggle_favorite(self):
+        response = self.client.post(
+            reverse("add_to_favorites", kwargs={"slug": self.book.slug})
+        )
+        self.assertEqual(response.status_code, 200)
+        self.book.refresh_from_db()
+        return self.book.reader_count
+
+    def test_favoriting_moves_the_count_by_one(self):
+        self.assertEqual(self.toggle_favorite(), 1)
+        self.assertEqual(self.toggle_favorite(), 0)
+        self.assertEqual(self.toggle_favorite(), 1)
+
+    def test_count_never_goes_below_zero(self):
+        # Favorited before the count was kept, so the count is behind
+        UsersFavorites.objects.create(book=self.book, reader=self.reader)
+
+        self.assertEqual(self.toggle_favorite(), 0)
+        self.assertFalse(UsersFavorites.objects.exists())
+
+    def test_rebuild_fixes_drifted_counts(self):
+        UsersFavorites.objects.create(book=self.book, reader=self.reader)
+        unread = Books.objects.create(
+            title="Unread", description="", author=self.book.author, reader_count=7
+        )
+
+        call_command("rebuild_reader_counts", stdout=StringIO())
+
+        self.book.refresh_from_db()
+        unread.refresh_from_db()
+        self.assertEqual(self.book.reader_count, 1)
+        self.assertEqual(unread.reader_count, 0)
+
+
+class ChapterRevisionTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username="author", user_role="writer")
+        book = Books.objects.create(title="Drafts", description="", author=self.author)
+        self.chapter = BooksChapter.objects.create(
+            book=book, title="One", chapter_number=1, content="<p>first draft</p>"
+        )
+        self.client.force_login(self.author)
+
+    def save(self, content):
+        record_revision(self.chapter.id, content, self.author)
+        BooksChapter.objects.filter(pk=self.chapter.pk).update(content=content)
+
+    def test_every_revision_can_be_reconstructed(self):
+        contents = [
+            f"<p>draft {i} of a chapter about {'word ' * i}</p>" for i in range(30)
+        ]
+        with self.settings(CHAPTER_REVISION_MAX_CHAIN=10):
+            for content in contents:
+                self.save(content)
+
+        revisions = ChapterRevision.objects.filter(chapter=self.chapter)
+        # The row's content, then one revision per save
+        self.assertEqual(revisions.count(), 31)
+        self.assertLess(revisions.filter(is_snapshot=False).count(), 31)
+        self.assertEqual(reconstruct(self.chapter.id, 1), "<p>first draft</p>")
+        for number, content in enumerate(contents, start=2):
+            self.assertEqual(reconstruct(self.chapter.id, number), content)
+
+    def test_unchanged_content_does_not_add_a_revision(self):
+        self.save("<p>second draft</p>")
+        self.save("<p>second draft</p>")
+
+        self.assertEqual(self.chapter.revisions.count(), 2)
+
+    def test_list_and_restore_revisions(self):
+        self.save("<p>second draft</p>")
+
+        response = self.client.get(
+            reverse("chapter_revisions_service", kwargs={"slug": self.chapter.slug})
+        )
+        self.assertEqual(
+            [revision["number"] for revision in response.json()["revisions"]], [2, 1]
+        )
+
+        response = self.client.post(
+            reverse(
+                "restore_chapter_revision_service",
+                kwargs={"slug": self.chapter.slug, "number": 1},
+            )
+        )
+        self.assertEqual(response.status_code, 200)
+        self.chapter.refresh_from_db()
+        self.assertEqual(self.chapter.content, "<p>first draft</p>")
+        self.assertEqual(self.chapter.revisions.count(), 3)
+
+    def test_other_users_cannot_see_revisions(self):
+        self.client.force_login(User.objects.create_user(username="stranger"))
+
+        response = self.client.get(
+            reverse("chapter_revisions_service", kwargs={"slug": self.chapter.slug})
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_anonymous_users_cannot_see_revisions(self):
+        self.client.logout()
+
+        response = self.client.get(
+            reverse("chapter_revisions_service", kwargs={"slug": self.chapter.slug})
+        )
+        self.assertEqual(response.status_code, 403)
+
+
+class ChapterTextStatsTest(TestCase):
+    def setUp(self):
+        author = User.objects.create_user(username="author", user_role="writer")
+        self.book = Books.objects.create(title="Stats", description="", author=author)
+
+    def test_stats_count_text_not_markup(self):
+        chapter = BooksChapter.objects.create(
+            book=self.book,
+            title="One",
+            chapter_number=1,
+            content='<p class="lead">Tom &amp; Jerry</p>\n<p><strong>ran</strong></p>',
+        )
+
+        self.assertEqual(chapter.word_count, 4)
+        self.assertEqual(chapter.character_count, len("Tom & Jerry ran"))
+        self.assertEqual(chapter.reading_time, 1)
+        self.assertEqual(chapter.excerpt, "Tom & Jerry ran")
+
+    def test_backfill_command(self):
+        chapter = BooksChapter.objects.create(
+            book=self.book, title="One", chapter_number=1, content="<p>word</p>" * 450
+        )
+        BooksChapter.objects.filter(pk=chapter.pk).update(
+            content_html="", content_text="", word_count=0, excerpt=""
+        )
+
+        call_command("backfill_chapter_stats", stdout=StringIO())
+
+        chapter.refresh_from_db()
+        self.assertEqual(chapter.word_count, 450)
+        self.assertEqual(chapter.reading_time, 3)
+        self.assertTrue(chapter.excerpt.endswith("…"))
+        self.assertEqual(chapter.content_html, "<p>word</p>" * 450)
+        self.assertEqual(chapter.content_text, "\n".join(["word"] * 450))
+
+    def test_content_is_sanitized_on_save(self):
+        chapter = BooksChapter.objects.create(
+            book=self.book,
+            title="One",
+            chapter_number=1,
+            content=(
+                '<p onclick="steal()">Hi<script>alert(1)</script></p>'
+                "<!-- draft note -->"
+                '<p><a href="javascript:alert(1)">bad</a> '
+                '<a href="https://example.com">good</a></p>'
+                "<blink>kept text</blink>"
+                '<img src="https://res.cloudinary.com/demo/image/upload/v1/a.jpg">'
+            ),
+        )
+
+        html = chapter.content_html
+        self.assertNotIn("script", html)
+        self.assertNotIn("alert", html)
+        self.assertNotIn("onclick", html)
+        self.assertNotIn("draft note", html)
+        self.assertNotIn("blink", html)
+        self.assertIn(
+            '<a href="https://example.com" rel="nofollow noopener noreferrer">',
+            html,
+        )
+        self.assertIn(
+            'src="https://res.cloudinary.com/demo/image/upload/'
+            'f_auto,q_auto,c_limit,w_800/v1/a.jpg"',
+            html,
+        )
+        self.assertIn(" 1200w", html)
+        self.assertIn('loading="lazy"', html)
+        self.assertEqual(chapter.content_text, "Hi\nbad good\nkept text")
+
+    def test_unwrapped_blocks_and_editor_styles(self):
+        chapter = BooksChapter.objects.create(
+            book=self.book,
+            title="One",
+            chapter_number=1,
+            content=(
+                "<div>b</div>c d"
+                '<p style="text-align: center; color: rgb(224, 62, 45); '
+                'background-color: #fbeeb8; position: fixed">styled</p>'
+                "<p style=\"background-color: url('https://evil.test')\">plain</p>"
+            ),
+        )
+
+        self.assertEqual(chapter.word_count, 5)
+        self.assertEqual(chapter.content_text, "b\nc d\nstyled\nplain")
+        self.assertIn(
+            '<p style="text-align: center; color: rgb(224, 62, 45); '
+            'background-color: #fbeeb8">styled</p>',
+            chapter.content_html,
+        )
+        self.assertIn("<p>plain</p>", chapter.content_html)
+
+
+class ChapterContentDeferredTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username="author", user_role="writer")
+        self.book = Books.objects.create(
+            title="Heavy", description="", author=self.author
+        )
+        self.chapters = [
+            BooksChapter.objects.create(
+                book=self.book,
+                title=f"Chapter {number}",
+                chapter_number=number,
+                content="<p>long text</p>" * 1000,
+                is_draft=False,
+                is_locked=False,
+            )
+            for number in (1, 2, 3)
+        ]
+        self.client.force_login(self.author)
+
+    def assertContentNotSelected(self, queries):
+        for query in queries:
+            self.assertNotIn('"books_chapter"."content"', query["sql"])
+
+    def test_list_and_navigation_endpoints_do_not_select_content(self):
+        middle = self.chapters[1].slug
+        urls = [
+            reverse("book_detail", kwargs={"slug": self.book.slug}),
+            reverse("write_book_content", kwargs={"slug": self.book.slug}),
+            reverse("next_chapter_service", kwargs={"slug": middle}),
+            reverse("previous_chapter_service", kwargs={"slug": middle}),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                cache.clear()
+                with CaptureQueriesContext(connection) as queries:
+                    self.client.get(url)
+                self.assertContentNotSelected(queries.captured_queries)
+
+        request = RequestFactory().get("/")
+        request.user = self.author
+        with CaptureQueriesContext(connection) as queries:
+            check_if_book_already_started(request, middle)
+        self.assertContentNotSelected(queries.captured_queries)
+
+    def test_reader_and_editor_read_content_once(self):
+        cache.clear()
+        # The reader serves the HTML sanitized on save, the editor the source
+        for name, column in (
+            ("book_content_detail", '"books_chapter"."content_html"'),
+            ("update_book_content", '"books_chapter"."content"'),
+        ):
+            with self.subTest(name=name):
+                with CaptureQueriesContext(connection) as queries:
+                    # The last chapter, the reader has no next one to prerender
+                    response = self.client.get(
+                        reverse(name, kwargs={"slug": self.chapters[-1].slug})
+                    )
+                self.assertEqual(response.status_code, 200)
+                content_queries = [
+                    query
+                    for query in queries.captured_queries
+                    if '"books_chapter"."content' in query["sql"]
+                ]
+                self.assertEqual(len(content_queries), 1)
+                self.assertIn(column, content_queries[0]["sql"])
+
+
+class ChapterNavigationTest(TestCase):
+    def setUp(self):
+        author = User.objects.create_user(username="author", user_role="writer")
+        self.reader = User.objects.create_user(username="reader", user_role="reader")
+        book = Books.objects.create(title="Ordered", description="", author=author)
+        # Created out of order: navigation follows chapter_number
+        self.chapters = {
+            number: BooksChapter.objects.create(
+                book=book,
+                title=f"Chapter {number}",
+                chapter_number=number,
+                content="<p>text</p>",
+                is_draft=number == 3,
+                is_locked=number == 4,
+            )
+            for number in (4, 2, 1, 3, 5)
+        }
+        self.client.force_login(self.reader)
+
+    def test_neighbours_skip_drafts(self):
+        neighbours = BooksChapter.objects.neighbours(self.chapters[4])
+
+        self.assertEqual(neighbours["previous"]["chapter_number"], 2)
+        self.assertEqual(neighbours["next"]["chapter_number"], 5)
+        self.assertIsNone(BooksChapter.objects.neighbours(self.chapters[1])["previous"])
+        self.assertIsNone(BooksChapter.objects.neighbours(self.chapters[5])["next"])
+
+    def test_previous_chapter_service_goes_to_the_previous_chapter(self):
+        response = self.client.get(
+            reverse("previous_chapter_service", kwargs={"slug": self.chapters[2].slug})
+        )
+
+        self.assertEqual(
+            response["HX-Redirect"], f"/book/content/detail/{self.chapters[1].slug}"
+        )
+
+    def test_reader_page_links_to_accessible_neighbours(self):
+        response = self.client.get(
+            reverse("book_content_detail", kwargs={"slug": self.chapters[2].slug})
+        )
+
+        self.assertTrue(response.context["previous_chapter"]["is_accessible"])
+        # Chapter 4 is locked and not unlocked by the reader
+        self.assertEqual(response.context["next_chapter"]["chapter_number"], 4)
+        self.assertFalse(response.context["next_chapter"]["is_accessible"])
+
+        ChapterUnlockedByUser.objects.create(
+            chapter=self.chapters[4], paid_by=self.reader, method_of_payment="coins"
+        )
+        response = self.client.get(
+            reverse("book_content_detail", kwargs={"slug": self.chapters[2].slug})
+        )
+        self.assertContains(
+            response,
+            reverse("book_content_detail", kwargs={"slug": self.chapters[4].slug}),
+        )
+
+
+class ChapterPrefetchTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username="author", user_role="writer")
+        book = Books.objects.create(title="Serial", description="", author=self.author)
+        self.first, self.second = [
+            BooksChapter.objects.create(
+                book=book,
+                title=f"Part {number}",
+                chapter_number=number,
+                content=f"<p>part {number} text</p>",
+                is_draft=False,
+                is_locked=False,
+            )
+            for number in (1, 2)
+        ]
+        self.client.force_login(self.author)
+
+    def read(self, chapter):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse("book_content_detail", kwargs={"slug": chapter.slug})
+            )
+        content_queries = [
+            query
+            for query in queries.captured_queries
+            if '"books_chapter"."content_html"' in query["sql"]
+        ]
+        return response, len(content_queries)
+
+    def test_next_chapter_is_prefetched_and_served_from_cache(self):
+        response, content_queries = self.read(self.first)
+        self.assertContains(response, "part 1 text")
+        self.assertEqual(
+            response["Link"],
+            f"<{reverse('book_content_detail', kwargs={'slug': self.second.slug})}>; "
+            "rel=prefetch",
+        )
+        # This chapter's body and the next one's
+        self.assertEqual(content_queries, 2)
+
+        response, content_queries = self.read(self.second)
+        self.assertContains(response, "part 2 text")
+        self.assertNotIn("Link", response)
+        self.assertEqual(content_queries, 0)
+
+    def test_saving_a_chapter_renders_it_again(self):
+        self.read(self.second)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.second.content = "<p>rewritten</p>"
+            self.second.save()
+
+        response, content_queries = self.read(self.second)
+        self.assertContains(response, "rewritten")
+        self.assertEqual(content_queries, 1)
+
+
+class SearchSuggestTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        author = User.objects.create_user(username="dragonslayer", user_role="writer")
+        Books.objects.create(title="Dragon Riders", description="", author=author)
+        Community.objects.create(name="Dragons", description="")
+        Books.objects.create(
+            title="Dragons Unpublished",
+            description="",
+            author=author,
+            is_published=False,
+        )
+
+    def test_sources_are_merged_by_similarity(self):
+        suggestions = trigram_suggestions("dragons")
+
+        self.assertEqual(
+            [(suggestion["type"], suggestion["label"]) for suggestion in suggestions],
+            [
+                ("community", "Dragons"),
+                ("author", "dragonslayer"),
+                ("book", "Dragon Riders"),
+            ],
+        )
+        self.assertEqual(len(trigram_suggestions("dragons", limit=2)), 2)
+
+    def test_short_queries_are_not_searched(self):
+        url = reverse("search_suggest_service")
+        with mock.patch("app.books.views.services.trigram_suggestions") as suggestions:
+            response = self.client.get(url, {"search": " d "})
+
+        self.assertEqual(response.json(), {"suggestions": []})
+        suggestions.assert_not_called()
+
+    def test_equivalent_queries_share_a_cached_answer(self):
+        url = reverse("search_suggest_service")
+        with mock.patch(
+            "app.books.views.services.trigram_suggestions",
+            return_value=[{"type": "book", "label": "Dragon Riders", "url": "/"}],
+        ) as suggestions:
+            first = self.client.get(url, {"search": "Dragon  Riders"})
+            second = self.client.get(url, {"search": " dragon riders"})
+
+        suggestions.assert_called_once_with("dragon riders", limit=8)
+        self.assertEqual(first.json(), second.json())
+        self.assertIn("private", second["Cache-Control"])
+        self.assertIn(
+            f"max-age={settings.SEARCH_SUGGEST_CACHE_TTL}", second["Cache-Control"]
+        )
+
+
+class PlagiarismReportPollTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username="author", user_role="writer")
+        self.book = Books.objects.create(
+            title="Checked", description="", author=self.author
+        )
+        chapter = BooksChapter.objects.create(
+            book=self.book, title="One", chapter_number=1, content="<p>text</p>"
+        )
+        self.now = timezone.now()
+        self.logs = {
+            log_id: PlagiarismCheckerLogs.objects.create(
+                book=self.book,
+                chapter=chapter,
+                log_id=log_id,
+                words_count=1,
+                results=results,
+                next_poll_at=next_poll_at,
+            )
+            for log_id, results, next_poll_at in [
+                ("stored", {"data": {"text": {"id": 1, "state": 2}}}, self.now),
+                ("submitted", {"data": {"text": {"id": 2, "state": 3}}}, self.now),
+                (
+                    "later",
+                    {"data": {"text": {"id": 3, "state": 3}}},
+                    self.now + timedelta(hours=1),
+                ),
+                ("failed", {"data": {"text": {"id": 4, "state": 4}}}, self.now),
+                ("reported", {"data": {"report": {"percent": 3}}}, None),
+            ]
+        }
+
+    def poll(self, reports):
+        async def fetch_reports(log_ids):
+            return [reports.get(log_id) for log_id in log_ids]
+
+        with mock.patch("app.tasks.fetch_reports", side_effect=fetch_reports) as fetch:
+            with mock.patch("app.tasks.timezone.now", return_value=self.now):
+                poll_plagiarism_reports()
+        return fetch.call_args.args[0] if fetch.called else []
+
+    def test_only_due_pending_logs_are_polled(self):
+        report = {"data": {"report": {"percent": 12}}}
+
+        polled = self.poll({"stored": report})
+
+        self.assertCountEqual(polled, ["stored", "submitted"])
+        logs = {log.log_id: log for log in PlagiarismCheckerLogs.objects.all()}
+        self.assertEqual(logs["stored"].results, report)
+        self.assertIsNone(logs["stored"].next_poll_at)
+        # The failed fetch keeps the last results and backs off
+        self.assertEqual(logs["submitted"].results, self.logs["submitted"].results)
+        self.assertEqual(logs["submitted"].poll_attempts, 1)
+        self.assertEqual(
+            logs["submitted"].next_poll_at,
+            self.now + timedelta(seconds=settings.PLAGIARISM_POLL_INTERVAL),
+        )
+        self.assertEqual(logs["later"].poll_attempts, 0)
+        self.assertEqual(logs["failed"].poll_attempts, 0)
+        # Only the finished check notifies the author
+        self.assertEqual(Notifications.objects.filter(user=self.author).count(), 1)
+
+    def test_backoff_doubles_until_polling_gives_up(self):
+        PlagiarismCheckerLogs.objects.filter(log_id="submitted").update(poll_attempts=3)
+        self.poll({})
+        log = PlagiarismCheckerLogs.objects.get(log_id="submitted")
+        self.assertEqual(
+            log.next_poll_at,
+            self.now + timedelta(seconds=settings.PLAGIARISM_POLL_INTERVAL * 8),
+        )
+
+        PlagiarismCheckerLogs.objects.filter(log_id="submitted").update(
+            next_poll_at=self.now, poll_attempts=settings.PLAGIARISM_POLL_MAX_ATTEMPTS
+        )
+        self.poll({})
+        self.assertIsNone(
+            PlagiarismCheckerLogs.objects.get(log_id="submitted").next_poll_at
+        )
+        self.assertEqual(Notifications.objects.count(), 0)
+
+    @override_settings(PLAGIARISM_CALLBACK_TOKEN="secret")
+    def test_callback_polls_the_check_now(self):
+        url = reverse("plagiarism_callback", kwargs={"token": "wrong"})
+        self.assertEqual(self.client.post(url, {"id": "later"}).status_code, 404)
+
+        url = reverse("plagiarism_callback", kwargs={"token": "secret"})
+        with mock.patch("app.tasks.poll_plagiarism_reports.delay") as delay:
+            response = self.client.post(
+                url, {"id": "later"}, content_type="application/json"
+            )
+
+        self.assertEqual(response.status_code, 204)
+        delay.assert_called_once_with()
+        log = PlagiarismCheckerLogs.objects.get(log_id="later")
+        self.assertLessEqual(log.next_poll_at, timezone.now())
+
+
+class PlagiarismCheckDedupTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        author = User.objects.create_user(username="author", user_role="writer")
+        book = Books.objects.create(title="Checked", description="", author=author)
+        self.chapter = BooksChapter.objects.create(
+            book=book, title="One", chapter_number=1, content="<p>Some text</p>"
+        )
+        check = mock.patch(
+            "app.tasks.check_text",
+            side_effect=self.check_text,
+        )
+        self.check = check.start()
+        self.addCleanup(check.stop)
+
+    async def check_text(self, text):
+        return {"data": {"text": {"id": self.check.call_count, "words": 2}}}
+
+    def save(self, content):
+        self.chapter.content = content
+        self.chapter.save()
+
+    def test_unchanged_text_is_not_submitted_again(self):
+        run_plagiarism_checker_tasks(self.chapter.slug)
+        # Same words, other markup, case and spacing
+        self.save("<p><b>SOME</b>   text</p>")
+        run_plagiarism_checker_tasks(self.chapter.slug)
+        self.assertEqual(self.check.call_count, 1)
+
+        self.save("<p>Some other text</p>")
+        run_plagiarism_checker_tasks(self.chapter.slug)
+        self.assertEqual(self.check.call_count, 2)
+        self.assertEqual(PlagiarismCheckerLogs.objects.count(), 2)
+
+    def test_text_whose_check_failed_is_submitted_again(self):
+        run_plagiarism_checker_tasks(self.chapter.slug)
+        log = PlagiarismCheckerLogs.objects.get()
+        log.results = {"data": {"text": {"id": 1, "state": 4}}}
+        log.save()
+
+        run_plagiarism_checker_tasks(self.chapter.slug)
+        self.assertEqual(self.check.call_count, 2)
+
+    def test_burst_of_saves_is_checked_once(self):
+        with mock.patch.object(run_plagiarism_checker_tasks, "apply_async") as queued:
+            for _ in range(3):
+                schedule_plagiarism_check(self.chapter.slug)
+
+        for call in queued.call_args_list:
+            self.assertEqual(
+                call.kwargs["countdown"], settings.PLAGIARISM_CHECK_DEBOUNCE
+            )
+            run_plagiarism_checker_tasks(**call.kwargs["kwargs"])
+        self.assertEqual(self.check.call_count, 1)
+
+    def test_check_runs_when_its_token_is_gone(self):
+        with mock.patch.object(run_plagiarism_checker_tasks, "apply_async") as queued:
+            schedule_plagiarism_check(self.chapter.slug)
+        # Expired or evicted, or the worker does not share the web process' cache
+        cache.clear()
+
+        run_plagiarism_checker_tasks(**queued.call_args.kwargs["kwargs"])
+        self.assertEqual(self.check.call_count, 1)
+
+
+class NearDuplicateIndexTest(TestCase):
+    WORDS = (
+        "the lighthouse keeper counted every ship that passed the rocks at night "
+        "and wrote their names in a book nobody else was allowed to read while "
+        "the storms of autumn rolled over the island and the gulls went quiet "
+    ).split() * 4
+
+    def setUp(self):
+        self.original_author = User.objects.create_user(
+            username="original", user_role="writer"
+        )
+        self.copier = User.objects.create_user(username="copier", user_role="writer")
+
+    def chapter(self, author, words, number=1):
+        book = Books.objects.create(
+            title=f"{author.username} {number}", description="", author=author
+        )
+        return BooksChapter.objects.create(
+            book=book,
+            title=f"{author.username} chapter {number}",
+            chapter_number=number,
+            content=f"<p>{' '.join(words)}</p>",
+        )
+
+    def test_similarity_estimates_overlap(self):
+        text = " ".join(self.WORDS)
+        self.assertIsNone(signature("too short"))
+        self.assertEqual(signature(text), signature(text.upper()))
+
+        original = pack(signature(text))
+        edited = self.WORDS[:]
+        edited[60] = "lantern"
+        copy = pack(signature(" ".join(edited)))
+        other = pack(signature(" ".join(reversed(self.WORDS))))
+
+        self.assertGreater(similarity(original, copy), 0.8)
+        self.assertLess(similarity(original, other), 0.2)
+
+    def test_copied_chapter_is_flagged_without_calling_the_api(self):
+        original = self.chapter(self.original_author, self.WORDS)
+        index_chapter(original.id, original.content_text)
+
+        copy = self.chapter(self.copier, self.WORDS[:-1] + ["gulls"])
+        with mock.patch("app.tasks.check_text") as check:
+            run_plagiarism_checker_tasks(copy.slug)
+        check.assert_not_called()
+
+        log = PlagiarismCheckerLogs.objects.get(chapter=copy)
+        self.assertEqual(log.log_id, "local")
+        report = log.results["data"]["report"]
+        self.assertEqual(report["matches"][0]["chapter_id"], str(original.id))
+        self.assertGreaterEqual(report["percent"], 80)
+        self.assertFalse(PlagiarismCheckerLogs.objects.pending().filter(pk=log.pk))
+
+    def test_original_is_not_flagged_when_saved_after_its_copy(self):
+        original = self.chapter(self.original_author, self.WORDS)
+        copy = self.chapter(self.copier, self.WORDS)
+        index_chapter(copy.id, copy.content_text)
+
+        with mock.patch(
+            "app.tasks.check_text",
+            return_value={"data": {"text": {"id": 1, "words": 144}}},
+        ) as check:
+            run_plagiarism_checker_tasks(original.slug)
+        check.assert_called_once()
+        self.assertFalse(PlagiarismCheckerLogs.objects.filter(log_id="local"))
+
+    def test_archived_chapters_are_not_matched(self):
+        original = self.chapter(self.original_author, self.WORDS)
+        index_chapter(original.id, original.content_text)
+        original.is_archived = True
+        original.save()
+
+        copy = self.chapter(self.copier, self.WORDS)
+        record = index_chapter(copy.id, copy.content_text)
+        self.assertEqual(near_duplicates(record), [])
+
+    def test_authors_may_reuse_their_own_text(self):
+        first = self.chapter(self.original_author, self.WORDS)
+        second = self.chapter(self.original_author, self.WORDS, number=2)
+        index_chapter(first.id, first.content_text)
+
+        record = index_chapter(second.id, second.content_text)
+        self.assertEqual(
+            near_duplicates(record),
+            [
+                {
+                    "chapter_id": str(first.id),
+                    "book_id": str(first.book_id),
+                    "similarity": 1.0,
+                }
+            ],
+        )
+        self.assertEqual(
+            near_duplicates(record, exclude_author_id=self.original_author.id), []
+        )
@@ -11,14 +11,19 @@ from app.books.views.services import (
     add_to_favorites,
     follow_author_service,
     search_service,
+    search_suggest_service,
     update_book_content_service,
     search_collab_service,
     invite_collaborator,
     refresh_plagiarism_reports,
+    plagiarism_callback,
     write_a_review,
     respond_to_invitations,
     update_book_service,
     unpublish_book_service,
+    chapter_revisions_service,
+    chapter_revision_content_service,
+    restore_chapter_revision_service,
 )
 from app.books.views.views import (
     MyLibraryView,
@@ -83,6 +88,11 @@ service_urlpatterns = [
         search_service,
         name="search_service",
     ),
+    path(
+        "search/suggest",
+        search_suggest_service,
+        name="search_suggest_service",
+    ),
     path(
         "book/content/update/<str:slug>/",
         update_book_content_service,
@@ -103,6 +113,11 @@ service_urlpatterns = [
         refresh_plagiarism_reports,
         name="refresh_plagiarism_reports",
     ),
+    path(
+        "plagiarism/callback/<str:token>/",
+        plagiarism_callback,
+        name="plagiarism_callback",
+    ),
     path(
         "review/write/<str:slug>/",
         write_a_review,
@@ -118,6 +133,21 @@ service_urlpatterns = [
         update_book_service,
         name="update_book_service",
     ),
+    path(
+        "book/content/revisions/<str:slug>/",
+        chapter_revisions_service,
+        name="chapter_revisions_service",
+    ),
+    path(
+        "book/content/revisions/<str:slug>/<int:number>/",
+        chapter_revision_content_service,
+        name="chapter_revision_content_service",
+    ),
+    path(
+        "book/content/revisions/<str:slug>/<int:number>/restore/",
+        restore_chapter_revision_service,
+        name="restore_chapter_revision_service",
+    ),
 ]
 urlpatterns = [
     path("books/library", MyLibraryView.as_view(), name="book_library"),
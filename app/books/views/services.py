@@ -1,30 +1,54 @@
+import hashlib
+import hmac
+import json
 from typing import List, Any
 from urllib.parse import urlparse
 
-from asgiref.sync import sync_to_async
+from asgiref.sync import async_to_sync, sync_to_async
 from cloudinary import CloudinaryImage
-from django.core.exceptions import ObjectDoesNotExist
-from django.db.models import Q
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ObjectDoesNotExist, PermissionDenied
+from django.db import transaction
+from django.db.models import Q, F
 from django.http import JsonResponse, HttpResponse, HttpRequest
 from django.shortcuts import get_object_or_404, render
+from django.utils.cache import patch_cache_control
 from django.utils.html import format_html
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 
 from app.authentication.models import FollowedAuthor, User
 from app.books.forms import BookContentForm
+from app.books.revisions import (
+    list_revisions,
+    reconstruct,
+    record_revision,
+    restore_revision,
+)
 from app.enums import StartReadingChapter
+from app.fragment_cache import bump_queryset_versions
 from app.notifications.models import Notifications
 from app.notifications.views.services import save_notifications
-from app.tasks import run_plagiarism_checker_tasks, run_plagiarism_report_tasks
+from app.search import full_text_search, normalize_search_text, trigram_suggestions
+from app.tasks import (
+    fan_out_follower_notifications,
+    request_plagiarism_poll,
+    schedule_plagiarism_check,
+)
 from app.utils import UploadFilesToCloudinary
+from app.websockets.write_behind import replace_content
 from app.books.models import (
     Books,
     Categories,
     BooksChapter,
+    ChapterRevision,
     UsersStartedChapter,
     UsersFavorites,
     ChapterUnlockedByUser,
     Rates,
     InviteCollaborators,
+    PlagiarismCheckerLogs,
 )
 
 
@@ -112,8 +136,9 @@ def save_new_content_service(request, slug):
         is_draft=is_draft,
         is_locked=is_locked,
     )
+    record_revision(new_chapter.id, content, author=request.user)
 
-    run_plagiarism_checker_tasks.delay(slug=new_chapter.slug)
+    schedule_plagiarism_check(new_chapter.slug)
 
     response = JsonResponse({"message": "Book content created successfully"})
     response["HX-Redirect"] = f"/book/detail/{slug}"
@@ -135,14 +160,8 @@ def check_if_book_already_started(request: HttpRequest, chapter_slug: str):
         status=StartReadingChapter.DONE.value
     )
 
-    # Find the next chapter based on the created date
-    next_chapter = (
-        BooksChapter.objects.filter(
-            book=chapter.book, is_draft=False, created_at__gt=chapter.created_at
-        )
-        .order_by("created_at")
-        .first()
-    )
+    # Find the next chapter by number
+    next_chapter = BooksChapter.objects.neighbours(chapter)["next"]
 
     if not next_chapter:
         return {
@@ -153,46 +172,33 @@ def check_if_book_already_started(request: HttpRequest, chapter_slug: str):
     return {
         "status_code": 200,
         "message": "Chapter marked as done.",
-        "next_chapter_slug": next_chapter.slug,
-        "next_chapter_title": next_chapter.title,
+        "next_chapter_slug": next_chapter["slug"],
+        "next_chapter_title": next_chapter["title"],
     }
 
 
-def next_chapter_service(request, slug):
-    user = request.user
-    # Get the current chapter by slug
-    chapter = get_object_or_404(BooksChapter, slug=slug)
+def is_chapter_accessible(user, chapter) -> bool:
+    """Whether ``user`` may read ``chapter``, a dict from ``neighbours()``."""
+    if not chapter["is_locked"]:
+        return True
+    return ChapterUnlockedByUser.objects.filter(
+        paid_by=user, chapter_id=chapter["id"]
+    ).exists()
 
-    next_item = (
-        BooksChapter.objects.filter(
-            book=chapter.book,  # Ensure it's from the same book
-            created_at__gt=chapter.created_at,  # Get chapters created after the current one
-        )
-        .order_by("created_at")  # Order by creation time to get the next one
-        .first()
-    )
-
-    is_next_chapter_unlocked = ChapterUnlockedByUser.objects.filter(
-        paid_by=user, chapter=next_item
-    )
 
-    if next_item:
-        if not next_item.is_locked:
-            response = JsonResponse({"message": "Going to next chapter"})
-            response["HX-Redirect"] = f"/book/content/detail/{next_item.slug}"
+def navigate_to_chapter(request, chapter, target, direction):
+    if target:
+        if is_chapter_accessible(request.user, target):
+            response = JsonResponse({"message": f"Going to {direction} chapter"})
+            response["HX-Redirect"] = f"/book/content/detail/{target['slug']}"
             return response
-        else:
-            if is_next_chapter_unlocked:
-                response = JsonResponse({"message": "Going to next chapter"})
-                response["HX-Redirect"] = f"/book/content/detail/{next_item.slug}"
-                return response
-            return render(
-                request,
-                "components/error_message_alert.html",
-                {
-                    "message": "Sorry. Next chapter is currently locked. Unlocked it first to continue reading"
-                },
-            )
+        return render(
+            request,
+            "components/error_message_alert.html",
+            {
+                "message": f"Sorry. {direction.capitalize()} chapter is currently locked. Unlocked it first to continue reading"
+            },
+        )
     else:
         # If there are no more chapters, render a modal or response indicating completion
         return render(
@@ -202,51 +208,24 @@ def next_chapter_service(request, slug):
         )
 
 
+def next_chapter_service(request, slug):
+    # Get the current chapter by slug
+    chapter = get_object_or_404(BooksChapter.objects.select_related("book"), slug=slug)
+    next_item = BooksChapter.objects.neighbours(chapter)["next"]
+    return navigate_to_chapter(request, chapter, next_item, "next")
+
+
 def previous_chapter_service(request, slug):
     # Get the current chapter by slug
-    chapter = get_object_or_404(BooksChapter, slug=slug)
-    user = request.user
-    prev_item = (
-        BooksChapter.objects.filter(
-            book=chapter.book,  # Ensure it's from the same book
-            created_at__lt=chapter.created_at,  # Get chapters created after the current one
-        )
-        .order_by("created_at")  # Order by creation time to get the next one
-        .first()
-    )
-    is_prev_chapter_unlocked = ChapterUnlockedByUser.objects.filter(
-        paid_by=user, chapter=prev_item
-    )
-    if prev_item:
-        if not prev_item.is_locked:
-            response = JsonResponse({"message": "Going to previous chapter"})
-            response["HX-Redirect"] = f"/book/content/detail/{prev_item.slug}"
-            return response
-        else:
-            if is_prev_chapter_unlocked:
-                response = JsonResponse({"message": "Going to previous chapter"})
-                response["HX-Redirect"] = f"/book/content/detail/{prev_item.slug}"
-                return response
-            return render(
-                request,
-                "components/error_message_alert.html",
-                {
-                    "message": "Sorry. Previous chapter is currently locked. Unlocked it first to continue reading"
-                },
-            )
-    else:
-        # If there are no more chapters, render a modal or response indicating completion
-        return render(
-            request,
-            "components/done_reading_all_chapters_modal.html",
-            {"url": f"/book/detail/{chapter.book.slug}"},
-        )
+    chapter = get_object_or_404(BooksChapter.objects.select_related("book"), slug=slug)
+    prev_item = BooksChapter.objects.neighbours(chapter)["previous"]
+    return navigate_to_chapter(request, chapter, prev_item, "previous")
 
 
 def remove_chapter_service(request, book_slug, chapter_slug):
-    book_chapter = BooksChapter.objects.filter(slug=chapter_slug).update(
-        is_archived=True
-    )
+    book_chapter = BooksChapter.objects.filter(slug=chapter_slug)
+    book_chapter.update(is_archived=True)
+    bump_queryset_versions(book_chapter, "book")
     response = HttpResponse(
         f"""
             <div class="rounded-md bg-green-50 p-4">
@@ -285,7 +264,9 @@ def delete_book_service(request, slug):
 @sync_to_async
 def publish_book_service(request, slug):
     user = request.user
-    Books.objects.filter(slug=slug).update(is_published=True)
+    books = Books.objects.filter(slug=slug)
+    books.update(is_published=True)
+    bump_queryset_versions(books)
     notification_message = f"""
        <p class="text-sm font-semibold text-gray-900">New book alert!</p>
        <hr>
@@ -295,17 +276,12 @@ def publish_book_service(request, slug):
        </p>
     """
 
-    # Get all followers of the author
-    followers = FollowedAuthor.objects.filter(author=user)
-    if followers.exists():
-        print(f"Followers: {followers.count()} found")
-
-        # Notify each follower
-        for follower in followers:
-            print(f"Notifying: {follower.user.full_name()}")
-            save_notifications(user=follower.user, message=notification_message)
-    else:
-        print("No followers found for the author")
+    # Notify the author's followers in the background
+    transaction.on_commit(
+        lambda: fan_out_follower_notifications.delay(
+            author_id=str(user.id), message=notification_message
+        )
+    )
     response = JsonResponse({"message": "Books successfully published"})
     response["HX-Redirect"] = f"/book/detail/{slug}"
     return response
@@ -314,7 +290,9 @@ def publish_book_service(request, slug):
 @sync_to_async
 def unpublish_book_service(request, slug):
     user = request.user
-    Books.objects.filter(slug=slug).update(is_published=False)
+    books = Books.objects.filter(slug=slug)
+    books.update(is_published=False)
+    bump_queryset_versions(books)
     response = JsonResponse({"message": "Books successfully unpublished"})
     response["HX-Redirect"] = f"/book/detail/{slug}"
     return response
@@ -324,8 +302,21 @@ def unpublish_book_service(request, slug):
 def add_to_favorites(request, slug):
     user = request.user
     book = Books.objects.filter(slug=slug).first()
-    UsersFavorites.objects.update_or_create(book=book, reader=user)
-    response = JsonResponse({"message": "Books successfully added to favorites"})
+
+    # Toggle the favorite and keep the denormalized reader count in step with it.
+    with transaction.atomic():
+        favorite, created = UsersFavorites.objects.get_or_create(book=book, reader=user)
+        if created:
+            Books.objects.filter(id=book.id).update(reader_count=F("reader_count") + 1)
+            message = "Books successfully added to favorites"
+        else:
+            favorite.delete()
+            Books.objects.filter(id=book.id, reader_count__gt=0).update(
+                reader_count=F("reader_count") - 1
+            )
+            message = "Books successfully removed from favorites"
+
+    response = JsonResponse({"message": message})
     response["HX-Redirect"] = f"/book/detail/{slug}"
     return response
 
@@ -343,7 +334,7 @@ def follow_author_service(request, author_id):
 
     # Get the last segment (or '/' if it's the root)
     last_segment = path_segments[-1] if path_segments else "/"
-    FollowedAuthor.objects.create(
+    FollowedAuthor.objects.get_or_create(
         user=user,
         author_id=author_id,
     )
@@ -363,16 +354,11 @@ def search_service(request):
     query = request.GET.get("search", False)
 
     if query:
-        books_queryset = Books.objects.filter(
-            Q(title__icontains=query) & Q(is_published=True)
+        books_queryset = full_text_search(
+            Books.objects.filter(is_published=True), query
         )
-
-        authors_queryset = User.objects.filter(
-            Q(first_name__icontains=query)
-            | Q(last_name__icontains=query)
-            | Q(username__icontains=query)
-            | Q(email__icontains=query),
-            user_role="writer",
+        authors_queryset = full_text_search(
+            User.objects.recommended_authors(follower_id=user.id), query
         )
 
         if books_queryset:
@@ -383,25 +369,10 @@ def search_service(request):
             )
 
         elif authors_queryset:
-            authors = [
-                {
-                    "id": author.id,
-                    "full_name": author.full_name(),
-                    "username": author.username,
-                    "profile_picture": author.profile_picture,
-                    "num_of_authored_books": Books.objects.filter(
-                        author_id=author.id
-                    ).count(),
-                    "is_already_followed": FollowedAuthor.objects.filter(
-                        user=user, author_id=author.id
-                    ).exists(),
-                }
-                for author in authors_queryset
-            ]
             return render(
                 request,
                 "search/search_author.html",
-                {"authors": authors},
+                {"authors": authors_queryset},
             )
 
         else:
@@ -424,6 +395,25 @@ def search_service(request):
         return response
 
 
+def search_suggest_service(request):
+    query = normalize_search_text(request.GET.get("search", ""))
+
+    if len(query) < settings.SEARCH_SUGGEST_MIN_LENGTH:
+        return JsonResponse({"suggestions": []})
+
+    cache_key = f"search:suggest:{hashlib.md5(query.encode()).hexdigest()}"
+    suggestions = cache.get(cache_key)
+    if suggestions is None:
+        suggestions = trigram_suggestions(query, limit=8)
+        cache.set(cache_key, suggestions, settings.SEARCH_SUGGEST_CACHE_TTL)
+
+    response = JsonResponse({"suggestions": suggestions})
+    patch_cache_control(
+        response, private=True, max_age=settings.SEARCH_SUGGEST_CACHE_TTL
+    )
+    return response
+
+
 @sync_to_async
 def update_book_content_service(request, slug):
     title = request.POST.get("title", "")
@@ -432,19 +422,67 @@ def update_book_content_service(request, slug):
     content = request.POST.get("content", "")
 
     # Create a new chapter
-    BooksChapter.objects.filter(slug=slug).update(
-        title=title,
-        content=content,
-        is_draft=is_draft,
-        is_locked=is_locked,
-    )
+    chapters = BooksChapter.objects.filter(slug=slug)
+    with transaction.atomic():
+        for chapter_id in chapters.values_list("id", flat=True):
+            record_revision(chapter_id, content, author=request.user)
+        chapters.update(
+            title=title,
+            content=content,
+            is_draft=is_draft,
+            is_locked=is_locked,
+            **BooksChapter.rendered_fields(content),
+        )
+    bump_queryset_versions(chapters, "book")
 
-    run_plagiarism_checker_tasks.delay(slug=slug)
+    schedule_plagiarism_check(slug)
     response = JsonResponse({"message": "Book content updated successfully"})
     response["HX-Redirect"] = f"/book/content/detail/{slug}"
     return response
 
 
+def get_editable_chapter(request, slug):
+    # Only the book's author and co-authors may see a chapter's history
+    user = request.user
+    if not user.is_authenticated:
+        raise PermissionDenied
+    chapters = BooksChapter.objects.filter(
+        Q(book__author=user) | Q(book__co_authors=user)
+    ).distinct()
+    return get_object_or_404(chapters, slug=slug)
+
+
+def chapter_revisions_service(request, slug):
+    chapter = get_editable_chapter(request, slug)
+    return JsonResponse({"revisions": list_revisions(chapter.id)})
+
+
+def chapter_revision_content_service(request, slug, number):
+    chapter = get_editable_chapter(request, slug)
+    try:
+        content = reconstruct(chapter.id, number)
+    except ChapterRevision.DoesNotExist:
+        return JsonResponse({"error": "Revision not found"}, status=404)
+    return JsonResponse({"number": number, "content": content})
+
+
+def restore_chapter_revision_service(request, slug, number):
+    if request.method != "POST":
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+
+    chapter = get_editable_chapter(request, slug)
+    try:
+        content = restore_revision(chapter.id, number, author=request.user)
+    except ChapterRevision.DoesNotExist:
+        return JsonResponse({"error": "Revision not found"}, status=404)
+    # Open editors move to the restored content instead of flushing theirs over it
+    async_to_sync(replace_content)(slug, content)
+
+    response = JsonResponse({"message": f"Restored revision {number}"})
+    response["HX-Redirect"] = f"/books/content/update/{slug}"
+    return response
+
+
 @sync_to_async
 def search_collab_service(request, slug):
     search = request.GET.get("search", "")
@@ -460,13 +498,7 @@ def search_collab_service(request, slug):
 
         # Search for authors based on the search term and exclude co-authors and the current user
         authors = (
-            User.objects.filter(
-                Q(first_name__icontains=search)
-                | Q(last_name__icontains=search)
-                | Q(username__icontains=search)
-                | Q(email__icontains=search),
-                user_role="writer",
-            )
+            full_text_search(User.objects.filter(user_role="writer"), search)
             .exclude(id__in=co_authors_ids)  # Exclude existing co-authors
             .exclude(id=user.id)  # Exclude the current user
         )
@@ -548,13 +580,40 @@ def invite_collaborator(request, slug):
 
 @sync_to_async
 def refresh_plagiarism_reports(request, slug):
-    run_plagiarism_report_tasks.delay(slug=slug)
+    # The beat task fetches the reports, this only moves the book's pending
+    # checks to the front of its queue
+    book = get_object_or_404(Books, slug=slug)
+    request_plagiarism_poll(PlagiarismCheckerLogs.objects.filter(book=book))
     return render(
         request,
         "components/success_message_alert.html",
     )
 
 
+@csrf_exempt
+@require_POST
+def plagiarism_callback(request, token):
+    """
+    The plagiarism API calls this URL when a check finishes. The payload is
+    not trusted, the check is only polled now instead of after its backoff.
+    """
+    expected = settings.PLAGIARISM_CALLBACK_TOKEN
+    if not expected or not hmac.compare_digest(token.encode(), expected.encode()):
+        return HttpResponse(status=404)
+
+    log_id = request.POST.get("id")
+    if log_id is None:
+        try:
+            log_id = json.loads(request.body).get("id")
+        except (ValueError, AttributeError):
+            pass
+    if log_id is None:
+        return HttpResponse("No check id provided", status=400)
+
+    request_plagiarism_poll(PlagiarismCheckerLogs.objects.filter(log_id=str(log_id)))
+    return HttpResponse(status=204)
+
+
 @sync_to_async
 def write_a_review(request, slug):
     user = request.user
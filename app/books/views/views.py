@@ -3,15 +3,17 @@ import pprint
 
 from asgiref.sync import async_to_sync
 from bs4 import BeautifulSoup
+from django.conf import settings
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.core.exceptions import ObjectDoesNotExist
 from django.db.models import Q, Count
-from django.urls import reverse_lazy
+from django.template.loader import render_to_string
+from django.urls import reverse, reverse_lazy
 from django.utils import timezone
 from django.utils.safestring import mark_safe
 from django.views.generic import ListView, CreateView, DetailView, UpdateView
 
-from app.authentication.models import User, FollowedAuthor
+from app.authentication.models import User
 from app.books.forms import BookForm, BookContentForm
 from app.books.models import (
     Books,
@@ -21,13 +23,16 @@ from app.books.models import (
     PlagiarismCheckerLogs,
     Rates,
 )
+from app.fragment_cache import cached_fragment
+from app.pagination import KeysetPaginationMixin
 from app.rewards.models import Rewards, ClaimedRewards
-from app.utils import plagiarism_checker, natural_time
+from app.utils import natural_time
 
 
 # Create your views here.
-class MyLibraryView(LoginRequiredMixin, ListView):
+class MyLibraryView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     template_name = "book_library.html"
+    partial_template_name = "components/book_cards.html"
     login_url = "/signin"
     model = Books
     context_object_name = "books"
@@ -65,26 +70,46 @@ class BookDetail(LoginRequiredMixin, DetailView):
         slug = self.kwargs.get("slug")
         user = self.request.user
 
-        chapters = BooksChapter.objects.filter(
-            book__slug=slug, is_archived=False
-        ).order_by("chapter_number")
+        # The chapter list is the same for every reader and is cached until the
+        # book or one of its chapters changes; only the unlock state is per user.
+        chapters = cached_fragment(
+            "book_chapters",
+            [self.object],
+            lambda: list(
+                BooksChapter.objects.filter(book=self.object, is_archived=False)
+                .order_by("chapter_number")
+                .values(
+                    "id",
+                    "title",
+                    "chapter_number",
+                    "is_locked",
+                    "slug",
+                    "created_at",
+                    "reading_time",
+                )
+            ),
+        )
+        unlocked_chapter_ids = set(
+            ChapterUnlockedByUser.objects.filter(
+                paid_by=user, chapter__book=self.object
+            ).values_list("chapter_id", flat=True)
+        )
 
-        rates = Rates.objects.filter(book__slug=slug).order_by("-created_at")
+        rates = (
+            Rates.objects.filter(book__slug=slug)
+            .select_related("user")
+            .order_by("-created_at")
+        )
 
         chapters_list = [
             {
-                "id": chapter.id,
-                "title": chapter.title,
-                "chapter_number": chapter.chapter_number,
+                **chapter,
                 "is_locked": (
                     False
-                    if ChapterUnlockedByUser.objects.filter(
-                        paid_by=user, chapter_id=chapter.id
-                    ).exists()
-                    else chapter.is_locked
+                    if chapter["id"] in unlocked_chapter_ids
+                    else chapter["is_locked"]
                 ),
-                "slug": chapter.slug,
-                "created_at": natural_time(chapter.created_at),
+                "created_at": natural_time(chapter["created_at"]),
             }
             for chapter in chapters
         ]
@@ -101,7 +126,12 @@ class BookDetail(LoginRequiredMixin, DetailView):
         context["is_co_authored"] = is_co_authored
         context["rates"] = rates
         context["rate_count"] = (
-            rates.first().get_total_rates_per_book() if rates.exists() else 0
+            cached_fragment(
+                "book_rates_breakdown",
+                [self.object],
+                lambda: Rates.get_rates_breakdown(book=self.object),
+            )
+            or 0
         )
         context["form"] = BookForm(self.request.POST or None, instance=self.object)
         return context
@@ -141,12 +171,37 @@ class WriteBookContent(LoginRequiredMixin, CreateView):
         return context
 
 
+def rendered_chapter_body(chapter):
+    """The chapter's rendered body, cached until the chapter is saved.
+
+    The body is the HTML sanitized on save, so rendering it parses nothing.
+    ``chapter`` may have it deferred: it is only read on a miss.
+    """
+    return cached_fragment(
+        "chapter_body",
+        [chapter],
+        lambda: render_to_string(
+            "components/chapter_body.html",
+            {
+                "content": BooksChapter.objects.values_list(
+                    "content_html", flat=True
+                ).get(pk=chapter.pk)
+            },
+        ),
+        vary_on=[chapter.slug],
+    )
+
+
 class BookContentDetail(LoginRequiredMixin, DetailView):
     template_name = "book_content_detail.html"
     login_url = "/signin"
     model = BooksChapter
     context_object_name = "content"
 
+    def get_queryset(self):
+        # The body comes from rendered_chapter_body, content stays deferred
+        return BooksChapter.objects.select_related("book")
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         # Access the current object (the book chapter) using self.object
@@ -155,23 +210,61 @@ class BookContentDetail(LoginRequiredMixin, DetailView):
         context["slug"] = self.kwargs["slug"]
         context["book_library_active"] = True
 
+        # Link straight to the neighbouring chapters the reader can open
+        neighbours = BooksChapter.objects.neighbours(content_object)
+        locked_ids = [
+            chapter["id"]
+            for chapter in neighbours.values()
+            if chapter and chapter["is_locked"]
+        ]
+        unlocked_ids = (
+            set(
+                ChapterUnlockedByUser.objects.filter(
+                    paid_by=user, chapter_id__in=locked_ids
+                ).values_list("chapter_id", flat=True)
+            )
+            if locked_ids
+            else set()
+        )
+        for chapter in neighbours.values():
+            if chapter:
+                chapter["is_accessible"] = (
+                    not chapter["is_locked"] or chapter["id"] in unlocked_ids
+                )
+        context["previous_chapter"] = neighbours["previous"]
+        context["next_chapter"] = neighbours["next"]
+
+        context["chapter_body"] = rendered_chapter_body(content_object)
+        next_chapter = neighbours["next"]
+        if next_chapter and next_chapter["is_accessible"]:
+            # Render the likely next page now, so turning to it is a cache hit
+            rendered_chapter_body(
+                BooksChapter(pk=next_chapter["id"], slug=next_chapter["slug"])
+            )
+
         # check_plagiarism = self.run_plagiarism_check(content_object.content)
         return context
 
+    def render_to_response(self, context, **response_kwargs):
+        response = super().render_to_response(context, **response_kwargs)
+        next_chapter = context["next_chapter"]
+        if next_chapter and next_chapter["is_accessible"]:
+            # Let the browser fetch the next page while this one is read
+            url = reverse("book_content_detail", kwargs={"slug": next_chapter["slug"]})
+            response["Link"] = f"<{url}>; rel=prefetch"
+        return response
 
-class BrowseBooksView(LoginRequiredMixin, ListView):
+
+class BrowseBooksView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     template_name = "browse_books.html"
+    partial_template_name = "components/book_cards.html"
     login_url = "/signin"
     model = Books
     context_object_name = "books"
 
     def get_queryset(self):
-        queryset = (
-            super()
-            .get_queryset()
-            .filter(is_published=True)
-            .prefetch_related("user_libraries")
-        )
+        # Categories are prefetched by render_book_cards for uncached cards only
+        queryset = super().get_queryset().filter(is_published=True)
 
         return queryset
 
@@ -194,22 +287,9 @@ class BrowseBooksView(LoginRequiredMixin, ListView):
         recommended_books = Books.objects.filter(
             category__name__in=preferences, is_published=True
         ).distinct()[:4]
-        recommended_authors_queryset = User.objects.filter(user_role="writer")
-        recommended_authors = [
-            {
-                "id": author.id,
-                "full_name": author.full_name(),
-                "username": author.username,
-                "profile_picture": author.profile_picture,
-                "num_of_authored_books": Books.objects.filter(
-                    Q(author_id=author.id) & Q(is_published=True)
-                ).count(),
-                "is_already_followed": FollowedAuthor.objects.filter(
-                    user=user, author_id=author.id
-                ).exists(),
-            }
-            for author in recommended_authors_queryset
-        ]
+        recommended_authors = User.objects.recommended_authors(
+            follower_id=user.id, limit=settings.RECOMMENDED_AUTHORS_LIMIT
+        )
 
         context["browse_books"] = True
         context["page_title"] = "Browse Books"
@@ -251,6 +331,9 @@ class UpdateBookContentView(LoginRequiredMixin, UpdateView):
     model = BooksChapter
     form_class = BookContentForm
 
+    def get_queryset(self):
+        return BooksChapter.objects.with_content()
+
     # Override get_success_url to dynamically include slug
     def get_success_url(self):
         return reverse_lazy("book_content_detail", kwargs={"slug": self.object.slug})
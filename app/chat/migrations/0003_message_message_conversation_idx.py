@@ -0,0 +1,22 @@
+# Generated by Django 5.1.1 on 2026-10-18 21:42
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chat", "0002_message_mark_as_read"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="message",
+            index=models.Index(
+                fields=["sender", "receiver", "timestamp"],
+                name="message_conversation_idx",
+            ),
+        ),
+    ]
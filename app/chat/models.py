@@ -17,5 +17,14 @@ class Message(BaseModel):
     timestamp = models.DateTimeField(auto_now_add=True)
     mark_as_read = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            # Conversations between two users in order, and a user's inbox
+            models.Index(
+                fields=["sender", "receiver", "timestamp"],
+                name="message_conversation_idx",
+            ),
+        ]
+
     def __str__(self):
         return f"Message from {self.sender} to {self.receiver}"
@@ -5,6 +5,7 @@ from django.shortcuts import render, get_object_or_404
 
 from app.authentication.models import User
 from app.chat.models import Message
+from app.search import full_text_search
 
 
 @sync_to_async
@@ -12,12 +13,7 @@ def search_receiver(request):
     search = request.GET.get("search", "")
     user = request.user
     if search:
-        users = User.objects.filter(
-            Q(first_name__icontains=search)
-            | Q(last_name__icontains=search)
-            | Q(username__icontains=search)
-            | Q(email__icontains=search),
-        ).exclude(
+        users = full_text_search(User.objects.all(), search).exclude(
             id=user.id
         )  # Exclude the current user
         return render(
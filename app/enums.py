@@ -40,3 +40,15 @@ plagiarism_checker_state = {
     4: "STATE_FAILED",
     5: "STATE_CHECKED",
 }
+
+# Checks whose report will not change any more
+terminal_plagiarism_checker_states = [
+    state
+    for state, name in plagiarism_checker_state.items()
+    if name in ("STATE_CHECKED", "STATE_FAILED")
+]
+
+# Checks the API gave up on, their text is submitted again
+failed_plagiarism_checker_states = [
+    state for state, name in plagiarism_checker_state.items() if name == "STATE_FAILED"
+]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.1 on 2026-10-18 20:51
+
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("forum", "0002_community_search_vector_and_more"),
+        ("authentication", "0012_trigram_extension_user_username_trgm_idx"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="community",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["name"],
+                name="community_name_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.1 on 2026-10-18 21:42
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("forum", "0003_community_community_name_trgm_idx"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="topic",
+            index=models.Index(
+                fields=["community", "-created_at"], name="topic_community_recent_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.1.1 on 2026-10-18 21:44
+
+import app.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("forum", "0004_topic_topic_community_recent_idx"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="community",
+            name="id",
+            field=models.UUIDField(
+                default=app.models.uuid7,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="communitymembers",
+            name="id",
+            field=models.UUIDField(
+                default=app.models.uuid7,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="topic",
+            name="id",
+            field=models.UUIDField(
+                default=app.models.uuid7,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="topiccommentreply",
+            name="id",
+            field=models.UUIDField(
+                default=app.models.uuid7,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="topiccomments",
+            name="id",
+            field=models.UUIDField(
+                default=app.models.uuid7,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+            ),
+        ),
+    ]
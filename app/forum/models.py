@@ -1,3 +1,5 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.db import models
 from autoslug import AutoSlugField
 
@@ -10,9 +12,24 @@ class Community(BaseModel):
     name = models.CharField(max_length=255, unique=True)
     description = models.TextField()
     slug = AutoSlugField(populate_from="name")
+    search_config = "english"
+    search_vector = models.GeneratedField(
+        expression=SearchVector("name", weight="A", config=search_config)
+        + SearchVector("description", weight="B", config=search_config),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
 
     class Meta:
         db_table = "community"
+        indexes = [
+            GinIndex(fields=["search_vector"], name="community_search_vector_idx"),
+            GinIndex(
+                fields=["name"],
+                name="community_name_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ]
         verbose_name = "Community"
         verbose_name_plural = "Communities"
 
@@ -52,6 +69,12 @@ class Topic(BaseModel):
 
     class Meta:
         db_table = "topic"
+        indexes = [
+            # A community's topics, newest first
+            models.Index(
+                fields=["community", "-created_at"], name="topic_community_recent_idx"
+            ),
+        ]
         verbose_name = "Topic"
         verbose_name_plural = "Topics"
 
@@ -1,7 +1,6 @@
 from typing import Dict, List, Any
 
 from asgiref.sync import sync_to_async
-from django.db.models import Q
 from django.http import JsonResponse, HttpResponse
 from django.shortcuts import render
 from django.utils.html import format_html
@@ -14,6 +13,7 @@ from app.forum.models import (
     TopicCommentReply,
 )
 from app.notifications.views.services import save_notifications
+from app.search import full_text_search
 from app.utils import natural_time
 
 
@@ -209,9 +209,7 @@ def search_forums_service(request):
     if query:
 
         forums_queryset = (
-            Community.objects.filter(
-                Q(name__icontains=query) | Q(description__icontains=query)
-            )
+            full_text_search(Community.objects.all(), query)
             .prefetch_related("members_community")
             .exclude(members_community__member=user)
         )
@@ -1,5 +1,3 @@
-from typing import Dict, Any
-
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.db import models
 from django.db.models import Count, F, Value, Prefetch
@@ -9,21 +7,18 @@ from django.views.generic import ListView, DetailView
 from app.authentication.models import User
 from app.forum.models import Topic, Community, CommunityMembers
 from app.forum.views.services import get_comments_per_post_service
+from app.fragment_cache import cached_fragment, cached_fragments
+from app.pagination import KeysetPaginationMixin
 
 
-class ForumsView(LoginRequiredMixin, ListView):
+class ForumsView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     template_name: str = "forums_homepage.html"
+    partial_template_name: str = "components/forum_topics.html"
     login_url: str = "/signin"
     context_object_name: str = "topics"
 
-    def get_queryset(self) -> Dict[str, Any]:
-        topics: Topic = Topic.objects.all().order_by("-created_at")
-
-        queryset: Dict[str, Any] = {
-            "topics": topics,
-        }
-
-        return queryset
+    def get_queryset(self):
+        return Topic.objects.select_related("author")
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -97,21 +92,43 @@ class CommunityDetailView(LoginRequiredMixin, DetailView):
         community = self.get_object()
         current_user = self.request.user
 
-        top_posters = (
-            User.objects.filter(topic_author__community=community)
-            .annotate(
-                topic_count=Count("topic_author"),
-                author_name=Concat(
-                    F("first_name"),
-                    Value(" "),
-                    F("last_name"),
-                    output_field=models.CharField(),
-                ),
-                author_profile_picture=F("profile_picture"),
-                author_role=F("user_role"),
-            )
-            .order_by("-topic_count")[:10]
+        # The ranking is cached until a topic of this community changes, each
+        # poster's row until that user changes.
+        ranking = cached_fragment(
+            "community_top_posters",
+            [community],
+            lambda: list(
+                User.objects.filter(topic_author__community=community)
+                .annotate(topic_count=Count("topic_author"))
+                .order_by("-topic_count")
+                .values_list("id", "topic_count")[:10]
+            ),
+        )
+        posters = cached_fragments(
+            "top_poster",
+            User,
+            [user_id for user_id, _ in ranking],
+            lambda user_ids: {
+                poster["id"]: poster
+                for poster in User.objects.filter(id__in=user_ids).values(
+                    "id",
+                    "user_role",
+                    author_name=Concat(
+                        F("first_name"),
+                        Value(" "),
+                        F("last_name"),
+                        output_field=models.CharField(),
+                    ),
+                    author_profile_picture=F("profile_picture"),
+                    author_role=F("user_role"),
+                )
+            },
         )
+        top_posters = [
+            {**posters[user_id], "topic_count": topic_count}
+            for user_id, topic_count in ranking
+            if user_id in posters
+        ]
 
         is_already_joined = CommunityMembers.objects.filter(
             community=community, member=current_user
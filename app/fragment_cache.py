@@ -0,0 +1,188 @@
+import hashlib
+import time
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Type
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models, transaction
+
+# Fragments reported by the ``fragment_cache_stats`` management command.
+FRAGMENT_NAMES = (
+    "book_card",
+    "book_chapters",
+    "book_rates_breakdown",
+    "chapter_body",
+    "community_top_posters",
+    "top_poster",
+)
+
+_MISSING = object()
+
+
+def version_key(model: Type[models.Model], pk: Any) -> str:
+    return f"version:{model._meta.label_lower}:{pk}"
+
+
+def get_versions(keys: List[str]) -> Dict[str, int]:
+    """Return the current value of each version key, creating missing ones.
+
+    A missing key (never bumped, or evicted) starts at the current time in
+    nanoseconds rather than at 0, so it can never collide with a version an
+    older fragment key was built from.
+    """
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            initial = time.time_ns()
+            if not cache.add(key, initial, timeout=None):
+                initial = cache.get(key, initial)
+            versions[key] = initial
+    return versions
+
+
+def bump_version(model: Type[models.Model], *pks: Any) -> None:
+    """Invalidate every fragment built from the given rows.
+
+    The bump runs once the surrounding transaction commits, otherwise a
+    concurrent request could cache the old rows under the new version.
+    """
+    keys = [version_key(model, pk) for pk in pks]
+
+    def bump():
+        for key in keys:
+            try:
+                cache.incr(key)
+            except ValueError:
+                # No version yet: the next read starts a fresh one anyway.
+                pass
+
+    transaction.on_commit(bump)
+
+
+def bump_queryset_versions(queryset: models.QuerySet, *parents: str) -> None:
+    """Bump the version of every row in ``queryset`` and of its ``parents``.
+
+    ``QuerySet.update()`` sends no ``post_save`` signal, so call this right
+    after it. ``parents`` names foreign keys whose targets render the rows too,
+    e.g. ``"book"`` for chapters.
+    """
+    rows = list(queryset.values_list("pk", *parents))
+    bump_version(queryset.model, *(row[0] for row in rows))
+    for index, parent in enumerate(parents, start=1):
+        parent_model = queryset.model._meta.get_field(parent).related_model
+        bump_version(parent_model, *{row[index] for row in rows})
+
+
+def record_lookups(name: str, hits: int = 0, misses: int = 0) -> None:
+    for outcome, count in (("hits", hits), ("misses", misses)):
+        if not count:
+            continue
+        key = f"fragment-stats:{name}:{outcome}"
+        try:
+            cache.incr(key, count)
+        except ValueError:
+            cache.add(key, 0, timeout=None)
+            cache.incr(key, count)
+
+
+def fragment_stats(names: Iterable[str] = FRAGMENT_NAMES) -> Dict[str, Dict]:
+    """Return hit/miss counters and the hit rate of each fragment."""
+    names = list(names)
+    counters = cache.get_many(
+        [
+            f"fragment-stats:{name}:{outcome}"
+            for name in names
+            for outcome in ("hits", "misses")
+        ]
+    )
+
+    stats = {}
+    for name in names:
+        hits = counters.get(f"fragment-stats:{name}:hits", 0)
+        misses = counters.get(f"fragment-stats:{name}:misses", 0)
+        total = hits + misses
+        stats[name] = {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / total * 100, 1) if total else 0,
+        }
+    return stats
+
+
+def reset_fragment_stats(names: Iterable[str] = FRAGMENT_NAMES) -> None:
+    cache.delete_many(
+        [
+            f"fragment-stats:{name}:{outcome}"
+            for name in names
+            for outcome in ("hits", "misses")
+        ]
+    )
+
+
+def _fragment_key(name: str, versions: Iterable[int], vary_on: Iterable[Any]) -> str:
+    raw = ":".join(str(part) for part in (*versions, *vary_on))
+    return f"fragment:{name}:{hashlib.md5(raw.encode()).hexdigest()}"
+
+
+def cached_fragment(
+    name: str,
+    depends_on: Iterable[models.Model],
+    build: Callable[[], Any],
+    vary_on: Iterable[Any] = (),
+    timeout: Optional[int] = None,
+) -> Any:
+    """Return ``build()``, cached until one of ``depends_on`` changes.
+
+    The cache key embeds the current version of every instance in
+    ``depends_on``; saving any of them bumps its version, so the next lookup
+    misses and rebuilds instead of waiting for a TTL to run out. ``vary_on``
+    adds anything else the fragment depends on, e.g. the requesting user.
+    """
+    keys = [version_key(type(instance), instance.pk) for instance in depends_on]
+    versions = get_versions(keys)
+    key = _fragment_key(name, [versions[k] for k in keys], vary_on)
+
+    value = cache.get(key, _MISSING)
+    if value is not _MISSING:
+        record_lookups(name, hits=1)
+        return value
+
+    record_lookups(name, misses=1)
+    value = build()
+    cache.set(key, value, timeout or settings.FRAGMENT_CACHE_TTL)
+    return value
+
+
+def cached_fragments(
+    name: str,
+    model: Type[models.Model],
+    pks: Iterable[Hashable],
+    build_many: Callable[[List[Hashable]], Dict[Hashable, Any]],
+    timeout: Optional[int] = None,
+) -> Dict[Hashable, Any]:
+    """Batch version of ``cached_fragment`` for one fragment per ``model`` row.
+
+    All versions and fragments are read with one ``get_many`` each, and
+    ``build_many`` is called once with only the primary keys that missed.
+    Returns a ``{pk: fragment}`` dict.
+    """
+    pks = list(pks)
+    versions = get_versions([version_key(model, pk) for pk in pks])
+    keys = {
+        pk: _fragment_key(name, [versions[version_key(model, pk)]], ()) for pk in pks
+    }
+
+    found = cache.get_many(list(keys.values()))
+    fragments = {pk: found[key] for pk, key in keys.items() if key in found}
+    missing = [pk for pk in pks if pk not in fragments]
+    record_lookups(name, hits=len(fragments), misses=len(missing))
+
+    if missing:
+        built = build_many(missing)
+        cache.set_many(
+            {keys[pk]: value for pk, value in built.items()},
+            timeout or settings.FRAGMENT_CACHE_TTL,
+        )
+        fragments.update(built)
+
+    return fragments
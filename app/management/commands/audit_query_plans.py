@@ -0,0 +1,115 @@
+import json
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from app.authentication.models import FollowedAuthor
+from app.books.models import BooksChapter, ChapterUnlockedByUser, UsersFavorites
+from app.chat.models import Message
+from app.forum.models import Topic
+from app.notifications.models import Notifications
+from app.rewards.models import Rewards
+
+
+def hot_queries():
+    """The queries run on (nearly) every page, by name.
+
+    Plans do not depend on the rows matching, so random ids stand in for real
+    users, books and chapters.
+    """
+    user, other, book, chapter, community = (uuid.uuid4() for _ in range(5))
+    return {
+        "unread notifications": Notifications.objects.filter(
+            user_id=user, is_read=False
+        ),
+        "notification list": Notifications.objects.filter(user_id=user).order_by(
+            "-created_at"
+        ),
+        "chapter unlocked": ChapterUnlockedByUser.objects.filter(
+            paid_by_id=user, chapter_id=chapter
+        ),
+        "reader's unlocked chapters": ChapterUnlockedByUser.objects.filter(
+            paid_by_id=user
+        ).values("chapter_id"),
+        "is favorite": UsersFavorites.objects.filter(reader_id=user, book_id=book),
+        "reader library": UsersFavorites.objects.filter(reader_id=user),
+        "follows author": FollowedAuthor.objects.filter(user_id=user, author_id=other),
+        "follower fan-out": FollowedAuthor.objects.filter(author_id=user).order_by(
+            "id"
+        ),
+        "conversation": Message.objects.filter(
+            Q(sender_id=user, receiver_id=other) | Q(sender_id=other, receiver_id=user)
+        ).order_by("timestamp"),
+        "daily reward": Rewards.objects.filter(
+            user_id=user, updated_at__date=timezone.now().date()
+        ),
+        "community topics": Topic.objects.filter(community_id=community).order_by(
+            "-created_at"
+        ),
+        "book chapters": BooksChapter.objects.readable()
+        .filter(book_id=book)
+        .order_by("chapter_number"),
+    }
+
+
+def sequential_scans(plan: dict):
+    """Tables read by a sequential scan anywhere in ``plan``."""
+    if plan["Node Type"] in ("Seq Scan", "Parallel Seq Scan"):
+        yield plan["Relation Name"]
+    for child in plan.get("Plans", []):
+        yield from sequential_scans(child)
+
+
+class Command(BaseCommand):
+    help = (
+        "Run EXPLAIN on the app's hot queries and flag the ones planned with a "
+        "sequential scan. Fails when any is found, for CI."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--planner-defaults",
+            action="store_true",
+            help=(
+                "Keep the planner settings as they are. By default sequential "
+                "scans are disabled, so that on a small database they are only "
+                "planned where no index can serve the query."
+            ),
+        )
+        parser.add_argument(
+            "--verbose-plans", action="store_true", help="Print every plan."
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("The audit reads PostgreSQL plans.")
+
+        flagged = {}
+        with transaction.atomic():
+            if not options["planner_defaults"]:
+                with connection.cursor() as cursor:
+                    cursor.execute("SET LOCAL enable_seqscan = off")
+
+            for name, queryset in hot_queries().items():
+                plan = json.loads(queryset.explain(format="json"))[0]["Plan"]
+                tables = sorted(set(sequential_scans(plan)))
+                if options["verbose_plans"]:
+                    self.stdout.write(f"{name}:\n{queryset.explain()}\n")
+                if tables:
+                    flagged[name] = tables
+                    self.stdout.write(
+                        self.style.WARNING(
+                            f"{name:<28} sequential scan of {', '.join(tables)}"
+                        )
+                    )
+                else:
+                    self.stdout.write(f"{name:<28} ok")
+
+        if flagged:
+            raise CommandError(
+                f"{len(flagged)} hot queries are planned with a sequential scan."
+            )
+        self.stdout.write(self.style.SUCCESS("No sequential scans."))
@@ -0,0 +1,194 @@
+import os
+import random
+import statistics
+import time
+import uuid
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from app.books.near_duplicates import (
+    NUM_HASHES,
+    band_hashes,
+    pack,
+    signature,
+    similarity,
+    unpack,
+)
+from app.management.commands.benchmark_search import Rollback, make_word, percentile
+
+TABLE = "benchmark_chapter_signature"
+
+
+def random_values():
+    return list(unpack(os.urandom(NUM_HASHES * 4)))
+
+
+def edited_values(rng: random.Random, values, changed: float):
+    """``values`` with a share ``changed`` of them replaced, a signature about
+    ``1 - changed`` similar."""
+    values = list(values)
+    for index in rng.sample(range(NUM_HASHES), round(NUM_HASHES * changed)):
+        values[index] = rng.getrandbits(32)
+    return values
+
+
+class Command(BaseCommand):
+    help = (
+        "Time signing chapter texts, then load signatures into a copy of the "
+        "chapter_signature table inside a rolled back transaction and report "
+        "the index build time, the on-save update latency and the query "
+        "latency and recall for planted near-duplicates."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chapters", type=int, default=1_000_000)
+        parser.add_argument(
+            "--duplicates",
+            type=int,
+            default=1_000,
+            help="Chapters that get a near-duplicate in the index.",
+        )
+        parser.add_argument("--queries", type=int, default=1_000)
+        parser.add_argument(
+            "--words", type=int, default=3_000, help="Words per signed chapter."
+        )
+        parser.add_argument(
+            "--sample", type=int, default=200, help="Chapters signed to time it."
+        )
+        parser.add_argument("--batch-size", type=int, default=5_000)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        self.time_signing(rng, options)
+
+        try:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(
+                    f"CREATE TABLE {TABLE} (LIKE chapter_signature INCLUDING DEFAULTS)"
+                )
+                planted = self.build(cursor, rng, options)
+                self.time_updates(cursor, options)
+                self.time_queries(cursor, rng, planted, options)
+                raise Rollback
+        except Rollback:
+            self.stdout.write("Benchmark table rolled back.")
+
+    def time_signing(self, rng, options):
+        vocabulary = list({make_word(rng) for _ in range(20_000)})
+        texts = [
+            " ".join(rng.choices(vocabulary, k=options["words"]))
+            for _ in range(options["sample"])
+        ]
+        samples = []
+        for text in texts:
+            started = time.perf_counter()
+            band_hashes(signature(text))
+            samples.append((time.perf_counter() - started) * 1000)
+
+        mean = statistics.mean(samples)
+        self.stdout.write(
+            f"sign {options['words']} words: p50={percentile(samples, 50):.2f}ms "
+            f"p99={percentile(samples, 99):.2f}ms, "
+            f"{options['chapters']} chapters ~ "
+            f"{mean * options['chapters'] / 1000 / 60:,.0f} worker minutes"
+        )
+
+    def insert(self, cursor, rows):
+        now = timezone.now()
+        values = ", ".join(["(%s, %s, %s, %s, %s)"] * len(rows))
+        params = []
+        for values_list in rows:
+            params += [
+                uuid.uuid4(),
+                now,
+                uuid.uuid4(),
+                pack(values_list),
+                band_hashes(values_list),
+            ]
+        cursor.execute(
+            f"INSERT INTO {TABLE} (id, created_at, chapter_id, signature, bands) "
+            f"VALUES {values}",
+            params,
+        )
+
+    def build(self, cursor, rng, options):
+        """Load the signatures, then build the GIN index on their bands.
+        Returns the originals of the planted near-duplicates."""
+        chapters, batch_size = options["chapters"], options["batch_size"]
+        planted = []
+        self.stdout.write(f"Loading {chapters} signatures ...")
+
+        started = time.perf_counter()
+        for offset in range(0, chapters, batch_size):
+            rows = [random_values() for _ in range(min(batch_size, chapters - offset))]
+            if len(planted) < options["duplicates"]:
+                planted.append(rows[0])
+            self.insert(cursor, rows)
+        loaded = time.perf_counter() - started
+
+        # Any planted chapters beyond one per batch
+        while len(planted) < options["duplicates"]:
+            planted.append(random_values())
+            self.insert(cursor, [planted[-1]])
+
+        started = time.perf_counter()
+        cursor.execute(f"CREATE INDEX ON {TABLE} USING gin (bands)")
+        cursor.execute(f"ANALYZE {TABLE}")
+        indexed = time.perf_counter() - started
+        cursor.execute(f"SELECT pg_total_relation_size('{TABLE}')")
+        size = cursor.fetchone()[0]
+
+        self.stdout.write(
+            f"build: load {loaded:,.1f}s + GIN index and ANALYZE {indexed:,.1f}s, "
+            f"{size / 1024 ** 2:,.0f} MiB"
+        )
+        return planted
+
+    def time_updates(self, cursor, options):
+        samples = []
+        for _ in range(min(options["queries"], 1_000)):
+            started = time.perf_counter()
+            self.insert(cursor, [random_values()])
+            samples.append((time.perf_counter() - started) * 1000)
+        self.stdout.write(
+            f"on-save insert: p50={percentile(samples, 50):.2f}ms "
+            f"p99={percentile(samples, 99):.2f}ms"
+        )
+
+    def query(self, cursor, values):
+        cursor.execute(
+            f"SELECT signature FROM {TABLE} WHERE bands && %s::bigint[]",
+            [band_hashes(values)],
+        )
+        data = pack(values)
+        candidates = cursor.fetchmany(settings.NEAR_DUPLICATE_MAX_CANDIDATES)
+        return [
+            score
+            for (candidate,) in candidates
+            if (score := similarity(data, candidate))
+            >= settings.NEAR_DUPLICATE_THRESHOLD
+        ]
+
+    def time_queries(self, cursor, rng, planted, options):
+        results = {"near-duplicate": [], "unrelated": []}
+        for kind in results:
+            for _ in range(options["queries"] // 2):
+                if kind == "near-duplicate":
+                    values = edited_values(rng, rng.choice(planted), 0.1)
+                else:
+                    values = random_values()
+                started = time.perf_counter()
+                found = self.query(cursor, values)
+                results[kind].append(((time.perf_counter() - started) * 1000, found))
+
+        for kind, runs in results.items():
+            samples = [elapsed for elapsed, _ in runs]
+            flagged = sum(1 for _, found in runs if found) / len(runs)
+            self.stdout.write(
+                f"query {kind:<15} p50={percentile(samples, 50):.2f}ms "
+                f"p99={percentile(samples, 99):.2f}ms flagged={flagged:.1%}"
+            )
@@ -0,0 +1,134 @@
+import asyncio
+import json
+import random
+import time
+
+import httpx
+from django.core.management.base import BaseCommand
+
+from app.management.commands.benchmark_search import percentile
+from app.plagiarism import CircuitBreaker, PlagiarismAPIError, PlagiarismClient
+
+
+class MockPlagiarismAPI:
+    """A keep-alive HTTP/1.1 server answering every request like the report
+    endpoint, after ``latency`` seconds, or with a 503 at ``failure_rate``."""
+
+    def __init__(self, latency: float, failure_rate: float, seed: int):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.rng = random.Random(seed)
+        self.connections = 0
+
+    async def start(self) -> str:
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        host, port = self.server.sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}"
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while request_line := await reader.readline():
+                length = 0
+                while (line := await reader.readline()) not in (b"\r\n", b""):
+                    name, _, value = line.decode().partition(":")
+                    if name.lower() == "content-length":
+                        length = int(value)
+                await reader.readexactly(length)
+                await asyncio.sleep(self.latency)
+
+                if self.rng.random() < self.failure_rate:
+                    status, body = "503 Service Unavailable", b"{}"
+                else:
+                    path = request_line.split()[1].decode()
+                    status = "200 OK"
+                    body = json.dumps({"data": {"report": path}}).encode()
+                writer.write(
+                    f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+                    f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+class Command(BaseCommand):
+    help = (
+        "Fetch plagiarism reports from a local mock API with the pooled client "
+        "and with a new client per request, as the API was called before, and "
+        "report requests per second, latency, retries and connections opened."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=2_000)
+        parser.add_argument("--concurrency", type=int, default=10)
+        parser.add_argument(
+            "--latency", type=float, default=0.005, help="Seconds per response."
+        )
+        parser.add_argument(
+            "--failure-rate",
+            type=float,
+            default=0.02,
+            help="Share of responses that are a 503.",
+        )
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        asyncio.run(self.run_benchmark(options))
+
+    async def run_benchmark(self, options):
+        for mode in ("pooled", "client per request"):
+            api = MockPlagiarismAPI(
+                options["latency"], options["failure_rate"], options["seed"]
+            )
+            url = await api.start()
+            try:
+                await self.measure(mode, url, api, options)
+            finally:
+                await api.stop()
+
+    async def measure(self, mode, url, api, options):
+        semaphore = asyncio.Semaphore(options["concurrency"])
+        # A breaker of its own, the benchmark must not trip the worker's
+        breaker = CircuitBreaker(failure_threshold=50, reset_timeout=1.0)
+        pooled = PlagiarismClient(url, backoff=0.01, circuit_breaker=breaker)
+        samples, errors, totals = [], 0, {"retries": 0}
+
+        async def fetch(log_id):
+            nonlocal errors
+            async with semaphore:
+                started = time.perf_counter()
+                client = pooled
+                if mode != "pooled":
+                    client = PlagiarismClient(
+                        url, backoff=0.01, circuit_breaker=breaker
+                    )
+                try:
+                    await client.report(log_id)
+                except (PlagiarismAPIError, httpx.HTTPError):
+                    errors += 1
+                finally:
+                    if client is not pooled:
+                        totals["retries"] += client.stats["retries"]
+                        await client.aclose()
+                samples.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(fetch(i) for i in range(options["requests"])))
+        elapsed = time.perf_counter() - started
+        await pooled.aclose()
+        totals["retries"] += pooled.stats["retries"]
+
+        self.stdout.write(
+            f"{mode:<20} {options['requests'] / elapsed:8,.0f} req/s "
+            f"p50={percentile(samples, 50):7.2f}ms "
+            f"p99={percentile(samples, 99):7.2f}ms "
+            f"retries={totals['retries']} errors={errors} "
+            f"connections={api.connections}"
+        )
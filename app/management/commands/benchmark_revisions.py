@@ -0,0 +1,140 @@
+import random
+import statistics
+import time
+import zlib
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import Length
+
+from app.authentication.models import User
+from app.books.models import Books, BooksChapter, ChapterRevision
+from app.books.revisions import reconstruct, record_revision
+from app.management.commands.benchmark_search import Rollback, make_word, percentile
+
+
+def edit(rng: random.Random, paragraphs, vocabulary):
+    """Apply one small, typical edit to a paragraph: insert, delete or
+    replace a few words."""
+    words = rng.choice(paragraphs)
+    position = rng.randrange(len(words))
+    action = rng.random()
+    if action < 0.4:
+        words[position:position] = rng.choices(vocabulary, k=rng.randint(1, 12))
+    elif action < 0.7 and len(words) > 20:
+        del words[position : position + rng.randint(1, 8)]
+    else:
+        words[position : position + rng.randint(1, 4)] = rng.choices(
+            vocabulary, k=rng.randint(1, 4)
+        )
+
+
+def render(paragraphs):
+    return "".join(f"<p>{' '.join(words)}</p>" for words in paragraphs)
+
+
+class Command(BaseCommand):
+    help = (
+        "Record a chapter's revisions inside a rolled back transaction and "
+        "report the storage used against full copies, and the time to save "
+        "and to reconstruct revisions."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--revisions", type=int, default=5_000)
+        parser.add_argument(
+            "--words", type=int, default=4_000, help="Initial chapter length."
+        )
+        parser.add_argument("--reconstructs", type=int, default=500)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        vocabulary = list({make_word(rng) for _ in range(5_000)})
+
+        try:
+            with transaction.atomic():
+                chapter, full_sizes = self.record(rng, vocabulary, options)
+                self.report_storage(chapter, full_sizes)
+                self.run_benchmark(rng, chapter, options["reconstructs"])
+                raise Rollback
+        except Rollback:
+            self.stdout.write("Seed data rolled back.")
+
+    def record(self, rng, vocabulary, options):
+        author = User.objects.create_user(
+            username="bench_revisions", user_role="writer"
+        )
+        book = Books.objects.create(
+            title="Revision benchmark", description="", author=author
+        )
+        paragraphs = [
+            rng.choices(vocabulary, k=80) for _ in range(options["words"] // 80)
+        ]
+        chapter = BooksChapter.objects.create(
+            book=book,
+            title="Edited a lot",
+            chapter_number=1,
+            content=render(paragraphs),
+        )
+
+        self.stdout.write(f"Recording {options['revisions']} revisions ...")
+        save_times, full_sizes = [], []
+        for _ in range(options["revisions"]):
+            edit(rng, paragraphs, vocabulary)
+            content = render(paragraphs)
+
+            started = time.perf_counter()
+            record_revision(chapter.id, content, author)
+            BooksChapter.objects.filter(pk=chapter.pk).update(content=content)
+            save_times.append((time.perf_counter() - started) * 1000)
+            full_sizes.append(
+                (len(content.encode()), len(zlib.compress(content.encode())))
+            )
+
+        self.stdout.write(
+            f"save p50={percentile(save_times, 50):8.2f}ms "
+            f"p99={percentile(save_times, 99):8.2f}ms"
+        )
+        return chapter, full_sizes
+
+    def report_storage(self, chapter, full_sizes):
+        stats = ChapterRevision.objects.filter(chapter=chapter).aggregate(
+            revisions=Count("id"), stored=Sum(Length("data"))
+        )
+        snapshots = ChapterRevision.objects.filter(
+            chapter=chapter, is_snapshot=True
+        ).count()
+        raw = sum(size for size, _ in full_sizes)
+        compressed = sum(size for _, size in full_sizes)
+
+        self.stdout.write(
+            f"{stats['revisions']} revisions, {snapshots} snapshots, "
+            f"{stats['stored'] / 1024:,.0f} KiB stored vs "
+            f"{raw / 1024:,.0f} KiB as full copies "
+            f"({compressed / 1024:,.0f} KiB compressed full copies)"
+        )
+
+    def run_benchmark(self, rng, chapter, reconstructs):
+        numbers = list(
+            ChapterRevision.objects.filter(chapter=chapter).values_list(
+                "number", flat=True
+            )
+        )
+        samples = []
+        for number in rng.choices(numbers, k=reconstructs):
+            started = time.perf_counter()
+            reconstruct(chapter.id, number)
+            samples.append((time.perf_counter() - started) * 1000)
+
+        content = BooksChapter.objects.values_list("content", flat=True).get(
+            pk=chapter.pk
+        )
+        if reconstruct(chapter.id, max(numbers)) != content:
+            raise CommandError("The latest revision does not match the chapter.")
+        self.stdout.write(
+            f"reconstruct p50={percentile(samples, 50):8.2f}ms "
+            f"p99={percentile(samples, 99):8.2f}ms "
+            f"max={max(samples):8.2f}ms mean={statistics.mean(samples):8.2f}ms"
+        )
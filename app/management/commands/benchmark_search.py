@@ -0,0 +1,135 @@
+import random
+import statistics
+import string
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+
+from app.authentication.models import User
+from app.books.models import Books
+from app.search import full_text_search, trigram_suggestions
+
+
+class Rollback(Exception):
+    pass
+
+
+def make_word(rng: random.Random) -> str:
+    return "".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 9)))
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed books and users inside a rolled back transaction and report "
+        "p50/p99 search latency of the icontains queries vs full-text search "
+        "and of the trigram autocomplete."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--books", type=int, default=100_000)
+        parser.add_argument("--users", type=int, default=100_000)
+        parser.add_argument("--queries", type=int, default=200)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        vocabulary = list({make_word(rng) for _ in range(5_000)})
+
+        try:
+            with transaction.atomic():
+                self.seed(rng, vocabulary, options["books"], options["users"])
+                self.run_benchmark(rng, vocabulary, options["queries"])
+                raise Rollback
+        except Rollback:
+            self.stdout.write("Seed data rolled back.")
+
+    def seed(self, rng, vocabulary, num_books, num_users):
+        self.stdout.write(f"Seeding {num_users} users and {num_books} books ...")
+        started = time.perf_counter()
+
+        users = User.objects.bulk_create(
+            [
+                User(
+                    username=f"bench_user_{i}",
+                    email=f"bench_user_{i}@example.com",
+                    first_name=rng.choice(vocabulary).title(),
+                    last_name=rng.choice(vocabulary).title(),
+                    user_role="writer" if i % 10 == 0 else "reader",
+                )
+                for i in range(num_users)
+            ],
+            batch_size=5_000,
+        )
+        writers = [user for user in users if user.user_role == "writer"] or users
+
+        Books.objects.bulk_create(
+            [
+                Books(
+                    title=f"{' '.join(rng.sample(vocabulary, 3))} {i}",
+                    description=" ".join(rng.choices(vocabulary, k=40)),
+                    author=rng.choice(writers),
+                    is_published=True,
+                )
+                for i in range(num_books)
+            ],
+            batch_size=5_000,
+        )
+
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE books")
+            cursor.execute("ANALYZE users")
+
+        self.stdout.write(f"Seeded in {time.perf_counter() - started:.1f}s")
+
+    def run_benchmark(self, rng, vocabulary, num_queries):
+        # As-you-type queries: a full word followed by a partially typed one.
+        queries = [
+            f"{rng.choice(vocabulary)} {rng.choice(vocabulary)[:4]}"
+            for _ in range(num_queries)
+        ]
+
+        def legacy_books(query):
+            return Books.objects.filter(
+                Q(title__icontains=query) & Q(is_published=True)
+            )
+
+        def legacy_users(query):
+            return User.objects.filter(
+                Q(first_name__icontains=query)
+                | Q(last_name__icontains=query)
+                | Q(username__icontains=query)
+                | Q(email__icontains=query)
+            )
+
+        def fts_books(query):
+            return full_text_search(Books.objects.filter(is_published=True), query)
+
+        def fts_users(query):
+            return full_text_search(User.objects.all(), query)
+
+        for label, build in [
+            ("books icontains", legacy_books),
+            ("books full-text", fts_books),
+            ("users icontains", legacy_users),
+            ("users full-text", fts_users),
+            ("suggest trigram", trigram_suggestions),
+        ]:
+            samples = []
+            for query in queries:
+                started = time.perf_counter()
+                list(build(query)[:20])
+                samples.append((time.perf_counter() - started) * 1000)
+
+            self.stdout.write(
+                f"{label:<18} p50={percentile(samples, 50):8.2f}ms "
+                f"p99={percentile(samples, 99):8.2f}ms "
+                f"mean={statistics.mean(samples):8.2f}ms"
+            )
@@ -0,0 +1,77 @@
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from app.management.commands.benchmark_search import Rollback
+from app.models import uuid7
+
+KEY_FUNCTIONS = {"v4": uuid.uuid4, "v7": uuid7}
+
+
+def index_sizes(cursor, table):
+    cursor.execute(
+        """
+        SELECT pg_relation_size(indexrelid), indisprimary
+        FROM pg_index WHERE indrelid = %s::regclass
+        """,
+        [table],
+    )
+    rows = cursor.fetchall()
+    return (
+        sum(size for size, primary in rows if primary),
+        sum(size for size, _ in rows),
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Insert Notifications rows keyed by UUIDv4 and by UUIDv7 into copies of "
+        "the notifications table, inside a rolled back transaction, and report "
+        "the insert rate and the resulting index sizes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1_000_000)
+        parser.add_argument("--batch-size", type=int, default=5_000)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic(), connection.cursor() as cursor:
+                for version, make_key in KEY_FUNCTIONS.items():
+                    self.run_benchmark(cursor, version, make_key, options)
+                raise Rollback
+        except Rollback:
+            self.stdout.write("Tables rolled back.")
+
+    def run_benchmark(self, cursor, version, make_key, options):
+        # Same columns and indexes as notifications, without the foreign key
+        table = f"benchmark_notifications_{version}"
+        cursor.execute(f"CREATE TABLE {table} (LIKE notifications INCLUDING ALL)")
+
+        user_id, now = uuid.uuid4(), timezone.now()
+        rows, batch_size = options["rows"], options["batch_size"]
+        self.stdout.write(f"Inserting {rows} rows with {version} keys ...")
+
+        started = time.perf_counter()
+        for offset in range(0, rows, batch_size):
+            count = min(batch_size, rows - offset)
+            values = ", ".join(["(%s, %s, %s, %s, %s)"] * count)
+            params = []
+            for _ in range(count):
+                params += [make_key(), now, user_id, "benchmark notification", False]
+            cursor.execute(
+                f"INSERT INTO {table} "
+                f"(id, created_at, user_id, message, is_read) VALUES {values}",
+                params,
+            )
+        elapsed = time.perf_counter() - started
+
+        primary_key, indexes = index_sizes(cursor, table)
+        self.stdout.write(
+            f"{version}: {rows / elapsed:10,.0f} rows/s "
+            f"primary key {primary_key / 1024 ** 2:7.1f} MiB "
+            f"all indexes {indexes / 1024 ** 2:7.1f} MiB"
+        )
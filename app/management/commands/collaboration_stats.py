@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from app.websockets.write_behind import collaboration_stats, reset_collaboration_stats
+
+
+class Command(BaseCommand):
+    help = "Show how often collaborative chapters are flushed and how many edits each flush coalesces."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--minutes",
+            type=int,
+            default=5,
+            help="Window for the flushes per minute rate.",
+        )
+        parser.add_argument(
+            "--reset", action="store_true", help="Zero the counters after printing."
+        )
+
+    def handle(self, *args, **options):
+        stats = collaboration_stats(options["minutes"])
+        for reason, count in stats["flushes"].items():
+            self.stdout.write(f"{'flushes (' + reason + ')':<20} {count}")
+        self.stdout.write(f"operations flushed   {stats['ops']}")
+        self.stdout.write(
+            f"flushes per minute   {stats['flushes_per_minute']} "
+            f"(last {options['minutes']} minutes)"
+        )
+        self.stdout.write(f"coalescing ratio     {stats['coalescing_ratio']} ops/flush")
+
+        if options["reset"]:
+            reset_collaboration_stats()
+            self.stdout.write(self.style.SUCCESS("Counters reset."))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from app.fragment_cache import FRAGMENT_NAMES, fragment_stats, reset_fragment_stats
+
+
+class Command(BaseCommand):
+    help = "Show the hit/miss counters of the versioned fragment cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "names", nargs="*", default=FRAGMENT_NAMES, help="Fragments to show."
+        )
+        parser.add_argument(
+            "--reset", action="store_true", help="Zero the counters after printing."
+        )
+
+    def handle(self, *args, **options):
+        for name, stats in fragment_stats(options["names"]).items():
+            self.stdout.write(
+                f"{name:<24} hits={stats['hits']:<10} misses={stats['misses']:<10} "
+                f"hit rate={stats['hit_rate']}%"
+            )
+
+        if options["reset"]:
+            reset_fragment_stats(options["names"])
+            self.stdout.write(self.style.SUCCESS("Counters reset."))
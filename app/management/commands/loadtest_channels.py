@@ -0,0 +1,190 @@
+import asyncio
+import multiprocessing
+import random
+import statistics
+import time
+import uuid
+
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+def chat_group_name(user_id, other_user_id):
+    # Mirrors the room naming of ChatConsumer.connect
+    return f"chat_chat_{'_'.join(sorted([str(user_id), str(other_user_id)]))}"
+
+
+def run_worker(sockets, ready, stop, results):
+    """Entry point of one worker process: an in-process stand-in for a Daphne
+    worker that hosts ``sockets`` real ``ChatConsumer`` connections."""
+    import django
+
+    django.setup()
+    results.put(asyncio.run(serve_sockets(sockets, ready, stop)))
+
+
+async def serve_sockets(sockets, ready, stop):
+    from channels.routing import URLRouter
+    from channels.testing import WebsocketCommunicator
+
+    from app.authentication.models import User
+    from app.websockets.routing import websocket_urlpatterns
+
+    application = URLRouter(websocket_urlpatterns)
+    communicators = []
+    for user_id, other_user_id in sockets:
+        communicator = WebsocketCommunicator(application, f"/ws/chat/{other_user_id}/")
+        communicator.scope["user"] = User(
+            id=user_id, first_name="Load", last_name="Test"
+        )
+        connected, _ = await communicator.connect(timeout=30)
+        if not connected:
+            raise RuntimeError(f"Socket for {user_id} was refused")
+        communicators.append(communicator)
+
+    ready.set()
+
+    latencies = []
+
+    async def listen(communicator):
+        while True:
+            # No timeout: a timed out receive would cancel the consumer
+            data = await communicator.receive_json_from(timeout=None)
+            latencies.append((time.time() - float(data["message"])) * 1000)
+
+    listeners = [asyncio.create_task(listen(c)) for c in communicators]
+    while not stop.is_set():
+        await asyncio.sleep(0.5)
+    for listener in listeners:
+        listener.cancel()
+    await asyncio.gather(*listeners, return_exceptions=True)
+
+    for communicator in communicators:
+        await communicator.disconnect()
+    return latencies
+
+
+class Command(BaseCommand):
+    help = (
+        "Open chat sockets across several worker processes sharing the Redis "
+        "channel layer, broadcast timestamped messages into the chat rooms and "
+        "report the fan-out latency from group_send to the socket."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument("--sockets", type=int, default=2000)
+        parser.add_argument("--rooms", type=int, default=200)
+        parser.add_argument("--messages", type=int, default=1000)
+        parser.add_argument(
+            "--rate", type=int, default=200, help="Messages sent per second."
+        )
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        backend = settings.CHANNEL_LAYERS["default"]["BACKEND"]
+        if "Redis" not in backend:
+            raise CommandError(
+                f"{backend} does not span processes, set CHANNEL_REDIS_URLS."
+            )
+
+        rng = random.Random(options["seed"])
+        rooms = [(uuid.uuid4(), uuid.uuid4()) for _ in range(options["rooms"])]
+
+        # Spread each room's sockets over the workers, alternating both sides
+        # of the conversation, so every broadcast crosses process boundaries.
+        room_sizes = dict.fromkeys(rooms, 0)
+        worker_sockets = [[] for _ in range(options["workers"])]
+        for i in range(options["sockets"]):
+            user_id, other_user_id = room = rooms[i % len(rooms)]
+            if (i // len(rooms)) % 2:
+                user_id, other_user_id = other_user_id, user_id
+            worker_sockets[i % options["workers"]].append((user_id, other_user_id))
+            room_sizes[room] += 1
+
+        context = multiprocessing.get_context("spawn")
+        stop = context.Event()
+        results = context.Queue()
+        readiness = [context.Event() for _ in worker_sockets]
+        processes = [
+            context.Process(target=run_worker, args=(sockets, ready, stop, results))
+            for sockets, ready in zip(worker_sockets, readiness)
+        ]
+
+        self.stdout.write(
+            f"Opening {options['sockets']} sockets in {options['rooms']} rooms "
+            f"across {options['workers']} workers ..."
+        )
+        for process in processes:
+            process.start()
+        deadline = time.monotonic() + 300
+        while not all(ready.is_set() for ready in readiness):
+            if time.monotonic() > deadline or any(
+                process.exitcode is not None for process in processes
+            ):
+                stop.set()
+                raise CommandError("Workers failed to open their sockets.")
+            time.sleep(0.5)
+
+        try:
+            sent_to = asyncio.run(self.broadcast(rng, rooms, options))
+            # Let the last messages drain before stopping the listeners
+            time.sleep(2)
+        finally:
+            stop.set()
+
+        latencies = []
+        for _ in processes:
+            latencies.extend(results.get())
+        for process in processes:
+            process.join()
+
+        expected = sum(room_sizes[room] for room in sent_to)
+        self.report(latencies, expected)
+
+    async def broadcast(self, rng, rooms, options):
+        channel_layer = get_channel_layer()
+        interval = 1 / options["rate"]
+        sent_to = []
+
+        started = time.perf_counter()
+        for i in range(options["messages"]):
+            room = rng.choice(rooms)
+            await channel_layer.group_send(
+                chat_group_name(*room),
+                {
+                    "type": "chat_message",
+                    "message": repr(time.time()),
+                    "sender": "loadtest@example.com",
+                    "image_url": None,
+                },
+            )
+            sent_to.append(room)
+
+            # Keep a steady send rate instead of bursting everything at once
+            delay = started + (i + 1) * interval - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+        return sent_to
+
+    def report(self, latencies, expected):
+        # Imported here: spawned workers import this module before django.setup()
+        from app.management.commands.benchmark_search import percentile
+
+        delivered = len(latencies)
+        self.stdout.write(
+            f"delivered {delivered}/{expected} messages "
+            f"({expected - delivered} dropped or expired)"
+        )
+        if not latencies:
+            return
+
+        self.stdout.write(
+            f"fan-out latency p50={percentile(latencies, 50):8.2f}ms "
+            f"p95={percentile(latencies, 95):8.2f}ms "
+            f"p99={percentile(latencies, 99):8.2f}ms "
+            f"max={max(latencies):8.2f}ms "
+            f"mean={statistics.mean(latencies):8.2f}ms"
+        )
@@ -1,11 +1,52 @@
+import secrets
+import threading
+import time
 import uuid
 
 from django.db import models
 
+_uuid7_lock = threading.Lock()
+_uuid7_last_timestamp = 0
+_uuid7_counter = 0
+
+
+def uuid7() -> uuid.UUID:
+    """A time-ordered UUID, version 7 of RFC 9562.
+
+    The first 48 bits are the Unix time in milliseconds, so new keys land at
+    the right edge of the primary key index instead of on random pages. Keys
+    made in the same millisecond by this process increase through a 12 bit
+    counter (RFC 9562, section 6.2, method 1), the remaining 62 bits are
+    random.
+    """
+    global _uuid7_last_timestamp, _uuid7_counter
+    with _uuid7_lock:
+        timestamp = time.time_ns() // 1_000_000
+        if timestamp > _uuid7_last_timestamp:
+            _uuid7_last_timestamp = timestamp
+            # Start low in the counter's range, leaving room to count up
+            _uuid7_counter = secrets.randbits(11)
+        else:
+            # Same millisecond, or the clock went back: keep counting up
+            _uuid7_counter += 1
+            if _uuid7_counter > 0xFFF:
+                _uuid7_last_timestamp += 1
+                _uuid7_counter = 0
+        timestamp, counter = _uuid7_last_timestamp, _uuid7_counter
+
+    return uuid.UUID(
+        int=timestamp << 80
+        | 0x7 << 76
+        | counter << 64
+        | 0b10 << 62
+        | secrets.randbits(62)
+    )
+
 
 # Create your models here.
 class BaseModel(models.Model):
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    # Existing rows keep their random v4 keys, both are valid UUIDs
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=False, null=True, blank=True)
 
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.1 on 2026-10-18 21:42
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("notifications", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="notifications",
+            index=models.Index(
+                fields=["user", "is_read", "-created_at"],
+                name="notification_user_unread_idx",
+            ),
+        ),
+    ]
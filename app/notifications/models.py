@@ -18,5 +18,12 @@ class Notifications(BaseModel):
     class Meta:
         ordering = ["-created_at"]
         db_table = "notifications"
+        indexes = [
+            # The unread badge on every page and the notification list
+            models.Index(
+                fields=["user", "is_read", "-created_at"],
+                name="notification_user_unread_idx",
+            ),
+        ]
         verbose_name = "Notifications"
         verbose_name_plural = "Notifications"
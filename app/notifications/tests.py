@@ -1,3 +1,78 @@
-from django.test import TestCase
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.test import TestCase, override_settings
+
+from app.authentication.models import User, FollowedAuthor
+from app.books.models import Books, BooksChapter
+from app.notifications.models import Notifications
+from app.tasks import fan_out_follower_notifications
+from blendjoy.celery import app as celery_app
+
 
 # Create your tests here.
+@override_settings(NOTIFICATION_FANOUT_CHUNK_SIZE=2)
+class FollowerNotificationFanOutTest(TestCase):
+    def setUp(self):
+        celery_app.conf.task_always_eager = True
+        self.addCleanup(setattr, celery_app.conf, "task_always_eager", False)
+
+        self.author = User.objects.create_user(
+            username="author", email="author@example.com", user_role="writer"
+        )
+        self.followers = [
+            User.objects.create_user(username=f"reader{i}", email=f"r{i}@example.com")
+            for i in range(5)
+        ]
+        for follower in self.followers:
+            FollowedAuthor.objects.create(user=follower, author=self.author)
+
+    def test_every_follower_is_notified_once_across_chunks(self):
+        fan_out_follower_notifications.delay(str(self.author.id), "New book alert!")
+
+        notified = Notifications.objects.filter(message="New book alert!")
+        self.assertCountEqual(
+            notified.values_list("user_id", flat=True),
+            [follower.id for follower in self.followers],
+        )
+
+    def test_new_readable_chapter_queues_the_fan_out_once(self):
+        book = Books.objects.create(title="Saga", description="", author=self.author)
+        with mock.patch.object(fan_out_follower_notifications, "delay") as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                BooksChapter.objects.create(book=book, title="Draft", chapter_number=1)
+                chapter = BooksChapter.objects.create(
+                    book=book,
+                    title="One",
+                    chapter_number=2,
+                    is_draft=False,
+                    is_locked=False,
+                )
+                # Saving it again is not a new chapter
+                chapter.save()
+
+        delay.assert_called_once()
+        self.assertEqual(delay.call_args.kwargs["author_id"], str(self.author.id))
+        self.assertIn(
+            f"/book/content/detail/{chapter.slug}", delay.call_args.kwargs["message"]
+        )
+
+    def test_each_chunk_is_pushed_at_once_and_push_failures_are_logged(self):
+        services = "app.notifications.views.services"
+        send = mock.AsyncMock(side_effect=ConnectionError("Redis is down"))
+        with mock.patch(f"{services}.get_channel_layer") as channel_layer, mock.patch(
+            f"{services}.async_to_sync", side_effect=async_to_sync
+        ) as event_loops, self.assertLogs(services, "ERROR"):
+            channel_layer.return_value.group_send = send
+            with self.captureOnCommitCallbacks(execute=True):
+                fan_out_follower_notifications.delay(
+                    str(self.author.id), "New book alert!"
+                )
+
+        # One event loop per chunk of 2, one send per follower
+        self.assertEqual(event_loops.call_count, 3)
+        self.assertEqual(send.await_count, len(self.followers))
+        self.assertEqual(
+            Notifications.objects.filter(message="New book alert!").count(),
+            len(self.followers),
+        )
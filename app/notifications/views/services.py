@@ -1,11 +1,85 @@
+import asyncio
+import logging
+from typing import Iterable
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
 from django.http import HttpResponse
 from django.shortcuts import render
+from django.template.loader import render_to_string
 
 from app.notifications.models import Notifications
 
+logger = logging.getLogger(__name__)
+
+
+def notifications_group_name(user_id) -> str:
+    return f"notifications_{user_id}"
+
+
+async def send_events(events):
+    """Send each ``(user_id, event)`` to the user's open sockets, returning
+    the number of sends that failed."""
+    channel_layer = get_channel_layer()
+    results = await asyncio.gather(
+        *(
+            channel_layer.group_send(notifications_group_name(user_id), event)
+            for user_id, event in events
+        ),
+        return_exceptions=True,
+    )
+    failures = [result for result in results if isinstance(result, Exception)]
+    if failures:
+        logger.error(
+            "Pushing %d of %d notification events failed",
+            len(failures),
+            len(results),
+            exc_info=failures[0],
+        )
+    return len(failures)
+
+
+def push_events(events):
+    """Push ``events`` over one event loop. Pushing is best effort: the
+    notifications are saved already and show up on the next page load, so a
+    channel layer failure is logged instead of raised."""
+    if not events:
+        return
+    try:
+        async_to_sync(send_events)(events)
+    except Exception:
+        logger.exception("Pushing %d notification events failed", len(events))
+
+
+def push_to_user(user_id, event: dict):
+    """Send ``event`` to every open ``NotificationsConsumer`` of the user."""
+    push_events([(user_id, event)])
+
+
+def push_notifications(notifications: Iterable[Notifications]):
+    """Push freshly saved notifications to their users once the transaction commits."""
+    events = [
+        (
+            notification.user_id,
+            {
+                "type": "notification.created",
+                "html": render_to_string(
+                    "components/notification_item.html",
+                    {"notification": notification},
+                ),
+                "unread_delta": 1,
+            },
+        )
+        for notification in notifications
+    ]
+
+    transaction.on_commit(lambda: push_events(events))
+
 
 def save_notifications(user, message):
-    Notifications.objects.create(user=user, message=message)
+    notification = Notifications.objects.create(user=user, message=message)
+    push_notifications([notification])
 
 
 def get_notifications_service(request):
@@ -20,9 +94,13 @@ def get_notifications_service(request):
 
 
 def mark_notifications_as_read_service(request, notification_id):
-    Notifications.objects.filter(user=request.user, id=notification_id).update(
-        is_read=True
-    )
+    marked = Notifications.objects.filter(
+        user=request.user, id=notification_id, is_read=False
+    ).update(is_read=True)
+    if marked:
+        push_to_user(
+            request.user.id, {"type": "notification.read", "unread_delta": -marked}
+        )
     return HttpResponse("")
 
 
@@ -0,0 +1,94 @@
+import base64
+import binascii
+import uuid
+from datetime import datetime
+from typing import Optional
+
+from django.db.models import Q, QuerySet
+from django.http import Http404
+
+
+def encode_cursor(obj) -> str:
+    """Encode the ``(created_at, id)`` position of ``obj`` as an opaque cursor."""
+    raw = f"{obj.created_at.isoformat()}|{obj.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, uuid.UUID]:
+    """Decode a cursor produced by ``encode_cursor``.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, pk = base64.urlsafe_b64decode(padded).decode().split("|", 1)
+        return datetime.fromisoformat(created_at), uuid.UUID(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+class KeysetPaginationMixin:
+    """Cursor pagination on ``(created_at, id)`` for newest-first ListViews.
+
+    Each page is fetched with a ``WHERE (created_at, id) < cursor`` range filter
+    instead of an OFFSET, so every page costs the same no matter how deep the
+    reader scrolls, and rows inserted meanwhile never shift or repeat items.
+    HTMX requests carrying a cursor are rendered with ``partial_template_name``
+    so the next page can be appended in place (infinite scroll).
+    """
+
+    paginate_by: int = 20
+    cursor_kwarg: str = "cursor"
+    partial_template_name: Optional[str] = None
+
+    next_cursor: Optional[str] = None
+
+    def get_cursor(self) -> Optional[str]:
+        return self.request.GET.get(self.cursor_kwarg) or None
+
+    def paginate_queryset(self, queryset: QuerySet, page_size: int):
+        queryset = queryset.order_by("-created_at", "-id")
+
+        cursor = self.get_cursor()
+        if cursor:
+            try:
+                created_at, pk = decode_cursor(cursor)
+            except ValueError as e:
+                raise Http404(str(e))
+
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+            )
+
+        # Fetch one extra row to know whether there is a next page without a COUNT.
+        object_list = list(queryset[: page_size + 1])
+        has_next = len(object_list) > page_size
+        object_list = object_list[:page_size]
+
+        self.next_cursor = encode_cursor(object_list[-1]) if has_next else None
+        return None, None, object_list, has_next
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["next_cursor"] = self.next_cursor
+        context["next_page_url"] = self.get_next_page_url()
+        return context
+
+    def get_next_page_url(self) -> Optional[str]:
+        """The current URL with its cursor moved to the next page, so search and
+        filter parameters carry over."""
+        if not self.next_cursor:
+            return None
+        query = self.request.GET.copy()
+        query[self.cursor_kwarg] = self.next_cursor
+        return f"{self.request.path}?{query.urlencode()}"
+
+    def get_template_names(self):
+        if (
+            self.partial_template_name
+            and self.get_cursor()
+            and self.request.headers.get("HX-Request")
+        ):
+            return [self.partial_template_name]
+        return super().get_template_names()
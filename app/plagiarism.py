@@ -0,0 +1,298 @@
+"""Client for the plagiarismcheck.org API.
+
+One ``PlagiarismClient`` keeps a pool of keep-alive (HTTP/2 when the server
+offers it) connections, so a batch of calls pays for the TCP and TLS
+handshakes once. Tasks share one client per process, on an event loop of its
+own (see ``run_in_client_loop``), so successive checks reuse its connections
+too. Calls time out, are retried with exponential backoff and
+jitter on 429, 5xx and network errors, and go through a circuit breaker shared
+by the process: after ``PLAGIARISM_API_BREAKER_THRESHOLD`` failures in a row
+calls fail fast with ``CircuitOpenError`` for ``PLAGIARISM_API_BREAKER_RESET``
+seconds instead of piling up on a service that is down.
+
+Text submissions are not idempotent, a 5xx may come after the text was
+accepted: they are only retried when the API certainly did not process them
+(429, 503 and connection failures).
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import random
+import threading
+import time
+import unicodedata
+from typing import Optional
+
+import httpx
+from django.conf import settings
+from django.urls import reverse
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Statuses and errors after which the request was certainly not processed
+NOT_PROCESSED_STATUSES = {429, 503}
+NOT_PROCESSED_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class PlagiarismAPIError(Exception):
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class CircuitOpenError(PlagiarismAPIError):
+    pass
+
+
+class CircuitBreaker:
+    """Closed: calls go through. Open: calls fail fast until ``reset_timeout``
+    has passed, then one trial call is let through (half open) and decides
+    whether the breaker closes or opens again."""
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_running = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def before_call(self) -> bool:
+        """Raise ``CircuitOpenError`` if the call may not go through, returns
+        whether it is the half open trial."""
+        state = self.state
+        if state == "open" or (state == "half_open" and self.trial_running):
+            raise CircuitOpenError("Plagiarism API circuit is open")
+        if state == "half_open":
+            self.trial_running = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial_running = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                logger.warning("Plagiarism API failing, opening the circuit")
+            self.opened_at = time.monotonic()
+
+    def reset(self):
+        self.record_success()
+
+
+breaker = CircuitBreaker(
+    failure_threshold=settings.PLAGIARISM_API_BREAKER_THRESHOLD,
+    reset_timeout=settings.PLAGIARISM_API_BREAKER_RESET,
+)
+
+
+class PlagiarismClient:
+    """Use as ``async with PlagiarismClient() as client:`` around a batch of
+    calls, the connections are closed when the block exits.
+
+    ``transport`` replaces the network, e.g. with an ``httpx.MockTransport``.
+    """
+
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        *,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        retries: Optional[int] = None,
+        backoff: Optional[float] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.retries = settings.PLAGIARISM_API_RETRIES if retries is None else retries
+        self.backoff = settings.PLAGIARISM_API_BACKOFF if backoff is None else backoff
+        self.breaker = breaker if circuit_breaker is None else circuit_breaker
+        self.stats = {"requests": 0, "retries": 0, "failures": 0}
+
+        connections = settings.PLAGIARISM_API_MAX_CONNECTIONS
+        self.http = httpx.AsyncClient(
+            base_url=base_url or settings.PLAGIARISM_API_URL,
+            headers={"X-API-TOKEN": settings.PLAGIARISM_CHECK_API_TOKEN},
+            http2=True,
+            # One host, so these are the per host limits
+            limits=httpx.Limits(
+                max_connections=connections,
+                max_keepalive_connections=connections,
+                keepalive_expiry=30,
+            ),
+            timeout=httpx.Timeout(settings.PLAGIARISM_API_TIMEOUT, connect=5.0),
+            transport=transport,
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        await self.http.aclose()
+
+    def _delay(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        cap = settings.PLAGIARISM_API_BACKOFF_MAX
+        retry_after = response.headers.get("Retry-After") if response else None
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), cap)
+        # Full jitter, so throttled workers do not retry in lockstep
+        return random.uniform(0, min(cap, self.backoff * 2**attempt))
+
+    async def request(self, method: str, url: str, *, idempotent=True, **kwargs):
+        """The decoded JSON of a successful response."""
+        for attempt in range(self.retries + 1):
+            trial = self.breaker.before_call()
+            self.stats["requests"] += 1
+            response = None
+            try:
+                response = await self.http.request(method, url, **kwargs)
+            except httpx.TransportError as error:
+                retryable = idempotent or isinstance(error, NOT_PROCESSED_ERRORS)
+                failure = error
+            except Exception:
+                # e.g. an undecodable body or too many redirects
+                self.breaker.record_failure()
+                self.stats["failures"] += 1
+                raise
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    # Other 4xx are our mistake, not a sign the API is down
+                    self.breaker.record_success()
+                    if response.is_error:
+                        raise PlagiarismAPIError(
+                            f"{method} {url} returned {response.status_code}",
+                            response.status_code,
+                        )
+                    return response.json()
+                retryable = idempotent or response.status_code in (
+                    NOT_PROCESSED_STATUSES
+                )
+                failure = PlagiarismAPIError(
+                    f"{method} {url} returned {response.status_code}",
+                    response.status_code,
+                )
+            finally:
+                # A cancelled trial must not keep the circuit half open for good
+                if trial:
+                    self.breaker.trial_running = False
+
+            self.breaker.record_failure()
+            self.stats["failures"] += 1
+            if not retryable or attempt == self.retries:
+                raise failure
+
+            delay = self._delay(attempt, response)
+            logger.info(
+                "Plagiarism API %s %s failed (%s), retrying in %.2fs",
+                method,
+                url,
+                failure,
+                delay,
+            )
+            self.stats["retries"] += 1
+            await asyncio.sleep(delay)
+
+    async def submit(self, text: str) -> dict:
+        """Submit ``text`` for checking, the response holds the check's id."""
+        data = {"language": "en", "text": text}
+        if url := callback_url():
+            data["callback_url"] = url
+        return await self.request("POST", "/text", data=data, idempotent=False)
+
+    async def report(self, log_id) -> dict:
+        return await self.request("GET", f"/text/report/{log_id}")
+
+
+def callback_url() -> Optional[str]:
+    """Where the API notifies us of finished checks, None unless configured."""
+    host, token = settings.PLAGIARISM_CALLBACK_HOST, settings.PLAGIARISM_CALLBACK_TOKEN
+    if not (host and token):
+        return None
+    return host.rstrip("/") + reverse("plagiarism_callback", kwargs={"token": token})
+
+
+def text_fingerprint(text: str) -> str:
+    """Hash of ``text`` ignoring what cannot change a plagiarism result:
+    case, Unicode compatibility forms and whitespace."""
+    normalized = " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+    return hashlib.sha1(normalized.encode()).hexdigest()
+
+
+# The loop and client of this process. An event loop and its connections do not
+# survive a fork, so they are created lazily in each Celery pool process
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+_client_loop_pid: Optional[int] = None
+_client: Optional[PlagiarismClient] = None
+_client_loop_lock = threading.Lock()
+
+
+def run_in_client_loop(coroutine):
+    """Run ``coroutine`` on this process' client loop and return its result.
+
+    ``async_to_sync`` would run each call on a new event loop, which cannot
+    reuse the connections of the previous one. This loop runs for the life of
+    the process, on a daemon thread.
+    """
+    global _client_loop, _client_loop_pid, _client
+    with _client_loop_lock:
+        if _client_loop is None or _client_loop_pid != os.getpid():
+            _client_loop = asyncio.new_event_loop()
+            _client_loop_pid = os.getpid()
+            _client = None
+            threading.Thread(
+                target=_client_loop.run_forever, name="plagiarism-client", daemon=True
+            ).start()
+    return asyncio.run_coroutine_threadsafe(coroutine, _client_loop).result()
+
+
+def shared_client() -> PlagiarismClient:
+    """The process' client, only usable in ``run_in_client_loop``."""
+    global _client
+    if _client is None:
+        _client = PlagiarismClient()
+    return _client
+
+
+async def check_text(text: str) -> dict:
+    return await shared_client().submit(text)
+
+
+async def fetch_reports(log_ids, **client_options) -> list:
+    """The report of each check, or None where it could not be fetched.
+
+    At most ``PLAGIARISM_REPORT_CONCURRENCY`` requests are in flight, over the
+    shared client's connections, or a client of its own built with
+    ``client_options``.
+    """
+    semaphore = asyncio.Semaphore(settings.PLAGIARISM_REPORT_CONCURRENCY)
+    client = PlagiarismClient(**client_options) if client_options else shared_client()
+
+    async def fetch(log_id):
+        async with semaphore:
+            try:
+                return await client.report(log_id)
+            except (PlagiarismAPIError, httpx.HTTPError):
+                logger.exception("Fetching plagiarism report %s failed", log_id)
+                return None
+
+    try:
+        return await asyncio.gather(*(fetch(log_id) for log_id in log_ids))
+    finally:
+        if client_options:
+            await client.aclose()
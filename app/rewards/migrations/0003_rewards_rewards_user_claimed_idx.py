@@ -0,0 +1,21 @@
+# Generated by Django 5.1.1 on 2026-10-18 21:42
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("rewards", "0002_claimedrewards"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="rewards",
+            index=models.Index(
+                fields=["user", "updated_at"], name="rewards_user_claimed_idx"
+            ),
+        ),
+    ]
@@ -12,6 +12,12 @@ class Rewards(BaseModel):
 
     class Meta:
         db_table = "rewards"
+        indexes = [
+            # Whether the daily reward was claimed today
+            models.Index(
+                fields=["user", "updated_at"], name="rewards_user_claimed_idx"
+            ),
+        ]
         verbose_name = "Rewards"
         verbose_name_plural = "Rewards"
 
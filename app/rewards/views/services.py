@@ -139,11 +139,15 @@ def pay_using_rewards_coins_service(request, chapter_id):
     rewards = Rewards.objects.filter(user=user).first()
 
     if rewards.coins >= 50:
-        ChapterUnlockedByUser.objects.create(
-            paid_by=user, chapter_id=chapter_id, method_of_payment="via_rewards"
+        # Paying again for an unlocked chapter just opens it
+        _, created = ChapterUnlockedByUser.objects.get_or_create(
+            paid_by=user,
+            chapter_id=chapter_id,
+            defaults={"method_of_payment": "via_rewards"},
         )
-        rewards.coins = rewards.coins - 50
-        rewards.save()
+        if created:
+            rewards.coins = rewards.coins - 50
+            rewards.save()
         response = JsonResponse({"message": "Unlocking your chapter"})
         response["HX-Redirect"] = f"/book/content/detail/{chapter.slug}"
         return response
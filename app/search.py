@@ -0,0 +1,103 @@
+import re
+from typing import Optional, List, Dict
+
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    TrigramWordSimilarity,
+)
+from django.db.models import F, QuerySet, Value, CharField
+from django.db.models.functions import Cast, Concat
+
+
+def build_prefix_query(text: str, config: str) -> Optional[SearchQuery]:
+    """Build a tsquery matching every word of ``text`` as a prefix.
+
+    ``"harr pot"`` becomes ``harr:* & pot:*`` so partially typed words already
+    match while the user is still typing. Anything that is not a word character
+    is dropped, which also keeps tsquery operators out of user input.
+    """
+    terms = re.findall(r"\w+", text.lower())
+    if not terms:
+        return None
+
+    raw_query = " & ".join(f"{term}:*" for term in terms)
+    return SearchQuery(raw_query, search_type="raw", config=config)
+
+
+def full_text_search(
+    queryset: QuerySet, text: str, limit: Optional[int] = None
+) -> QuerySet:
+    """Filter ``queryset`` with its model's ``search_vector`` and rank the matches.
+
+    The model must define a ``search_vector`` column and the ``search_config``
+    it was built with. Results are annotated with ``rank`` and ordered by it,
+    best match first.
+    """
+    query = build_prefix_query(text, config=queryset.model.search_config)
+    if query is None:
+        return queryset.none()
+
+    queryset = (
+        queryset.filter(search_vector=query)
+        .annotate(rank=SearchRank(F("search_vector"), query))
+        .order_by("-rank")
+    )
+
+    if limit is not None:
+        queryset = queryset[:limit]
+
+    return queryset
+
+
+def normalize_search_text(text: str, max_length: int = 64) -> str:
+    """Lowercase ``text`` and collapse whitespace so equivalent inputs share a key."""
+    return " ".join(text.lower().split())[:max_length]
+
+
+def trigram_suggestions(text: str, limit: int = 8) -> List[Dict[str, str]]:
+    """Return up to ``limit`` typo-tolerant suggestions across books, authors
+    and communities.
+
+    Each source is matched with the pg_trgm word similarity operator, which is
+    served by the ``*_trgm_idx`` GIN indexes and also matches partially typed
+    words. The three result sets are merged by similarity in one UNION query.
+    """
+    from app.authentication.models import User
+    from app.books.models import Books
+    from app.forum.models import Community
+
+    def suggestions(queryset, kind, field, url):
+        return (
+            queryset.filter(**{f"{field}__trigram_word_similar": text})
+            .annotate(
+                kind=Value(kind, output_field=CharField()),
+                label=F(field),
+                url=url,
+                similarity=TrigramWordSimilarity(text, field),
+            )
+            .order_by("-similarity")
+            .values_list("kind", "label", "url", "similarity")[:limit]
+        )
+
+    books = suggestions(
+        Books.objects.filter(is_published=True),
+        "book",
+        "title",
+        Concat(Value("/book/detail/"), F("slug"), output_field=CharField()),
+    )
+    authors = suggestions(
+        User.objects.filter(user_role="writer"),
+        "author",
+        "username",
+        Concat(Value("/profile/"), Cast("id", CharField()), output_field=CharField()),
+    )
+    communities = suggestions(
+        Community.objects.all(),
+        "community",
+        "name",
+        Concat(Value("/forums/community/"), F("slug"), output_field=CharField()),
+    )
+
+    rows = books.union(authors, communities, all=True).order_by("-similarity")[:limit]
+    return [{"type": kind, "label": label, "url": url} for kind, label, url, _ in rows]
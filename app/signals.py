@@ -1,50 +1,77 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, m2m_changed
 from django.dispatch import receiver
 
-from app.authentication.models import FollowedAuthor
-from app.books.models import BooksChapter
-from app.notifications.views.services import save_notifications
+from app.authentication.models import User
+from app.books.models import Books, BooksChapter, Categories, Rates, UsersFavorites
+from app.forum.models import Community, Topic
+from app.fragment_cache import bump_queryset_versions, bump_version
+from app.tasks import fan_out_follower_notifications
 
 
 @receiver(post_save, sender=BooksChapter)
 def notify_followers_for_new_chapter(sender, instance, created, **kwargs):
-    # Ensure that the signal only triggers when a new chapter is created
-    if created:
-
-        # Debugging and logging output to check values
-        print(f"Is locked: {instance.is_locked}, Is draft: {instance.is_draft}")
-
-        # Ensure the book and author are available and valid
-        if hasattr(instance, "book") and hasattr(instance.book, "author"):
-            print(f"Author: {instance.book.author.full_name()}")
-
-            # Only notify followers if the chapter is not locked and not a draft
-            if (
-                instance.is_locked == "False"
-                and instance.is_draft == "False"
-                and instance.book.is_published == "False"
-            ):
-                notification_message = f"""
-                               <p class="text-sm font-semibold text-gray-900">New chapter!</p>
-                               <hr>
-                               <p class="mt-2 text-xs text-gray-500">
-                                   <span class="font-semibold text-gray-900">{instance.book.author.full_name()}</span>
-                                   published a new book chapter. View it <a href="/book/content/detail/{instance.slug}" class="text-pink-500 underline">here</a>.
-                               </p>
-                           """
-
-                # Get all followers of the author
-                followers = FollowedAuthor.objects.filter(author=instance.book.author)
-                if followers.exists():
-                    print(f"Followers: {followers.count()} found")
-
-                    # Notify each follower
-                    for follower in followers:
-                        print(f"Notifying: {follower.user.full_name()}")
-                        save_notifications(
-                            user=follower.user, message=notification_message
-                        )
-                else:
-                    print("No followers found for the author")
-        else:
-            print("Book or author information is missing")
+    # Only new chapters readers can open: not locked, not a draft, in a
+    # published book
+    if not created:
+        return
+    if instance.is_locked or instance.is_draft or not instance.book.is_published:
+        return
+
+    notification_message = f"""
+                   <p class="text-sm font-semibold text-gray-900">New chapter!</p>
+                   <hr>
+                   <p class="mt-2 text-xs text-gray-500">
+                       <span class="font-semibold text-gray-900">{instance.book.author.full_name()}</span>
+                       published a new book chapter. View it <a href="/book/content/detail/{instance.slug}" class="text-pink-500 underline">here</a>.
+                   </p>
+               """
+
+    # Notify the author's followers in the background
+    author_id = str(instance.book.author_id)
+    transaction.on_commit(
+        lambda: fan_out_follower_notifications.delay(
+            author_id=author_id, message=notification_message
+        )
+    )
+
+
+# Bump the fragment cache versions of whatever a saved or deleted row is rendered in.
+@receiver([post_save, post_delete], sender=Books)
+@receiver([post_save, post_delete], sender=Community)
+@receiver([post_save, post_delete], sender=User)
+def bump_entity_version(sender, instance, **kwargs):
+    bump_version(sender, instance.pk)
+
+
+@receiver([post_save, post_delete], sender=BooksChapter)
+def bump_chapter_version(sender, instance, **kwargs):
+    bump_version(BooksChapter, instance.pk)
+    bump_version(Books, instance.book_id)
+
+
+@receiver([post_save, post_delete], sender=Rates)
+@receiver([post_save, post_delete], sender=UsersFavorites)
+def bump_parent_book_version(sender, instance, **kwargs):
+    bump_version(Books, instance.book_id)
+
+
+@receiver(m2m_changed, sender=Books.category.through)
+def bump_book_categories_version(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if reverse:
+        # Changed from the category side: pk_set holds the books.
+        bump_version(Books, *(pk_set or ()))
+    else:
+        bump_version(Books, instance.pk)
+
+
+@receiver(post_save, sender=Categories)
+def bump_category_books_version(sender, instance, **kwargs):
+    bump_queryset_versions(instance.books_set.all())
+
+
+@receiver([post_save, post_delete], sender=Topic)
+def bump_topic_community_version(sender, instance, **kwargs):
+    bump_version(Community, instance.community_id)
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.1 on 2026-10-18 21:44
+
+import app.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("social_newsfeed", "0003_alter_socialpost_media"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="socialpost",
+            name="id",
+            field=models.UUIDField(
+                default=app.models.uuid7,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+            ),
+        ),
+    ]
@@ -1,17 +1,19 @@
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.generic import ListView
 
+from app.pagination import KeysetPaginationMixin
 from app.social_newsfeed.models import SocialPost
 
 
-class SocialPostView(LoginRequiredMixin, ListView):
+class SocialPostView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     template_name: str = "social_homepage.html"
+    partial_template_name: str = "components/social_posts.html"
     login_url: str = "/signin"
     model = SocialPost
     context_object_name: str = "posts"
 
     def get_queryset(self):
-        queryset = super().get_queryset().order_by("-created_at")
+        queryset = super().get_queryset().select_related("author")
 
         return queryset
 
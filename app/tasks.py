@@ -1,70 +1,158 @@
 import json
+import logging
+import uuid
+from datetime import timedelta
 
-from asgiref.sync import async_to_sync
-from bs4 import BeautifulSoup
 from celery import shared_task
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 
 from app.authentication.models import FollowedAuthor
-from app.notifications.views.services import save_notifications
-from app.utils import plagiarism_checker, get_plagiarism_checker_report
+from app.notifications.models import Notifications
+from app.notifications.views.services import push_notifications, save_notifications
+from app.plagiarism import (
+    check_text,
+    fetch_reports,
+    run_in_client_loop,
+    text_fingerprint,
+)
 from app.books.models import BooksChapter, PlagiarismCheckerLogs, Books
+from app.books.near_duplicates import index_chapter, local_report, near_duplicates
 
+logger = logging.getLogger(__name__)
 
-@shared_task
-def run_plagiarism_checker_tasks(slug):
-    print("Running plagiarism checker ...")
 
-    chapter = get_object_or_404(BooksChapter, slug=slug)
+@shared_task(rate_limit=settings.NOTIFICATION_FANOUT_RATE_LIMIT)
+def fan_out_follower_notifications(author_id, message, after_id=None):
+    """Notify one chunk of the author's followers, then queue the next chunk.
 
-    soup = BeautifulSoup(chapter.content, "html.parser")
-    # Get text from the parsed HTML
-    content = soup.get_text(separator="\n", strip=True)
-    checker = async_to_sync(plagiarism_checker)(text=content)
+    Followers are paged by primary key so every chunk is a single range scan
+    of the (author, id) index and one bulk INSERT. Since each chunk is its own
+    task, ``rate_limit`` throttles the whole fan-out without pinning a worker
+    for its duration.
+    """
+    followers = FollowedAuthor.objects.filter(author_id=author_id).order_by("id")
+    if after_id is not None:
+        followers = followers.filter(id__gt=after_id)
+
+    chunk = list(
+        followers.values_list("id", "user_id")[
+            : settings.NOTIFICATION_FANOUT_CHUNK_SIZE
+        ]
+    )
+    if not chunk:
+        return
 
-    print("Saving plagiarism checker results ...")
-    PlagiarismCheckerLogs.objects.create(
-        book=chapter.book,
-        chapter=chapter,
-        results=checker,
-        log_id=checker["data"]["text"]["id"],
-        words_count=checker["data"]["text"]["words"],
+    notifications = Notifications.objects.bulk_create(
+        [Notifications(user_id=user_id, message=message) for _, user_id in chunk]
     )
+    push_notifications(notifications)
 
-    print("Done saving plagiarism checker results ...")
+    if len(chunk) == settings.NOTIFICATION_FANOUT_CHUNK_SIZE:
+        fan_out_follower_notifications.delay(
+            author_id, message, after_id=str(chunk[-1][0])
+        )
 
 
-@shared_task
-def run_plagiarism_report_tasks(slug):
-    print("Retrieving plagiarism checker reports ...")
+def plagiarism_check_key(slug):
+    return f"plagiarism-check:{slug}"
 
-    # Retrieve the book based on the slug
-    book = get_object_or_404(Books, slug=slug)
 
-    # Filter logs for the given book
-    logs = PlagiarismCheckerLogs.objects.filter(book=book)
+def schedule_plagiarism_check(slug):
+    """Check the chapter ``PLAGIARISM_CHECK_DEBOUNCE`` seconds from now, unless
+    it is saved again before: only the check scheduled last runs."""
+    token = uuid.uuid4().hex
+    cache.set(
+        plagiarism_check_key(slug),
+        token,
+        timeout=settings.PLAGIARISM_CHECK_DEBOUNCE * 10,
+    )
+    run_plagiarism_checker_tasks.apply_async(
+        kwargs={"slug": slug, "token": token},
+        countdown=settings.PLAGIARISM_CHECK_DEBOUNCE,
+    )
 
-    # Prepare new logs for bulk update
-    new_logs = []
 
-    for log in logs:
-        chapter = log.chapter
-        log_id = log.log_id
+@shared_task
+def run_plagiarism_checker_tasks(slug, token=None):
+    latest = cache.get(plagiarism_check_key(slug))
+    if token is not None and latest is not None and latest != token:
+        # Superseded by a later save, whose check will see the final text
+        return
+    # Without a token (expired, evicted, or a cache local to another process)
+    # the chapter is checked: the content hash below skips text checked already
+
+    logger.info("Running the plagiarism check of chapter %s", slug)
+
+    # The plain text is extracted once when the chapter is saved
+    chapter = get_object_or_404(
+        BooksChapter.objects.with_content()
+        .select_related("book")
+        .only("id", "created_at", "word_count", "content_text", "book__author"),
+        slug=slug,
+    )
+
+    # This text was checked already, e.g. a save that only changed the title.
+    # A check that failed does not count, the text is submitted again
+    content_hash = text_fingerprint(chapter.content_text)
+    if (
+        PlagiarismCheckerLogs.objects.reusable()
+        .filter(chapter=chapter, content_hash=content_hash)
+        .exists()
+    ):
+        logger.info(
+            "Text of chapter %s unchanged, keeping its plagiarism results", slug
+        )
+        return
+
+    # Heavy overlap with an older chapter of another author is flagged
+    # locally, only the other texts are sent to the paid API
+    signature = index_chapter(chapter.id, chapter.content_text)
+    matches = signature and near_duplicates(
+        signature,
+        exclude_author_id=chapter.book.author_id,
+        created_before=chapter.created_at,
+    )
+    if matches:
+        logger.info("Chapter %s overlaps older chapters, flagged locally", slug)
+        PlagiarismCheckerLogs.objects.create(
+            book_id=chapter.book_id,
+            chapter=chapter,
+            results=local_report(matches),
+            log_id="local",
+            words_count=chapter.word_count,
+            content_hash=content_hash,
+        )
+        return
+
+    checker = run_in_client_loop(check_text(chapter.content_text))
+
+    logger.info("Saving the plagiarism check of chapter %s", slug)
+    PlagiarismCheckerLogs.objects.create(
+        book_id=chapter.book_id,
+        chapter=chapter,
+        results=checker,
+        log_id=checker["data"]["text"]["id"],
+        words_count=checker["data"]["text"]["words"],
+        content_hash=content_hash,
+        next_poll_at=timezone.now()
+        + timedelta(seconds=settings.PLAGIARISM_POLL_INTERVAL),
+    )
 
-        # Retrieve the plagiarism checker report asynchronously
-        report = async_to_sync(get_plagiarism_checker_report)(log_id=log_id)
 
-        # Update the log instance with the new results
-        log.results = report  # Assuming `results` is a field on PlagiarismCheckerLogs
-        new_logs.append(log)  # Append the log instance itself
+def plagiarism_poll_delay(attempts):
+    """Seconds until the next poll of a check polled ``attempts`` times."""
+    return min(
+        settings.PLAGIARISM_POLL_MAX_INTERVAL,
+        settings.PLAGIARISM_POLL_INTERVAL * 2**attempts,
+    )
 
-    print("Saving plagiarism checker reports ...")
-    # Perform a bulk update on the modified log instances
-    PlagiarismCheckerLogs.objects.bulk_update(
-        new_logs, ["results"]
-    )  # Specify fields to update
 
-    notification_message = f"""
+def plagiarism_report_ready_message(slug):
+    return f"""
         <p class="text-sm font-semibold text-gray-900">Your Plagiarism Report is Ready!</p>
         <hr>
         <p class="mt-2 text-xs text-gray-500">
@@ -72,5 +160,66 @@ def run_plagiarism_report_tasks(slug):
             clicking here</a>.
         </p>
     """
-    save_notifications(user=book.author, message=notification_message)
-    print("Done retrieving plagiarism checker reports ...")
+
+
+def request_plagiarism_poll(logs):
+    """Poll the pending checks among ``logs`` now and start their backoff over."""
+    if logs.pending().update(next_poll_at=timezone.now(), poll_attempts=0):
+        poll_plagiarism_reports.delay()
+
+
+@shared_task
+def poll_plagiarism_reports():
+    """Fetch the reports of the pending checks that are due, run by beat.
+
+    Each poll that finds a check still pending doubles the wait before its
+    next one, so slow checks cost a handful of requests instead of one per
+    run. The due checks are claimed by moving their next poll in the same
+    transaction that locks them, overlapping runs skip them.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        logs = list(
+            PlagiarismCheckerLogs.objects.due(now)
+            .select_for_update(skip_locked=True)
+            .order_by("next_poll_at")
+            .only("id", "log_id", "book_id", "poll_attempts")[
+                : settings.PLAGIARISM_POLL_BATCH_SIZE
+            ]
+        )
+        for log in logs:
+            log.next_poll_at = None
+            if log.poll_attempts < settings.PLAGIARISM_POLL_MAX_ATTEMPTS:
+                log.next_poll_at = now + timedelta(
+                    seconds=plagiarism_poll_delay(log.poll_attempts)
+                )
+            log.poll_attempts += 1
+        PlagiarismCheckerLogs.objects.bulk_update(
+            logs, ["next_poll_at", "poll_attempts"]
+        )
+    if not logs:
+        return
+
+    reports = run_in_client_loop(fetch_reports([log.log_id for log in logs]))
+
+    updated, ready_books = [], set()
+    for log, report in zip(logs, reports):
+        # Logs whose report could not be fetched keep their last results and
+        # are polled again after their backoff
+        if report is None:
+            continue
+        log.results = report
+        if not log.is_pending:
+            log.next_poll_at = None
+            ready_books.add(log.book_id)
+        updated.append(log)
+    PlagiarismCheckerLogs.objects.bulk_update(updated, ["results", "next_poll_at"])
+
+    for book in Books.objects.filter(id__in=ready_books).select_related("author"):
+        save_notifications(
+            user=book.author, message=plagiarism_report_ready_message(book.slug)
+        )
+
+    if len(logs) == settings.PLAGIARISM_POLL_BATCH_SIZE:
+        # More may be due, do not wait for the next beat
+        poll_plagiarism_reports.delay()
@@ -1,3 +1,325 @@
-from django.test import TestCase
+import asyncio
+import base64
+import json
+import os
+import runpy
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+import httpx
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.http import Http404
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from django.views.generic import ListView
+
+from app.authentication.models import User
+from app.books.models import Books
+from app.management.commands.audit_query_plans import sequential_scans
+from app.models import uuid7
+from app.notifications.models import Notifications
+from app.pagination import KeysetPaginationMixin, decode_cursor, encode_cursor
+from app.plagiarism import (
+    CircuitBreaker,
+    CircuitOpenError,
+    PlagiarismAPIError,
+    PlagiarismClient,
+    fetch_reports,
+    run_in_client_loop,
+    shared_client,
+)
+from app.search import build_prefix_query, full_text_search
+from blendjoy import settings as blendjoy_settings
+
 
 # Create your tests here.
+class QueryPlanAuditTest(TestCase):
+    def test_hot_queries_use_indexes(self):
+        out = StringIO()
+        call_command("audit_query_plans", stdout=out)
+        self.assertIn("No sequential scans.", out.getvalue())
+
+    def test_unindexed_filter_is_flagged(self):
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            plan = Notifications.objects.filter(message="hello").explain(format="json")
+        self.assertEqual(
+            list(sequential_scans(json.loads(plan)[0]["Plan"])), ["notifications"]
+        )
+
+
+class NotificationsPage(KeysetPaginationMixin, ListView):
+    model = Notifications
+    paginate_by = 2
+    template_name = "unused.html"
+
+
+class KeysetPaginationTest(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username="reader")
+        now = timezone.now()
+        # Two pairs share a created_at, ties are broken by id
+        self.notifications = [
+            Notifications.objects.create(user=user, message=str(i)) for i in range(5)
+        ]
+        for notification, created_at in zip(
+            self.notifications,
+            [now, now, now - timedelta(minutes=1)] * 2,
+        ):
+            Notifications.objects.filter(pk=notification.pk).update(
+                created_at=created_at
+            )
+        self.expected = list(
+            Notifications.objects.order_by("-created_at", "-id").values_list(
+                "id", flat=True
+            )
+        )
+
+    def page(self, query):
+        view = NotificationsPage()
+        view.setup(RequestFactory().get("/notifications", query))
+        view.object_list = view.get_queryset()
+        return view.get_context_data()
+
+    def test_cursor_round_trip(self):
+        notification = Notifications.objects.get(pk=self.notifications[0].pk)
+        self.assertEqual(
+            decode_cursor(encode_cursor(notification)),
+            (notification.created_at, notification.pk),
+        )
+        with self.assertRaises(ValueError):
+            decode_cursor("not a cursor")
+
+    def test_pages_cover_ties_once_in_order(self):
+        seen, query = [], {"q": "hello"}
+        while True:
+            context = self.page(query)
+            seen += [notification.id for notification in context["object_list"]]
+            if not context["next_cursor"]:
+                break
+            query = {"q": "hello", "cursor": context["next_cursor"]}
+
+        self.assertEqual(seen, self.expected)
+        # The last page is short and has no next page
+        self.assertEqual(len(context["object_list"]), 1)
+        self.assertIsNone(context["next_page_url"])
+
+    def test_next_page_url_keeps_the_query_string(self):
+        first = self.page({"q": "hello"})
+        second = self.page({"q": "hello", "cursor": first["next_cursor"]})
+
+        url = second["next_page_url"]
+        self.assertTrue(url.startswith("/notifications?"))
+        self.assertIn("q=hello", url)
+        self.assertEqual(url.count("cursor="), 1)
+        self.assertIn(f"cursor={second['next_cursor']}", url)
+
+    def test_invalid_cursor_is_not_found(self):
+        with self.assertRaises(Http404):
+            self.page({"cursor": "!!!"})
+
+        # A valid timestamp with an id that is not a UUID
+        raw = f"{timezone.now().isoformat()}|42 OR 1=1"
+        cursor = base64.urlsafe_b64encode(raw.encode()).decode()
+        with self.assertRaises(Http404):
+            self.page({"cursor": cursor})
+
+
+class FullTextSearchTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(
+            username="writer", first_name="Running", user_role="writer"
+        )
+
+        def book(title, description=""):
+            return Books.objects.create(
+                title=title, description=description, author=self.author
+            )
+
+        self.harry = book("Harry Potter")
+        self.hairy = book("Hairy Maclary")
+        self.dragon_title = book("Dragon Riders")
+        self.dragon_description = book("Sky Lords", "A dragon wakes up")
+        self.wolves = book("Running Wolves")
+
+    def search(self, queryset, text):
+        return list(full_text_search(queryset, text))
+
+    def test_words_match_as_prefixes(self):
+        self.assertEqual(self.search(Books.objects.all(), "harr pot"), [self.harry])
+        self.assertEqual(self.search(Books.objects.all(), "HARRY"), [self.harry])
+
+    def test_input_without_words_matches_nothing(self):
+        self.assertIsNone(build_prefix_query("&|!:*", config="english"))
+        self.assertEqual(self.search(Books.objects.all(), "&|!"), [])
+
+    def test_title_matches_rank_above_description_matches(self):
+        self.assertEqual(
+            self.search(Books.objects.all(), "drag"),
+            [self.dragon_title, self.dragon_description],
+        )
+
+    def test_each_model_uses_its_search_config(self):
+        # Book titles are stemmed in English, "runs" finds "Running"
+        self.assertEqual(self.search(Books.objects.all(), "runs"), [self.wolves])
+        # User names are not stemmed ("simple"), only the prefix matches
+        self.assertEqual(self.search(User.objects.all(), "runs"), [])
+        self.assertEqual(self.search(User.objects.all(), "runn"), [self.author])
+
+
+class UUID7Test(TestCase):
+    def test_keys_are_version_7_and_increase(self):
+        keys = [uuid7() for _ in range(10_000)]
+
+        self.assertEqual({key.version for key in keys}, {7})
+        self.assertEqual(keys, sorted(keys))
+        self.assertEqual(len(set(keys)), len(keys))
+
+    def test_new_rows_get_time_ordered_keys(self):
+        notification = Notifications.objects.create(
+            user=User.objects.create_user(username="reader"), message="hi"
+        )
+        self.assertEqual(notification.id.version, 7)
+
+
+class PlagiarismClientTest(SimpleTestCase):
+    def client_for(self, statuses, breaker=None):
+        """A client whose API answers with ``statuses`` in turn."""
+        self.calls = []
+
+        def respond(request):
+            self.calls.append(request)
+            return httpx.Response(statuses[len(self.calls) - 1], json={"ok": True})
+
+        return PlagiarismClient(
+            "https://api.test",
+            transport=httpx.MockTransport(respond),
+            retries=3,
+            backoff=0,
+            circuit_breaker=breaker or CircuitBreaker(10, 60),
+        )
+
+    async def test_retries_throttled_and_failed_reports(self):
+        async with self.client_for([429, 502, 200]) as client:
+            self.assertEqual(await client.report("42"), {"ok": True})
+        self.assertEqual(len(self.calls), 3)
+        self.assertEqual(self.calls[0].url.path, "/text/report/42")
+
+    async def test_submissions_are_not_retried_after_a_server_error(self):
+        async with self.client_for([500, 200]) as client:
+            with self.assertRaises(PlagiarismAPIError):
+                await client.submit("text")
+        self.assertEqual(len(self.calls), 1)
+
+        async with self.client_for([503, 200]) as client:
+            await client.submit("text")
+        self.assertEqual(len(self.calls), 2)
+
+    async def test_client_errors_are_raised_without_retrying(self):
+        async with self.client_for([404, 200]) as client:
+            with self.assertRaises(PlagiarismAPIError) as raised:
+                await client.report("42")
+        self.assertEqual(raised.exception.status_code, 404)
+        self.assertEqual(len(self.calls), 1)
+
+    async def test_circuit_opens_after_repeated_failures(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        async with self.client_for([500] * 4, breaker) as client:
+            with self.assertRaises(CircuitOpenError):
+                await client.report("42")
+            self.assertEqual(len(self.calls), 2)
+
+            with self.assertRaises(CircuitOpenError):
+                await client.report("43")
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(breaker.state, "open")
+
+        breaker.reset_timeout = 0
+        self.assertEqual(breaker.state, "half_open")
+        async with self.client_for([200], breaker) as client:
+            await client.report("44")
+        self.assertEqual(breaker.state, "closed")
+
+    async def test_trial_call_ending_in_any_error_ends_the_trial(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+
+        def undecodable(request):
+            raise httpx.DecodingError("Bad gzip body", request=request)
+
+        async def hanging(request):
+            await asyncio.sleep(60)
+
+        for respond in (undecodable, hanging):
+            client = PlagiarismClient(
+                "https://api.test",
+                transport=httpx.MockTransport(respond),
+                retries=0,
+                circuit_breaker=breaker,
+            )
+            async with client:
+                with self.assertRaises((httpx.DecodingError, asyncio.TimeoutError)):
+                    await asyncio.wait_for(client.report("42"), 0.05)
+            self.assertFalse(breaker.trial_running)
+
+        async with self.client_for([200], breaker) as client:
+            await client.report("43")
+        self.assertEqual(breaker.state, "closed")
+
+    def test_tasks_reuse_one_client_and_loop_per_process(self):
+        async def current():
+            return shared_client(), asyncio.get_running_loop()
+
+        client, loop = run_in_client_loop(current())
+        self.assertEqual(run_in_client_loop(current()), (client, loop))
+        self.assertFalse(client.http.is_closed)
+
+    @override_settings(PLAGIARISM_REPORT_CONCURRENCY=3)
+    async def test_reports_are_fetched_concurrently_within_the_limit(self):
+        in_flight, peak = 0, 0
+
+        async def respond(request):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            if request.url.path.endswith("/bad"):
+                return httpx.Response(404)
+            return httpx.Response(200, json={"id": request.url.path})
+
+        with self.assertLogs("app.plagiarism", "ERROR"):
+            reports = await fetch_reports(
+                ["1", "bad", "2", "3", "4", "5"],
+                base_url="https://api.test",
+                transport=httpx.MockTransport(respond),
+                circuit_breaker=CircuitBreaker(10, 60),
+            )
+
+        self.assertEqual(peak, 3)
+        self.assertIsNone(reports[1])
+        self.assertEqual(reports[0], {"id": "/text/report/1"})
+        self.assertEqual(reports[5], {"id": "/text/report/5"})
+
+
+class ChannelLayerSettingsTest(SimpleTestCase):
+    def channel_layers(self, urls):
+        with mock.patch.dict(os.environ, {"CHANNEL_REDIS_URLS": urls}):
+            return runpy.run_path(blendjoy_settings.__file__)["CHANNEL_LAYERS"]
+
+    def test_no_redis_urls_fall_back_to_the_in_memory_layer(self):
+        self.assertEqual(
+            self.channel_layers(""),
+            {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}},
+        )
+
+    def test_redis_urls_select_the_sharded_redis_layer(self):
+        layer = self.channel_layers("redis://one:6379/0,redis://two:6379/0")["default"]
+
+        self.assertEqual(layer["BACKEND"], "channels_redis.core.RedisChannelLayer")
+        self.assertEqual(
+            layer["CONFIG"]["hosts"], ["redis://one:6379/0", "redis://two:6379/0"]
+        )
+        self.assertEqual(layer["CONFIG"]["capacity"], 100)
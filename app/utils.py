@@ -6,7 +6,6 @@ from typing import Optional, List, Any
 
 import cloudinary
 import cloudinary.uploader
-import httpx
 from asgiref.sync import sync_to_async
 from django.contrib.humanize.templatetags.humanize import naturaltime
 from django.core.files.uploadedfile import InMemoryUploadedFile
@@ -99,44 +98,6 @@ def natural_time(value):
     return naturaltime(value)
 
 
-class AsyncHttpxSingleton:
-    _instance = None
-
-    @classmethod
-    async def get_instance(cls):
-        if cls._instance is None or cls._instance.is_closed:
-            cls._instance = httpx.AsyncClient()
-            print("Creating new instance for httpx.AsyncClient()")
-        else:
-            print("Reusing existing instance for httpx.AsyncClient()")
-        return cls._instance
-
-    @classmethod
-    async def close(cls):
-        if cls._instance and not cls._instance.is_closed:
-            await cls._instance.aclose()
-        cls._instance = None
-
-
-async def plagiarism_checker(text: str):
-    API_TOKEN = env("PLAGIARISM_CHECK_API_TOKEN")
-    headers = {"X-API-TOKEN": API_TOKEN}
-    url = "https://plagiarismcheck.org/api/v1/text"
-
-    data = {"language": "en", "text": text}
-
-    response = httpx.post(url=url, data=data, headers=headers)
-    return response.json()
-
-
-async def get_plagiarism_checker_report(log_id):
-    API_TOKEN = env("PLAGIARISM_CHECK_API_TOKEN")
-    headers = {"X-API-TOKEN": API_TOKEN}
-    url = f"https://plagiarismcheck.org/api/v1/text/report/{log_id}"
-    response = httpx.get(url=url, headers=headers)
-    return response.json()
-
-
 def send_email_verification(email):
     subject = "Email Verification Link"
 
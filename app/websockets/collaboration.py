@@ -0,0 +1,192 @@
+"""Operational transform for the collaborative chapter editor.
+
+An operation is a list of components applied left to right over the whole
+document: a positive int retains that many characters, a negative int deletes
+that many and a string is inserted. ``[5, "abc", -2, 10]`` keeps 5 characters,
+inserts "abc", deletes 2 and keeps the last 10, so it applies to documents of
+exactly 17 characters. Lengths count code points, the client uses
+``Array.from`` for the same reason.
+"""
+
+import asyncio
+from collections import deque
+from typing import Deque, Dict, List, Tuple, Union
+
+from django.conf import settings
+
+Component = Union[int, str]
+Operation = List[Component]
+
+
+class OperationError(ValueError):
+    pass
+
+
+def _append(op: Operation, component: Component):
+    """Append ``component`` to ``op``, merging it with the last one when possible."""
+    if component == 0 or component == "":
+        return
+    if op and type(op[-1]) is type(component):
+        if isinstance(component, str) or (op[-1] > 0) == (component > 0):
+            op[-1] += component
+            return
+    op.append(component)
+
+
+def validate(op) -> Operation:
+    if not isinstance(op, list):
+        raise OperationError("Operation must be a list")
+    for component in op:
+        if isinstance(component, bool) or not isinstance(component, (int, str)):
+            raise OperationError(f"Invalid component {component!r}")
+    return op
+
+
+def base_length(op: Operation) -> int:
+    return sum(abs(c) for c in op if isinstance(c, int))
+
+
+def apply(document: str, op: Operation) -> str:
+    if base_length(op) != len(document):
+        raise OperationError(
+            f"Operation spans {base_length(op)} characters, document has {len(document)}"
+        )
+
+    parts, index = [], 0
+    for component in op:
+        if isinstance(component, str):
+            parts.append(component)
+        elif component > 0:
+            parts.append(document[index : index + component])
+            index += component
+        else:
+            index -= component
+    return "".join(parts)
+
+
+def transform(a: Operation, b: Operation) -> Tuple[Operation, Operation]:
+    """Transform concurrent ``a`` and ``b`` into ``(a', b')`` such that
+    ``apply(apply(doc, a), b') == apply(apply(doc, b), a')``.
+
+    When both insert at the same position, ``a``'s insert goes first.
+    """
+    if base_length(a) != base_length(b):
+        raise OperationError("Concurrent operations must share a base document")
+
+    a_prime: Operation = []
+    b_prime: Operation = []
+    ops_a, ops_b = deque(a), deque(b)
+    head_a = ops_a.popleft() if ops_a else None
+    head_b = ops_b.popleft() if ops_b else None
+
+    while head_a is not None or head_b is not None:
+        if isinstance(head_a, str):
+            _append(a_prime, head_a)
+            _append(b_prime, len(head_a))
+            head_a = ops_a.popleft() if ops_a else None
+            continue
+        if isinstance(head_b, str):
+            _append(a_prime, len(head_b))
+            _append(b_prime, head_b)
+            head_b = ops_b.popleft() if ops_b else None
+            continue
+
+        # Both are retains or deletes over the same span of the base document
+        length = min(abs(head_a), abs(head_b))
+        if head_a > 0 and head_b > 0:
+            _append(a_prime, length)
+            _append(b_prime, length)
+        elif head_a < 0 and head_b > 0:
+            _append(a_prime, -length)
+        elif head_a > 0 and head_b < 0:
+            _append(b_prime, -length)
+        # Both deleted the same characters: nothing left to do for either
+
+        head_a = _consume(head_a, length)
+        if head_a == 0:
+            head_a = ops_a.popleft() if ops_a else None
+        head_b = _consume(head_b, length)
+        if head_b == 0:
+            head_b = ops_b.popleft() if ops_b else None
+
+    return a_prime, b_prime
+
+
+def _consume(component: int, length: int) -> int:
+    return component - length if component > 0 else component + length
+
+
+class CollaborativeDocument:
+    """Authoritative state of one chapter while it is being edited.
+
+    Every accepted operation bumps ``version`` by one. ``history`` keeps the
+    recent operations for transforming clients that are a few versions behind,
+    and a snapshot is taken every ``COLLABORATION_SNAPSHOT_EVERY`` versions so
+    a late joiner receives the snapshot plus a short tail of operations
+    instead of replaying the whole session.
+    """
+
+    def __init__(self, content: str):
+        self.content = content
+        self.version = 0
+        self.history: Deque[Tuple[int, Operation]] = deque(
+            maxlen=settings.COLLABORATION_HISTORY_SIZE
+        )
+        self.snapshot: Tuple[int, str] = (0, content)
+        self.lock = asyncio.Lock()
+        self.clients = 0
+        # WriteBehindBuffer persisting the document and keeping it in step with
+        # the other workers, see write_behind.py
+        self.buffer = None
+
+    def receive(self, op: Operation, base_version: int) -> Operation:
+        """Apply a client operation made against ``base_version``.
+
+        Returns the operation transformed to the current version, which is what
+        the other clients must apply.
+        """
+        if not self.version - len(self.history) <= base_version <= self.version:
+            raise OperationError(f"Version {base_version} is no longer available")
+
+        op = validate(op)
+        for version, concurrent in self.history:
+            if version > base_version:
+                op, _ = transform(op, concurrent)
+
+        self.apply_accepted(self.version + 1, op)
+        return op
+
+    def apply_accepted(self, version: int, op: Operation):
+        """Apply an operation already transformed to the current version,
+        e.g. one another worker accepted."""
+        if version != self.version + 1:
+            raise OperationError(f"Expected version {self.version + 1}, got {version}")
+        self.content = apply(self.content, op)
+        self.version = version
+        self.history.append((self.version, op))
+
+        if self.version - self.snapshot[0] >= settings.COLLABORATION_SNAPSHOT_EVERY:
+            self.snapshot = (self.version, self.content)
+
+    def reset(self, version: int, content: str):
+        """Start over from ``content`` at ``version``, without history: clients
+        behind it get the new state instead of a transformed operation."""
+        self.content = content
+        self.version = version
+        self.history.clear()
+        self.snapshot = (version, content)
+
+    def state(self) -> Dict:
+        """Snapshot plus the operations since, for a client joining the room."""
+        snapshot_version, snapshot = self.snapshot
+        return {
+            "version": snapshot_version,
+            "content": snapshot,
+            "ops": [op for version, op in self.history if version > snapshot_version],
+        }
+
+
+# Documents being edited in this process, by chapter slug. With several Daphne
+# workers each one has its own copy, kept in step through the chapter's Redis
+# journal, which orders the operations of all workers.
+documents: Dict[str, CollaborativeDocument] = {}
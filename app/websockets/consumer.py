@@ -1,22 +1,44 @@
 import json
 import random
 import string
+from functools import partial
 from typing import List, Any
 
 from asgiref.sync import sync_to_async
 from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
 from cloudinary import CloudinaryImage
+from django.db import transaction
 
 from app.authentication.models import User
 from app.books.models import BooksChapter
+from app.books.revisions import record_revision
 from app.chat.models import Message
+from app.fragment_cache import bump_queryset_versions
 from app.notifications.models import Notifications
-from app.notifications.views.services import save_notifications
+from app.notifications.views.services import (
+    notifications_group_name,
+    save_notifications,
+)
 from app.utils import UploadFilesToCloudinary
+from app.websockets.collaboration import OperationError
+from app.websockets.write_behind import open_document, release_document
 
 
 class CollaborationConsumer(AsyncWebsocketConsumer):
+    """Syncs a chapter between co-authors with operational transform.
+
+    Clients send operations made against the version they last saw; the room's
+    ``CollaborativeDocument`` transforms them past any concurrent operations,
+    applies them, and only the operation is broadcast. The sender receives an
+    ``ack`` instead. Joining clients receive a snapshot plus the op tail.
+    Saving to the database is left to the document's write-behind buffer.
+    """
+
+    document = None
+    # Version of the last operation accepted from this socket
+    last_accepted = None
+
     async def connect(self):
         self.user = self.scope["user"]
         self.content_slug = self.scope["url_route"]["kwargs"]["slug"]
@@ -27,43 +49,100 @@ class CollaborationConsumer(AsyncWebsocketConsumer):
         await self.channel_layer.group_add(self.room_group_name, self.channel_name)
         await self.accept()
 
-        # Fetch and send initial content
-        content = await self.get_content()
-        await self.send(
-            text_data=json.dumps({"type": "initial_content", "content": content})
+        self.document = await open_document(
+            self.content_slug,
+            self.get_content,
+            partial(save_content, self.content_slug),
         )
+        self.document.clients += 1
+
+        await self.send_state()
 
     async def disconnect(self, close_code):
         # Leave the room group
         await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
 
+        if self.document is None:
+            return
+        self.document.clients -= 1
+        await release_document(self.content_slug, self.document)
+
     async def receive(self, text_data):
         data = json.loads(text_data)
-        content = data.get("content", "")
 
-        # Save the content to the database
-        await self.save_content(content)
+        if data.get("type") == "resync":
+            await self.send_state()
+            return
 
-        # Broadcast the content to the group
-        await self.channel_layer.group_send(
-            self.room_group_name, {"type": "collaborate_message", "content": content}
-        )
+        # Every worker's sockets share the chapter's journal, which orders
+        # the operations accepted anywhere
+        async with self.document.buffer.sequencing():
+            try:
+                op = self.document.receive(data["ops"], data["version"])
+            except (OperationError, KeyError, TypeError):
+                # The client diverged or fell too far behind: start it over
+                await self.send(text_data=json.dumps(self.snapshot()))
+                return
 
-    async def collaborate_message(self, event):
-        content = event["content"]
-        # Send the message to the WebSocket
-        await self.send(
-            text_data=json.dumps({"type": "content_update", "content": content})
-        )
+            # Journaled before anyone sees it, so an acknowledged edit survives a crash
+            await self.document.buffer.record(op)
+            self.last_accepted = self.document.version
+
+            # Broadcast under the lock so every socket gets the ops in version order
+            await self.channel_layer.group_send(
+                self.room_group_name,
+                {
+                    "type": "collaborate.ops",
+                    "version": self.document.version,
+                    "ops": op,
+                    "sender": self.channel_name,
+                },
+            )
+
+    async def collaborate_ops(self, event):
+        if event.get("replaced") and self.document is not None:
+            # The content was replaced outside the editor, which also saved it.
+            # A flush started before may still write the older copy, so save
+            # again once the replacement is caught up
+            self.document.buffer.unsaved_base = True
+            self.document.buffer.mark_dirty()
+
+        if event["sender"] == self.channel_name:
+            message = {"type": "ack", "version": event["version"]}
+        else:
+            message = {"type": "ops", "version": event["version"], "ops": event["ops"]}
+        await self.send(text_data=json.dumps(message))
+
+    def snapshot(self):
+        # "acked" tells a resyncing client whether its outstanding operation
+        # landed, in case the ack was what it missed
+        return {
+            "type": "snapshot",
+            "acked": self.last_accepted,
+            **self.document.state(),
+        }
+
+    async def send_state(self):
+        async with self.document.lock:
+            # Include what other workers accepted since this copy last synced
+            await self.document.buffer.catch_up()
+            snapshot = self.snapshot()
+        await self.send(text_data=json.dumps(snapshot))
 
     @database_sync_to_async
     def get_content(self):
-        content = BooksChapter.objects.get(slug=self.content_slug)
+        content = BooksChapter.objects.with_content().get(slug=self.content_slug)
         return content.content
 
-    @database_sync_to_async
-    def save_content(self, content):
-        BooksChapter.objects.filter(slug=self.content_slug).update(content=content)
+
+@database_sync_to_async
+def save_content(slug, content):
+    chapters = BooksChapter.objects.filter(slug=slug)
+    with transaction.atomic():
+        for chapter_id in chapters.values_list("id", flat=True):
+            record_revision(chapter_id, content)
+        chapters.update(content=content, **BooksChapter.rendered_fields(content))
+    bump_queryset_versions(chapters, "book")
 
 
 class ChatConsumer(AsyncWebsocketConsumer):
@@ -159,4 +238,53 @@ class ChatConsumer(AsyncWebsocketConsumer):
 
     @sync_to_async
     def save_notifications(self, user, message):
-        Notifications.objects.create(user=user, message=message)
+        save_notifications(user=user, message=message)
+
+
+class NotificationsConsumer(AsyncWebsocketConsumer):
+    """Pushes a user's new notifications and unread count changes.
+
+    The unread count is sent once on connect; afterwards the client only
+    receives deltas, so an idle connection costs no queries.
+    """
+
+    async def connect(self):
+        self.user = self.scope["user"]
+        if not self.user.is_authenticated:
+            await self.close()
+            return
+
+        self.group_name = notifications_group_name(self.user.id)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+
+        unread_count = await self.get_unread_count()
+        await self.send(
+            text_data=json.dumps({"type": "unread_count", "count": unread_count})
+        )
+
+    async def disconnect(self, close_code):
+        if hasattr(self, "group_name"):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def notification_created(self, event):
+        await self.send(
+            text_data=json.dumps(
+                {
+                    "type": "notification",
+                    "html": event["html"],
+                    "unread_delta": event["unread_delta"],
+                }
+            )
+        )
+
+    async def notification_read(self, event):
+        await self.send(
+            text_data=json.dumps(
+                {"type": "unread_delta", "unread_delta": event["unread_delta"]}
+            )
+        )
+
+    @database_sync_to_async
+    def get_unread_count(self):
+        return Notifications.objects.filter(user=self.user, is_read=False).count()
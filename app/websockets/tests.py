@@ -1,3 +1,287 @@
-from django.test import TestCase
+import asyncio
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.core.cache import cache
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from redis import Redis
+
+from app.authentication.models import User
+from app.books.models import Books, BooksChapter
+from app.books.revisions import record_revision
+from app.notifications.models import Notifications
+from app.notifications.views.services import save_notifications
+from app.websockets.collaboration import (
+    CollaborativeDocument,
+    OperationError,
+    apply,
+    documents,
+    transform,
+)
+from app.websockets.write_behind import ChapterJournal, collaboration_stats
+from app.websockets.routing import websocket_urlpatterns
+
 
 # Create your tests here.
+class NotificationsConsumerTest(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="reader", email="reader@example.com"
+        )
+        Notifications.objects.create(user=self.user, message="Old news")
+
+    def connect(self):
+        communicator = WebsocketCommunicator(
+            URLRouter(websocket_urlpatterns), "/ws/notifications/"
+        )
+        communicator.scope["user"] = self.user
+        return communicator
+
+    async def test_pushes_unread_count_then_new_notifications(self):
+        communicator = self.connect()
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+
+        self.assertEqual(
+            await communicator.receive_json_from(), {"type": "unread_count", "count": 1}
+        )
+
+        await sync_to_async(save_notifications)(user=self.user, message="New book!")
+
+        event = await communicator.receive_json_from()
+        self.assertEqual(event["type"], "notification")
+        self.assertEqual(event["unread_delta"], 1)
+        self.assertIn("New book!", event["html"])
+
+        await communicator.disconnect()
+
+
+class OperationalTransformTest(SimpleTestCase):
+    def test_concurrent_operations_converge(self):
+        document = "hello world"
+        a = [5, ",", 6]  # "hello, world"
+        b = [6, -5, "there"]  # "hello there"
+
+        a_prime, b_prime = transform(a, b)
+
+        self.assertEqual(apply(apply(document, a), b_prime), "hello, there")
+        self.assertEqual(apply(apply(document, b), a_prime), "hello, there")
+
+    def test_inserts_at_same_position_keep_first_operation_first(self):
+        a_prime, b_prime = transform([2, "a"], [2, "b"])
+
+        self.assertEqual(apply(apply("xy", [2, "a"]), b_prime), "xyab")
+        self.assertEqual(apply(apply("xy", [2, "b"]), a_prime), "xyab")
+
+    def test_document_transforms_stale_operations(self):
+        document = CollaborativeDocument("abc")
+        document.receive([3, "d"], 0)
+        # Made against version 0, before "d" was appended
+        op = document.receive(["x", 3], 0)
+
+        self.assertEqual(op, ["x", 4])
+        self.assertEqual(document.content, "xabcd")
+        self.assertEqual(document.version, 2)
+
+    def test_rejects_operation_for_other_document_length(self):
+        document = CollaborativeDocument("abc")
+
+        with self.assertRaises(OperationError):
+            document.receive([5, "x"], 0)
+        self.assertEqual(document.version, 0)
+
+    def test_state_is_snapshot_plus_ops_since(self):
+        document = CollaborativeDocument("")
+        with self.settings(COLLABORATION_SNAPSHOT_EVERY=2):
+            for i in range(3):
+                document.receive([i, "x"], i)
+
+        state = document.state()
+        self.assertEqual(state, {"version": 2, "content": "xx", "ops": [[2, "x"]]})
+
+
+@override_settings(COLLABORATION_FLUSH_IDLE=0.2, COLLABORATION_FLUSH_MAX_AGE=5)
+class CollaborationWriteBehindTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username="author", user_role="writer")
+        book = Books.objects.create(title="Shared", author=self.author)
+        self.chapter = BooksChapter.objects.create(
+            book=book, title="One", chapter_number=1, content="abc"
+        )
+        # Start without a journal left over by an earlier run
+        self.redis = Redis.from_url(settings.COLLABORATION_JOURNAL_URL)
+        self.journal_keys = [
+            f"collaboration-journal:{self.chapter.slug}:{key}"
+            for key in ("base", "ops", "version", "live-workers", "lock")
+        ]
+        self.redis.delete(*self.journal_keys)
+        self.addCleanup(self.redis.close)
+
+    async def connect(self):
+        communicator = WebsocketCommunicator(
+            URLRouter(websocket_urlpatterns), f"/ws/collaborate/{self.chapter.slug}/"
+        )
+        communicator.scope["user"] = self.author
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator, await communicator.receive_json_from()
+
+    async def send_op(self, communicator, version, ops):
+        await communicator.send_json_to({"type": "ops", "version": version, "ops": ops})
+        self.assertEqual(
+            await communicator.receive_json_from(),
+            {"type": "ack", "version": version + 1},
+        )
+
+    async def saved_content(self):
+        chapter = await BooksChapter.objects.with_content().aget(pk=self.chapter.pk)
+        return chapter.content
+
+    async def test_edits_are_coalesced_into_one_flush(self):
+        communicator, snapshot = await self.connect()
+        self.assertEqual(snapshot["content"], "abc")
+
+        for version, char in enumerate("xyz"):
+            await self.send_op(communicator, version, [3 + version, char])
+        self.assertEqual(await self.saved_content(), "abc")
+
+        # A resyncing client learns which of its operations landed
+        await communicator.send_json_to({"type": "resync"})
+        self.assertEqual((await communicator.receive_json_from())["acked"], 3)
+
+        await asyncio.sleep(0.5)
+        self.assertEqual(await self.saved_content(), "abcxyz")
+        stats = await sync_to_async(collaboration_stats)()
+        self.assertEqual(stats["flushes"]["idle"], 1)
+        self.assertEqual(stats["coalescing_ratio"], 3)
+
+        await communicator.disconnect()
+
+    async def test_acknowledged_edits_survive_a_crash(self):
+        communicator, _ = await self.connect()
+        await self.send_op(communicator, 0, [3, "!"])
+
+        # The process dies before flushing: only the journal has the edit
+        document = documents.pop(self.chapter.slug)
+        document.buffer.timer.cancel()
+        self.assertEqual(await self.saved_content(), "abc")
+
+        rejoined, snapshot = await self.connect()
+        self.assertEqual(snapshot["content"], "abc!")
+
+        await rejoined.disconnect()
+        self.assertEqual(await self.saved_content(), "abc!")
+        await communicator.disconnect()
+
+    async def test_workers_share_one_version_sequence(self):
+        first, _ = await self.connect()
+        first_copy = documents.pop(self.chapter.slug)
+        # The second socket lands on another worker, with its own copy
+        with mock.patch("app.websockets.write_behind.WORKER_ID", "other-worker"):
+            second, snapshot = await self.connect()
+        second_copy = documents[self.chapter.slug]
+        self.assertIsNot(first_copy, second_copy)
+        self.assertEqual(snapshot["version"], 0)
+
+        await self.send_op(first, 0, [3, "x"])
+        self.assertEqual(
+            await second.receive_json_from(),
+            {"type": "ops", "version": 1, "ops": [3, "x"]},
+        )
+        # Made against version 0 on the other worker, it still gets version 2
+        # and is transformed past "x"
+        await second.send_json_to({"type": "ops", "version": 0, "ops": ["y", 3]})
+        self.assertEqual(
+            await second.receive_json_from(), {"type": "ack", "version": 2}
+        )
+        self.assertEqual(
+            await first.receive_json_from(),
+            {"type": "ops", "version": 2, "ops": ["y", 4]},
+        )
+
+        for communicator in (first, second):
+            await communicator.send_json_to({"type": "resync"})
+            state = await communicator.receive_json_from()
+            content = state["content"]
+            for op in state["ops"]:
+                content = apply(content, op)
+            self.assertEqual(content, "yabcx")
+
+        await first.disconnect()
+        # The other worker still has the chapter open: its journal stays
+        self.assertTrue(self.redis.exists(self.journal_keys[0]))
+        await second.disconnect()
+        self.assertEqual(await self.saved_content(), "yabcx")
+        self.assertFalse(self.redis.exists(*self.journal_keys))
+
+    async def test_socket_joining_while_the_last_one_leaves_keeps_its_journal(self):
+        first, _ = await self.connect()
+        clear = ChapterJournal.clear
+
+        async def slow_clear(journal):
+            await asyncio.sleep(0.2)
+            await clear(journal)
+
+        with mock.patch.object(ChapterJournal, "clear", slow_clear):
+            leaving = asyncio.ensure_future(first.disconnect())
+            await asyncio.sleep(0.1)
+            # Connects while the leaving socket's journal is being cleared
+            second, snapshot = await self.connect()
+            await leaving
+        await self.send_op(second, snapshot["version"], [3, "!"])
+
+        # The process dies before flushing: the edit must be in the journal
+        document = documents.pop(self.chapter.slug)
+        document.buffer.timer.cancel()
+        rejoined, snapshot = await self.connect()
+        self.assertEqual(snapshot["content"], "abc!")
+
+        await rejoined.disconnect()
+        await second.disconnect()
+
+    @override_settings(COLLABORATION_WORKER_TTL=0.2)
+    async def test_worker_dying_without_leaving_does_not_keep_its_session(self):
+        with mock.patch("app.websockets.write_behind.WORKER_ID", "crashed-worker"):
+            crashed, _ = await self.connect()
+        # The worker dies: no flush, no heartbeat and no leave
+        document = documents.pop(self.chapter.slug)
+        document.buffer.heartbeat.cancel()
+
+        # Meanwhile the chapter is saved outside the editor
+        await asyncio.sleep(0.3)
+        await BooksChapter.objects.filter(pk=self.chapter.pk).aupdate(content="new")
+
+        communicator, snapshot = await self.connect()
+        self.assertEqual(snapshot["content"], "new")
+        await communicator.disconnect()
+        self.assertFalse(self.redis.exists(*self.journal_keys))
+        self.assertEqual(await self.saved_content(), "new")
+
+        await crashed.disconnect()
+
+    async def test_restoring_a_revision_replaces_the_open_document(self):
+        await sync_to_async(record_revision)(self.chapter.id, "abc")
+        communicator, _ = await self.connect()
+        await self.send_op(communicator, 0, [3, "!"])
+
+        await self.async_client.aforce_login(self.author)
+        response = await self.async_client.post(
+            reverse(
+                "restore_chapter_revision_service",
+                kwargs={"slug": self.chapter.slug, "number": 1},
+            )
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            await communicator.receive_json_from(),
+            {"type": "ops", "version": 2, "ops": [-4, "abc"]},
+        )
+
+        # The editor's unsaved "!" is not flushed over the restore
+        await communicator.disconnect()
+        self.assertEqual(await self.saved_content(), "abc")
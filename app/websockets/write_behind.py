@@ -0,0 +1,485 @@
+"""Write-behind persistence for collaboratively edited chapters.
+
+Accepted operations only touch the in-memory ``CollaborativeDocument`` and a
+Redis journal. The chapter row is updated by a flush, which runs once the
+room has been idle for ``COLLABORATION_FLUSH_IDLE`` seconds, at the latest
+``COLLABORATION_FLUSH_MAX_AGE`` seconds after the first unsaved edit, and when
+the last collaborator leaves. Many edits therefore coalesce into one UPDATE.
+
+The journal holds the last flushed content (its "base") and every operation
+accepted since, each appended before the operation is acknowledged. If the
+process dies between flushes, the next socket to open the chapter replays the
+journal instead of trusting the stale row.
+
+The journal is also what keeps several Daphne workers consistent: sockets of
+one chapter may land on different workers, each holding its own copy of the
+document. Operations are accepted under a Redis lock per chapter, after the
+worker's copy has caught up with the journal, so every worker transforms
+against the same history and versions are never handed out twice.
+"""
+
+import asyncio
+import json
+import logging
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from redis import asyncio as redis
+
+from app.websockets.collaboration import (
+    CollaborativeDocument,
+    Operation,
+    apply,
+    documents,
+)
+
+logger = logging.getLogger(__name__)
+
+FLUSH_REASONS = ("idle", "max_age", "disconnect")
+
+# Identifies this process among the workers that have a chapter open
+WORKER_ID = uuid.uuid4().hex
+
+
+class ChapterJournal:
+    def __init__(self, slug: str):
+        self.client = redis.from_url(settings.COLLABORATION_JOURNAL_URL)
+        prefix = f"collaboration-journal:{slug}"
+        self.base_key = f"{prefix}:base"
+        self.ops_key = f"{prefix}:ops"
+        self.version_key = f"{prefix}:version"
+        # Sorted set of the workers with the chapter open, scored by when their
+        # registration expires unless renewed
+        self.workers_key = f"{prefix}:live-workers"
+        self.lock_key = f"{prefix}:lock"
+
+    def lock(self):
+        """Held by whoever appends to or truncates the journal, on any worker.
+        Expires after ``COLLABORATION_LOCK_TIMEOUT`` if its holder dies."""
+        return self.client.lock(
+            self.lock_key,
+            timeout=settings.COLLABORATION_LOCK_TIMEOUT,
+            blocking_timeout=settings.COLLABORATION_LOCK_TIMEOUT,
+        )
+
+    async def read(self) -> Tuple[Optional[dict], List[dict]]:
+        """The base and the entries, read atomically."""
+        async with self.client.pipeline(transaction=True) as pipe:
+            base, entries = (
+                await pipe.get(self.base_key).lrange(self.ops_key, 0, -1).execute()
+            )
+        return (
+            None if base is None else json.loads(base),
+            [json.loads(entry) for entry in entries],
+        )
+
+    async def head(self) -> Optional[int]:
+        """Version of the last accepted operation."""
+        version = await self.client.get(self.version_key)
+        return None if version is None else int(version)
+
+    async def recover(self) -> Optional[str]:
+        """Content with operations a process journaled but never flushed, or
+        None if everything was flushed."""
+        base, entries = await self.read()
+        if base is None:
+            return None
+
+        content, unflushed = base["content"], False
+        for entry in entries:
+            # Entries up to the base version were flushed but not trimmed yet
+            if entry["version"] > base["version"]:
+                content = apply(content, entry["ops"])
+                unflushed = True
+        return content if unflushed else None
+
+    async def start(self, content: str):
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.set(self.base_key, json.dumps({"version": 0, "content": content}))
+            pipe.delete(self.ops_key)
+            pipe.set(self.version_key, 0)
+            await pipe.execute()
+
+    async def append(self, version: int, op: Operation):
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.rpush(self.ops_key, json.dumps({"version": version, "ops": op}))
+            pipe.set(self.version_key, version)
+            await pipe.execute()
+
+    async def truncate(self, version: int, content: str) -> int:
+        """Make ``content`` at ``version`` the new base and drop the entries it
+        already contains. Must be called under ``lock()``. Returns the version
+        of the previous base."""
+        base, entries = await self.read()
+        if base is not None and base["version"] >= version:
+            # Another worker flushed this version or a later one already
+            return base["version"]
+
+        flushed = sum(1 for entry in entries if entry["version"] <= version)
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.set(
+                self.base_key, json.dumps({"version": version, "content": content})
+            )
+            pipe.ltrim(self.ops_key, flushed, -1)
+            await pipe.execute()
+        return 0 if base is None else base["version"]
+
+    async def join(self, worker: str) -> set:
+        """Register ``worker``, returning the other workers with the chapter open.
+
+        Registrations expire after ``COLLABORATION_WORKER_TTL`` unless renewed
+        with ``heartbeat()``, so a worker that died without leaving does not
+        keep the session, and its stale journal, alive.
+        """
+        now = time.time()
+        async with self.client.pipeline(transaction=True) as pipe:
+            _, members, _ = (
+                await pipe.zremrangebyscore(self.workers_key, "-inf", now)
+                .zrange(self.workers_key, 0, -1)
+                .zadd(
+                    self.workers_key, {worker: now + settings.COLLABORATION_WORKER_TTL}
+                )
+                .execute()
+            )
+        return {member.decode() for member in members} - {worker}
+
+    async def heartbeat(self, worker: str):
+        await self.client.zadd(
+            self.workers_key, {worker: time.time() + settings.COLLABORATION_WORKER_TTL}
+        )
+
+    async def leave(self, worker: str) -> int:
+        """Unregister ``worker``, returning how many workers still have it open."""
+        async with self.client.pipeline(transaction=True) as pipe:
+            _, _, remaining = (
+                await pipe.zrem(self.workers_key, worker)
+                .zremrangebyscore(self.workers_key, "-inf", time.time())
+                .zcard(self.workers_key)
+                .execute()
+            )
+        return remaining
+
+    async def is_open(self) -> bool:
+        """Whether any live worker has the chapter open."""
+        return bool(await self.client.zcount(self.workers_key, time.time(), "+inf"))
+
+    async def clear(self):
+        await self.client.delete(
+            self.base_key, self.ops_key, self.version_key, self.workers_key
+        )
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class WriteBehindBuffer:
+    """Coalesces the edits of one ``CollaborativeDocument`` into few saves.
+
+    ``save`` is an async callable writing the content to the database.
+    """
+
+    def __init__(
+        self,
+        document: CollaborativeDocument,
+        save: Callable[[str], Awaitable[None]],
+        journal: ChapterJournal,
+        base_version: int,
+    ):
+        self.document = document
+        self.save = save
+        self.journal = journal
+        self.worker = WORKER_ID
+        # Version of the journal base, i.e. of the last flushed content
+        self.base_version = base_version
+        self.unsaved_base = False
+        self.dirty_since: Optional[float] = None
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.flushing = asyncio.Lock()
+        self.heartbeat: Optional[asyncio.Task] = None
+
+    @property
+    def pending(self) -> int:
+        return self.document.version - self.base_version
+
+    @property
+    def dirty(self) -> bool:
+        return self.pending > 0 or self.unsaved_base
+
+    async def keep_registered(self):
+        """Renew this worker's registration in the journal until released."""
+        while True:
+            await asyncio.sleep(settings.COLLABORATION_WORKER_TTL / 3)
+            try:
+                await self.journal.heartbeat(self.worker)
+            except Exception:
+                logger.exception("Renewing the collaboration registration failed")
+
+    async def catch_up(self):
+        """Apply the operations other workers accepted since this copy's
+        version. Must be awaited under the document lock."""
+        head = await self.journal.head()
+        if head is None or head == self.document.version:
+            return
+
+        base, entries = await self.journal.read()
+        if base is None:
+            return
+        if head < self.document.version or base["version"] > self.document.version:
+            # Restarted journal, or the missing entries were flushed and trimmed
+            self.document.reset(base["version"], base["content"])
+        for entry in entries:
+            if entry["version"] > self.document.version:
+                self.document.apply_accepted(entry["version"], entry["ops"])
+
+    @asynccontextmanager
+    async def sequencing(self):
+        """Hold the chapter's journal lock, shared by all workers, and the
+        document lock, with the document caught up: operations accepted in
+        the block get the next versions cluster wide."""
+        async with self.journal.lock(), self.document.lock:
+            await self.catch_up()
+            yield
+
+    async def record(self, op: Operation):
+        """Journal an operation the document just accepted.
+
+        Must be awaited in ``sequencing()``, before the operation is
+        acknowledged, so the journal holds every acknowledged edit in order.
+        """
+        await self.journal.append(self.document.version, op)
+        self.mark_dirty()
+
+    def mark_dirty(self):
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        if self.dirty_since is None:
+            self.dirty_since = now
+
+        # Every edit pushes the idle deadline back, but never past the max age
+        remaining = self.dirty_since + settings.COLLABORATION_FLUSH_MAX_AGE - now
+        if settings.COLLABORATION_FLUSH_IDLE < remaining:
+            delay, reason = settings.COLLABORATION_FLUSH_IDLE, "idle"
+        else:
+            delay, reason = max(remaining, 0), "max_age"
+
+        if self.timer is not None:
+            self.timer.cancel()
+        self.timer = loop.call_later(
+            delay, lambda: asyncio.ensure_future(self.flush(reason))
+        )
+
+    async def flush(self, reason: str):
+        async with self.flushing:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            if not self.dirty:
+                return
+
+            async with self.document.lock:
+                await self.catch_up()
+                version, content = self.document.version, self.document.content
+            self.dirty_since = None
+
+            try:
+                await self.save(content)
+            except Exception:
+                logger.exception("Flushing collaborative chapter failed, retrying")
+                # The journal still has every operation; try again later
+                self.mark_dirty()
+                return
+
+            # Entries appended while saving stay in the journal
+            async with self.journal.lock():
+                base_version = await self.journal.truncate(version, content)
+            self.base_version = version
+            self.unsaved_base = False
+            if version > base_version:
+                await sync_to_async(record_flush)(reason, version - base_version)
+
+
+# Documents being opened, so concurrent sockets of a chapter share one load
+_opening: Dict[str, asyncio.Future] = {}
+
+
+async def open_document(
+    slug: str,
+    load: Callable[[], Awaitable[str]],
+    save: Callable[[str], Awaitable[None]],
+) -> CollaborativeDocument:
+    """Return the chapter's document, loading it with ``load`` the first time.
+
+    When other workers have the chapter open, this worker joins their session
+    from the journal. Otherwise content a crashed process journaled but never
+    flushed wins over the database row and is flushed again.
+    """
+    document = documents.get(slug)
+    if document is not None:
+        return document
+
+    if slug not in _opening:
+        _opening[slug] = asyncio.ensure_future(_open_document(slug, load, save))
+        _opening[slug].add_done_callback(lambda _: _opening.pop(slug, None))
+    return await asyncio.shield(_opening[slug])
+
+
+async def _open_document(slug, load, save):
+    content = await load()
+    journal = ChapterJournal(slug)
+
+    async with journal.lock():
+        others = await journal.join(WORKER_ID)
+        base, entries = await journal.read()
+        if others and base is not None:
+            # A session is running on other workers: continue its versions
+            document = CollaborativeDocument(base["content"])
+            document.reset(base["version"], base["content"])
+            for entry in entries:
+                if entry["version"] > document.version:
+                    document.apply_accepted(entry["version"], entry["ops"])
+            document.buffer = WriteBehindBuffer(
+                document, save, journal, base["version"]
+            )
+        else:
+            recovered = await journal.recover()
+            document = CollaborativeDocument(
+                content if recovered is None else recovered
+            )
+            document.buffer = WriteBehindBuffer(document, save, journal, 0)
+            await journal.start(document.content)
+            if recovered is not None and recovered != content:
+                document.buffer.unsaved_base = True
+                document.buffer.mark_dirty()
+
+    document.buffer.heartbeat = asyncio.ensure_future(document.buffer.keep_registered())
+
+    documents[slug] = document
+    return document
+
+
+async def release_document(slug: str, document: CollaborativeDocument):
+    """Flush and unload the document once its last collaborator has left.
+    The journal is cleared with the last worker that had the chapter open."""
+    if document.clients:
+        return
+    await document.buffer.flush("disconnect")
+
+    journal = document.buffer.journal
+    async with journal.lock(), document.lock:
+        # Someone may have joined while flushing, and a failed flush is retried
+        if document.clients or document.buffer.dirty:
+            return
+        # Unregistered before any await, so no socket can join this document
+        # any more. One connecting now opens a new document, which waits for
+        # the journal lock and so starts its journal after this clear.
+        if documents.get(slug) is document:
+            del documents[slug]
+        document.buffer.heartbeat.cancel()
+        if not await journal.leave(document.buffer.worker):
+            await journal.clear()
+    await journal.close()
+
+
+async def replace_content(slug: str, content: str) -> bool:
+    """Replace the content of a chapter open in the editor, e.g. with a
+    restored revision, returning False if no worker has it open.
+
+    The replacement is journaled and broadcast like a collaborator's operation,
+    so every worker's document and every editor move to ``content`` rather
+    than flushing their older copy over it.
+    """
+    journal = ChapterJournal(slug)
+    try:
+        async with journal.lock():
+            base, entries = await journal.read()
+            if base is None or not await journal.is_open():
+                return False
+
+            version, current = base["version"], base["content"]
+            for entry in entries:
+                if entry["version"] > version:
+                    current = apply(current, entry["ops"])
+                    version = entry["version"]
+            op = [component for component in (-len(current), content) if component]
+            version += 1
+            await journal.append(version, op)
+
+            # Under the lock, like collaborators' operations, to keep the order
+            await get_channel_layer().group_send(
+                f"group_content_{slug}",
+                {
+                    "type": "collaborate.ops",
+                    "version": version,
+                    "ops": op,
+                    "sender": None,
+                    "replaced": True,
+                },
+            )
+    finally:
+        await journal.close()
+    return True
+
+
+def _minute(timestamp: float) -> int:
+    return int(timestamp // 60)
+
+
+def _incr(key: str, amount: int, timeout=None):
+    try:
+        cache.incr(key, amount)
+    except ValueError:
+        cache.add(key, 0, timeout=timeout)
+        cache.incr(key, amount)
+
+
+def record_flush(reason: str, ops: int) -> None:
+    _incr(f"collaboration-stats:flushes:{reason}", 1)
+    _incr("collaboration-stats:ops", ops)
+    # Per-minute buckets for the flush rate, kept for an hour
+    _incr(f"collaboration-stats:minute:{_minute(time.time())}", 1, timeout=60 * 60)
+
+
+def collaboration_stats(minutes: int = 5) -> Dict:
+    """Flush counters, flushes per minute over the last ``minutes`` and the
+    coalescing ratio: operations saved per flush."""
+    current = _minute(time.time())
+    minute_keys = [
+        f"collaboration-stats:minute:{minute}"
+        for minute in range(current - minutes + 1, current + 1)
+    ]
+    reason_keys = [f"collaboration-stats:flushes:{reason}" for reason in FLUSH_REASONS]
+    counters = cache.get_many([*reason_keys, *minute_keys, "collaboration-stats:ops"])
+
+    flushes = {
+        reason: counters.get(key, 0) for reason, key in zip(FLUSH_REASONS, reason_keys)
+    }
+    total = sum(flushes.values())
+    ops = counters.get("collaboration-stats:ops", 0)
+    return {
+        "flushes": flushes,
+        "ops": ops,
+        "flushes_per_minute": round(
+            sum(counters.get(key, 0) for key in minute_keys) / minutes, 2
+        ),
+        "coalescing_ratio": round(ops / total, 2) if total else 0,
+    }
+
+
+def reset_collaboration_stats() -> None:
+    current = _minute(time.time())
+    cache.delete_many(
+        [
+            "collaboration-stats:ops",
+            *(f"collaboration-stats:flushes:{reason}" for reason in FLUSH_REASONS),
+            *(
+                f"collaboration-stats:minute:{m}"
+                for m in range(current - 60, current + 1)
+            ),
+        ]
+    )
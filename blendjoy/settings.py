@@ -62,6 +62,7 @@ INSTALLED_APPS = [
     "daphne",
     "django.contrib.staticfiles",
     "django.contrib.humanize",
+    "django.contrib.postgres",
     "crispy_forms",
     "crispy_tailwind",
     "loginas",
@@ -130,7 +131,62 @@ ASGI_APPLICATION = "blendjoy.asgi.application"
 WSGI_APPLICATION = "blendjoy.wsgi.application"
 
 
-CHANNEL_LAYERS = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+# Channel layer shared by every Daphne worker. Channels and groups are sharded
+# across the comma separated CHANNEL_REDIS_URLS by consistent hashing; leave it
+# empty to fall back to the single-process in-memory layer.
+CHANNEL_REDIS_URLS = env.list(
+    "CHANNEL_REDIS_URLS", default=[env("CELERY_BROKER_URL_REDIS")]
+)
+if CHANNEL_REDIS_URLS:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels_redis.core.RedisChannelLayer",
+            "CONFIG": {
+                "hosts": CHANNEL_REDIS_URLS,
+                "prefix": "blendjoy:asgi",
+                # Seconds an undelivered message waits in a channel
+                "expiry": env.int("CHANNEL_MESSAGE_EXPIRY", default=60),
+                # Seconds a socket stays in a group without re-joining
+                "group_expiry": env.int("CHANNEL_GROUP_EXPIRY", default=86400),
+                # Backpressure: messages queued per channel before sends to it
+                # are dropped (group_send) or raise ChannelFull (send)
+                "capacity": env.int("CHANNEL_CAPACITY", default=100),
+            },
+        }
+    }
+else:
+    CHANNEL_LAYERS = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+
+# Collaborative editor: operations kept for transforming lagging clients, and
+# how often (in versions) a snapshot for late joiners is taken
+COLLABORATION_HISTORY_SIZE = env.int("COLLABORATION_HISTORY_SIZE", default=500)
+COLLABORATION_SNAPSHOT_EVERY = env.int("COLLABORATION_SNAPSHOT_EVERY", default=100)
+
+# Edits are journaled to Redis and written to the chapter once the room has been
+# idle for COLLABORATION_FLUSH_IDLE seconds, or COLLABORATION_FLUSH_MAX_AGE seconds
+# after the first unsaved edit at the latest
+COLLABORATION_JOURNAL_URL = env(
+    "COLLABORATION_JOURNAL_URL", default=env("CELERY_BROKER_URL_REDIS")
+)
+COLLABORATION_FLUSH_IDLE = env.float("COLLABORATION_FLUSH_IDLE", default=2.0)
+COLLABORATION_FLUSH_MAX_AGE = env.float("COLLABORATION_FLUSH_MAX_AGE", default=30.0)
+# Seconds a worker may hold a chapter's journal lock before it expires, e.g.
+# because the worker died while accepting an operation
+COLLABORATION_LOCK_TIMEOUT = env.float("COLLABORATION_LOCK_TIMEOUT", default=10.0)
+# Seconds a worker stays registered as having a chapter open without renewing
+# it, so the session of a worker that died without leaving is not joined
+COLLABORATION_WORKER_TTL = env.float("COLLABORATION_WORKER_TTL", default=60.0)
+
+# Chapter revisions: at most this many diffs are stored between two full snapshots
+CHAPTER_REVISION_MAX_CHAIN = env.int("CHAPTER_REVISION_MAX_CHAIN", default=100)
+
+# Cache, on the Redis instance Celery already uses unless CACHE_URL says otherwise
+# (e.g. CACHE_URL=locmemcache:// for local development without Redis)
+CACHES = {"default": env.cache("CACHE_URL", default=env("CELERY_BROKER_URL_REDIS"))}
+
+# Upper bound for versioned fragments (app/fragment_cache.py). They are
+# invalidated by version bumps on save, the TTL only reclaims memory.
+FRAGMENT_CACHE_TTL = env.int("FRAGMENT_CACHE_TTL", default=60 * 60 * 24)
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
@@ -203,6 +259,13 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 AUTH_USER_MODEL = "authentication.User"
 
 
+# Number of author cards shown in the "Recommended authors" panel of Browse Books
+RECOMMENDED_AUTHORS_LIMIT = env.int("RECOMMENDED_AUTHORS_LIMIT", default=10)
+
+# Navbar autocomplete: minimum prefix length and per-prefix response cache TTL
+SEARCH_SUGGEST_MIN_LENGTH = 2
+SEARCH_SUGGEST_CACHE_TTL = env.int("SEARCH_SUGGEST_CACHE_TTL", default=30)
+
 LOGIN_REDIRECT_URL = "/home"
 LOGOUT_REDIRECT_URL = "/signin"
 
@@ -372,17 +435,72 @@ CELERY_ACCEPT_CONTENT = ["application/json"]
 CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
 CELERY_TIMEZONE = TIME_ZONE
-# CELERY_BEAT_SCHEDULE = {
-#     "run_my_task": {
-#         "task": "apps.tasks.get_instagram_post",  # Replace 'yourapp' with your app name
-#         "schedule": 3600,  # Run every 60 seconds
-#         # 'schedule': crontab(hour=0, minute=1),  # Schedule it to run every day at 12:01 AM
-#     },
-# }
 # CELERY_RESULT_BACKEND = "django-db"
 CELERY_CACHE_BACKEND = "django-cache"
 CELERY_RESULT_EXTENDED = True
 
+# Follower notification fan-out: followers per bulk INSERT and max chunks per
+# worker (Celery rate limit syntax, e.g. "10/s")
+NOTIFICATION_FANOUT_CHUNK_SIZE = env.int("NOTIFICATION_FANOUT_CHUNK_SIZE", default=1000)
+NOTIFICATION_FANOUT_RATE_LIMIT = env("NOTIFICATION_FANOUT_RATE_LIMIT", default="10/s")
+
+# plagiarismcheck.org API client (app/plagiarism.py): timeouts in seconds, pooled
+# connections per worker, retries with exponential backoff from
+# PLAGIARISM_API_BACKOFF up to PLAGIARISM_API_BACKOFF_MAX seconds, and a circuit
+# breaker opening for PLAGIARISM_API_BREAKER_RESET seconds after
+# PLAGIARISM_API_BREAKER_THRESHOLD failures in a row
+PLAGIARISM_API_URL = env(
+    "PLAGIARISM_API_URL", default="https://plagiarismcheck.org/api/v1"
+)
+PLAGIARISM_CHECK_API_TOKEN = env("PLAGIARISM_CHECK_API_TOKEN", default="")
+PLAGIARISM_API_TIMEOUT = env.float("PLAGIARISM_API_TIMEOUT", default=15.0)
+PLAGIARISM_API_MAX_CONNECTIONS = env.int("PLAGIARISM_API_MAX_CONNECTIONS", default=10)
+PLAGIARISM_API_RETRIES = env.int("PLAGIARISM_API_RETRIES", default=4)
+PLAGIARISM_API_BACKOFF = env.float("PLAGIARISM_API_BACKOFF", default=0.5)
+PLAGIARISM_API_BACKOFF_MAX = env.float("PLAGIARISM_API_BACKOFF_MAX", default=10.0)
+PLAGIARISM_API_BREAKER_THRESHOLD = env.int(
+    "PLAGIARISM_API_BREAKER_THRESHOLD", default=5
+)
+PLAGIARISM_API_BREAKER_RESET = env.float("PLAGIARISM_API_BREAKER_RESET", default=30.0)
+
+# Report requests in flight at once while refreshing a book's checks, at most
+# PLAGIARISM_API_MAX_CONNECTIONS of them get a connection
+PLAGIARISM_REPORT_CONCURRENCY = env.int("PLAGIARISM_REPORT_CONCURRENCY", default=10)
+
+# A chapter is checked once its text has not been saved again for this many
+# seconds, so a burst of saves costs one check of the final text
+PLAGIARISM_CHECK_DEBOUNCE = env.int("PLAGIARISM_CHECK_DEBOUNCE", default=60)
+
+# Chapters at least this similar to another author's chapter (estimated Jaccard
+# similarity of 5 word shingles) are flagged without calling the plagiarism API,
+# comparing at most NEAR_DUPLICATE_MAX_CANDIDATES LSH candidates
+NEAR_DUPLICATE_THRESHOLD = env.float("NEAR_DUPLICATE_THRESHOLD", default=0.8)
+NEAR_DUPLICATE_MAX_CANDIDATES = env.int("NEAR_DUPLICATE_MAX_CANDIDATES", default=500)
+
+# Pending plagiarism checks are polled by a beat task every
+# PLAGIARISM_POLL_SCHEDULE seconds, at most PLAGIARISM_POLL_BATCH_SIZE per run.
+# A check is first polled PLAGIARISM_POLL_INTERVAL seconds after submission,
+# then at doubling intervals up to PLAGIARISM_POLL_MAX_INTERVAL, and given up
+# after PLAGIARISM_POLL_MAX_ATTEMPTS polls (Refresh re-arms it)
+PLAGIARISM_POLL_SCHEDULE = env.float("PLAGIARISM_POLL_SCHEDULE", default=30.0)
+PLAGIARISM_POLL_BATCH_SIZE = env.int("PLAGIARISM_POLL_BATCH_SIZE", default=100)
+PLAGIARISM_POLL_INTERVAL = env.int("PLAGIARISM_POLL_INTERVAL", default=30)
+PLAGIARISM_POLL_MAX_INTERVAL = env.int("PLAGIARISM_POLL_MAX_INTERVAL", default=3600)
+PLAGIARISM_POLL_MAX_ATTEMPTS = env.int("PLAGIARISM_POLL_MAX_ATTEMPTS", default=20)
+
+# Optional: with a token, checks are submitted with a callback URL on
+# PLAGIARISM_CALLBACK_HOST (e.g. https://readify.up.railway.app) and the API's
+# callback makes the check due for polling at once
+PLAGIARISM_CALLBACK_HOST = env("PLAGIARISM_CALLBACK_HOST", default="")
+PLAGIARISM_CALLBACK_TOKEN = env("PLAGIARISM_CALLBACK_TOKEN", default="")
+
+CELERY_BEAT_SCHEDULE = {
+    "poll-plagiarism-reports": {
+        "task": "app.tasks.poll_plagiarism_reports",
+        "schedule": PLAGIARISM_POLL_SCHEDULE,
+    },
+}
+
 """
 celery -A blendjoy worker --loglevel=info --pool=eventlet
 celery -A blendjoy beat --loglevel=info